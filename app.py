@@ -1,19 +1,45 @@
 import os
+import time
 import asyncio
 import argparse
+import contextlib
 import logging
 from pathlib import Path
-from utility.audio.audio_generator import generate_audio
-from utility.captions.timed_captions_generator import generate_timed_captions
-from utility.video.background_video_generator import generate_video_url
-from utility.render.render_engine import get_output_media
+from utility.captions.timed_captions_generator import generate_timed_captions, generate_timed_captions_from_words
+from utility.captions.whisper_model_registry import get_registry, DEFAULT_DEVICE, DEFAULT_DTYPE
 from utility.video.video_search_query_generator import getVideoSearchQueriesTimed, merge_empty_intervals
 from utility.script.script_generator import process_script
+from utility.pipeline.scheduler import EXECUTOR_ASYNC, Stage, StageGraph
+from utility.pipeline.batch import format_batch_summary, read_jobs
+from utility.pipeline.artifacts import ArtifactStore
+from utility.telemetry import get_telemetry
+from utility.timeline import Timeline
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Footage downloads started ahead of the render stage
+PREFETCH_WORKERS = 4
+
+# Stage classes of the job service and how many calls of each run at once; Whisper
+# and rendering run in process pools whose sizes are derived from the core count
+SERVICE_STAGE_CLASSES = {
+    "process_script": "llm",
+    "search_terms": "llm",
+    "audio": "tts",
+    "video_urls": "pexels",
+    "caption_model": "whisper",
+    "captions": "whisper",
+    "render": "render"
+}
+SERVICE_IO_LIMITS = {"llm": 8, "tts": 4, "pexels": 4}
+
+# Lighter Whisper settings for draft runs
+DRAFT_WHISPER_MODEL = "tiny"
+DRAFT_WHISPER_DTYPE = "int8"
+
 def read_script_from_file(file_path: str) -> str:
     """Read and return the content of the script file."""
     try:
@@ -26,68 +52,304 @@ def read_script_from_file(file_path: str) -> str:
         logger.error(f"Error reading script file: {file_path}. Error: {e}")
         raise
 
-async def generate_video(script: str, video_type: str, output_dir: str) -> str:
-    """Generate a video from the given script."""
+def run_process_script(script: str, video_type: str) -> str:
+    processed_script = process_script(script, video_type)
+    logger.info(f"Script processed. Length: {len(processed_script)} characters")
+    return processed_script
+
+# Stages import edge-tts, aiohttp, requests and MoviePy when they first run, so that
+# `--help` and argument errors do not pay for them
+
+async def run_generate_audio(processed_script: str, audio_file: str) -> list:
+    from utility.audio.audio_generator import generate_audio
+    word_timings = await generate_audio(processed_script, audio_file)
+    logger.info(f"Audio generated: {audio_file}")
+    return word_timings
+
+def get_whisper_settings(whisper_draft: bool) -> tuple:
+    """Return the (model size, dtype) used for transcription."""
+    if whisper_draft:
+        return DRAFT_WHISPER_MODEL, DRAFT_WHISPER_DTYPE
+    return "base", DEFAULT_DTYPE
+
+def run_load_caption_model(caption_source: str, whisper_workers: int, whisper_draft: bool) -> bool:
+    # Load Whisper while the script and audio are still being produced; parallel
+    # transcription loads it in its worker processes instead. Captions do not wait for
+    # this stage: asking the registry for a model that is loading waits for that load
+    if caption_source == "whisper" and whisper_workers <= 1:
+        model_size, dtype = get_whisper_settings(whisper_draft)
+        get_registry().get(model_size, DEFAULT_DEVICE, dtype)
+        return True
+    return False
+
+def run_generate_captions(audio_file: str, word_timings: list, caption_source: str, whisper_workers: int, whisper_draft: bool) -> Timeline:
+    # Take caption timings from the TTS word boundaries when available
+    if caption_source == "tts" and word_timings:
+        timed_captions = generate_timed_captions_from_words(word_timings)
+    else:
+        model_size, dtype = get_whisper_settings(whisper_draft)
+        boundaries = None
+        if word_timings and whisper_workers > 1:
+            # Cut parallel transcription chunks at the sentence pauses known from TTS
+            from utility.captions.parallel_transcription import boundaries_from_word_timings
+            boundaries = boundaries_from_word_timings(word_timings)
+        timed_captions = generate_timed_captions(audio_file, model_size, DEFAULT_DEVICE, dtype, workers=whisper_workers, boundaries=boundaries)
+    if not timed_captions:
+        raise ValueError("No timed captions generated")
+    logger.info(f"Timed captions generated: {len(timed_captions)} captions")
+    return timed_captions
+
+def run_generate_search_terms(processed_script: str, timed_captions: Timeline, audio_file: str) -> Timeline:
+    from utility.audio.audio_buffer import open_audio
+    # Intervals from the LLM are validated against the narration, not just the last caption
+    search_terms = getVideoSearchQueriesTimed(processed_script, timed_captions, open_audio(audio_file).duration)
+    if not search_terms:
+        raise ValueError("No search terms generated for background videos")
+    logger.info(f"Search terms generated: {len(search_terms)} terms")
+    return search_terms
+
+async def run_generate_video_urls(search_terms: Timeline, footage_prefetch, pexels_session) -> Timeline:
+    from utility.video.background_video_generator import generate_video_url_async
+    background_video_urls = await generate_video_url_async(search_terms, "pexel", session=pexels_session, on_url=footage_prefetch)
+    if not background_video_urls:
+        raise ValueError("No background video URLs generated")
+    logger.info(f"Background video URLs generated: {len(background_video_urls)} URLs")
+    return background_video_urls
+
+def run_merge_intervals(background_video_urls: Timeline) -> Timeline:
+    return merge_empty_intervals(background_video_urls)
+
+def run_render(audio_file: str, timed_captions: Timeline, merged_video_urls: Timeline, output_file: str, render_backend: str, render_workers: int, render_incremental: bool,
+               work_dir: str) -> str:
+    from utility.render.render_engine import get_output_media
+    output_video = get_output_media(audio_file, timed_captions, merged_video_urls, "pexel", backend=render_backend, workers=render_workers, output_file=output_file,
+                                    incremental=render_incremental, work_dir=work_dir)
+    if not output_video:
+        raise ValueError("Failed to generate the final video")
+    logger.info(f"Output video generated: {output_video}")
+    return output_video
+
+def build_pipeline() -> list:
+    """Return the stages of video generation with the data each one consumes and produces.
+
+    Bump a stage's `version` when its behavior changes so old checkpoints are not reused.
+    """
+    return [
+        Stage("process_script", run_process_script, ["script", "video_type"], ["processed_script"]),
+        Stage("audio", run_generate_audio, ["processed_script", "audio_file"], ["word_timings"], executor=EXECUTOR_ASYNC, files=["audio_file"]),
+        Stage("caption_model", run_load_caption_model, ["caption_source", "whisper_workers", "whisper_draft"], ["caption_model_ready"], checkpoint=False),
+        Stage("captions", run_generate_captions, ["audio_file", "word_timings", "caption_source", "whisper_workers", "whisper_draft"], ["timed_captions"]),
+        Stage("search_terms", run_generate_search_terms, ["processed_script", "timed_captions", "audio_file"], ["search_terms"]),
+        Stage("video_urls", run_generate_video_urls, ["search_terms", "footage_prefetch", "pexels_session"], ["background_video_urls"], executor=EXECUTOR_ASYNC),
+        Stage("merge_intervals", run_merge_intervals, ["background_video_urls"], ["merged_video_urls"]),
+        Stage("render", run_render, ["audio_file", "timed_captions", "merged_video_urls", "output_file", "render_backend", "render_workers", "render_incremental", "work_dir"], ["output_video"], files=["output_file"])
+    ]
+
+async def run_pipeline(script: str, video_type: str, output_dir: str, output_file: str = "rendered_video.mp4", caption_source: str = "tts", render_backend: str = "moviepy", render_workers: int = 1, pexels_session=None, download_executor: ThreadPoolExecutor = None, from_stage: str = None, whisper_workers: int = 1, whisper_draft: bool = False,
+                       render_incremental: bool = False, stage_executors: dict = None, stage_limits: dict = None) -> tuple:
+    """Run the video generation stages and return (output video, stage timing report).
+
+    `pexels_session` and `download_executor` let several jobs share HTTP connections
+    and download threads; when omitted the job creates its own. Stage outputs are
+    checkpointed in `output_dir`, so a rerun skips every stage whose inputs did not
+    change; `from_stage` forces that stage and everything after it to run again.
+    With `render_incremental`, a changed render only re-encodes the chunks that differ
+    from earlier renders. `stage_executors` and `stage_limits` (keyed by stage name) let
+    a long-running service share process pools and concurrency limits across jobs.
+    """
+    from utility.render.footage_cache import get_footage_cache
+    owns_executor = download_executor is None
+    download_executor = download_executor or ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+    footage_cache = get_footage_cache()
     try:
-        # Process the script
-        processed_script = process_script(script, video_type)
-        logger.info(f"Script processed. Length: {len(processed_script)} characters")
-
-        # Generate audio
-        audio_file = os.path.join(output_dir, "audio_tts.wav")
-        await generate_audio(processed_script, audio_file)
-        logger.info(f"Audio generated: {audio_file}")
-
-        # Generate timed captions
-        timed_captions = generate_timed_captions(audio_file)
-        logger.info(f"Timed captions generated: {len(timed_captions)} captions")
-
-        # Generate search terms for background videos
-        search_terms = getVideoSearchQueriesTimed(processed_script, timed_captions)
-        if not search_terms:
-            raise ValueError("No search terms generated for background videos")
-        logger.info(f"Search terms generated: {len(search_terms)} terms")
-
-        # Generate background video URLs
-        background_video_urls = generate_video_url(search_terms, "pexel")
-        if not background_video_urls:
-            raise ValueError("No background video URLs generated")
-        logger.info(f"Background video URLs generated: {len(background_video_urls)} URLs")
-
-        # Merge empty intervals in background video URLs
-        background_video_urls = merge_empty_intervals(background_video_urls)
-
-        # Generate the final video
-        output_video = get_output_media(audio_file, timed_captions, background_video_urls, "pexel")
-        if not output_video:
-            raise ValueError("Failed to generate the final video")
-        logger.info(f"Output video generated: {output_video}")
+        # Footage downloads start as soon as each segment's URL is resolved
+        graph = StageGraph(build_pipeline(), executors=stage_executors, limits=stage_limits)
+        values, report = await graph.run({
+            "script": script,
+            "video_type": video_type,
+            "audio_file": os.path.join(output_dir, "audio_tts.wav"),
+            "work_dir": output_dir,
+            "output_file": output_file,
+            "caption_source": caption_source,
+            "render_backend": render_backend,
+            "render_workers": render_workers,
+            "render_incremental": render_incremental,
+            "whisper_workers": whisper_workers,
+            "whisper_draft": whisper_draft
+        }, runtime={
+            "pexels_session": pexels_session,
+            "footage_prefetch": lambda url: download_executor.submit(footage_cache.fetch, url)
+        }, store=ArtifactStore(output_dir), from_stage=from_stage)
+        return values["output_video"], report
+    finally:
+        if owns_executor:
+            download_executor.shutdown(wait=False, cancel_futures=True)
 
+async def generate_video(script: str, video_type: str, output_dir: str, caption_source: str = "tts", render_backend: str = "moviepy", render_workers: int = 1, output_file: str = "rendered_video.mp4", from_stage: str = None, whisper_workers: int = 1, whisper_draft: bool = False,
+                         render_incremental: bool = False) -> str:
+    """Generate a video from the given script."""
+    try:
+        output_video, report = await run_pipeline(script, video_type, output_dir, output_file, caption_source, render_backend, render_workers,
+                                                  from_stage=from_stage, whisper_workers=whisper_workers, whisper_draft=whisper_draft,
+                                                  render_incremental=render_incremental)
+        logger.info(f"Stage timings:\n{report.format()}")
         return output_video
 
     except Exception as e:
         logger.error(f"An error occurred during video generation: {str(e)}")
         raise
 
-async def main(script_file: str, video_type: str, output_dir: str):
+async def main(script_file: str, video_type: str, output_dir: str, preload_whisper: bool = False, caption_source: str = "tts", render_backend: str = "moviepy", render_workers: int = 1, from_stage: str = None, whisper_workers: int = 1, whisper_draft: bool = False,
+               render_incremental: bool = False):
     """Main function to orchestrate the video generation process."""
     try:
         os.makedirs(output_dir, exist_ok=True)
+        if preload_whisper:
+            model_size, dtype = get_whisper_settings(whisper_draft)
+            get_registry().warm_up([(model_size, DEFAULT_DEVICE, dtype)])
+            logger.info("Whisper model preloaded")
         script = read_script_from_file(script_file)
         logger.info(f"Script read from file: {script[:50]}...")
 
-        output_video = await generate_video(script, video_type, output_dir)
+        output_video = await generate_video(script, video_type, output_dir, caption_source, render_backend, render_workers,
+                                            from_stage=from_stage, whisper_workers=whisper_workers, whisper_draft=whisper_draft,
+                                            render_incremental=render_incremental)
         logger.info(f"Video generation completed. Output: {output_video}")
 
     except Exception as e:
         logger.error(f"Video generation failed: {str(e)}")
 
+async def run_batch(jobs_file: str, workers: int, preload_whisper: bool = False, caption_source: str = "tts", render_backend: str = "moviepy", render_workers: int = 1, whisper_workers: int = 1, whisper_draft: bool = False,
+                    render_incremental: bool = False):
+    """Run every job of a JSONL batch with up to `workers` jobs in flight.
+
+    All jobs share this process's Whisper model, LLM clients, Pexels session and
+    download threads. Each job writes into its own work directory next to its output.
+    """
+    from utility.video.background_video_generator import create_pexels_session
+    jobs = read_jobs(jobs_file)
+    logger.info(f"Batch read from {jobs_file}: {len(jobs)} jobs, {workers} workers")
+    if preload_whisper:
+        model_size, dtype = get_whisper_settings(whisper_draft)
+        get_registry().warm_up([(model_size, DEFAULT_DEVICE, dtype)])
+
+    semaphore = asyncio.Semaphore(workers)
+    download_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS * workers)
+    reports = []
+    failed = []
+    batch_start = time.perf_counter()
+
+    async def run_job(job: dict) -> None:
+        async with semaphore:
+            try:
+                os.makedirs(job["work_dir"], exist_ok=True)
+                script = job["script"] if "script" in job else read_script_from_file(job["script_file"])
+                output_video, report = await run_pipeline(
+                    script, job["video_type"], job["work_dir"], job["output"], caption_source,
+                    render_backend, render_workers, pexels_session, download_executor,
+                    whisper_workers=whisper_workers, whisper_draft=whisper_draft, render_incremental=render_incremental
+                )
+                reports.append(report)
+                logger.info(f"Job {job['id']} completed. Output: {output_video}")
+            except Exception as e:
+                failed.append(job["id"])
+                logger.error(f"Job {job['id']} failed: {str(e)}")
+
+    pexels_session = create_pexels_session()
+    try:
+        await asyncio.gather(*(run_job(job) for job in jobs))
+    finally:
+        await pexels_session.close()
+        download_executor.shutdown(wait=False, cancel_futures=True)
+
+    logger.info(format_batch_summary(reports, len(failed), time.perf_counter() - batch_start))
+
+def get_service_process_counts(render_workers: int, whisper_workers: int) -> dict:
+    """Size the Whisper and render pools so that together they fill the cores once."""
+    cores = os.cpu_count() or 1
+    render_processes = max(1, cores // (2 * max(1, render_workers)))
+    whisper_processes = max(1, cores // (2 * max(1, whisper_workers)))
+    return {"whisper": whisper_processes, "render": render_processes}
+
+@contextlib.asynccontextmanager
+async def open_job_service(host: str, port: int, workers: int, queue_size: int, caption_source: str = "tts", render_backend: str = "moviepy", render_workers: int = 1,
+                           whisper_workers: int = 1, whisper_draft: bool = False, render_incremental: bool = False):
+    """Start the HTTP job service and yield it; on exit, stop it and release its pools.
+
+    The Pexels session, download threads, LLM clients and the process pools (with the
+    Whisper models their workers loaded) live as long as the service, so every job
+    after the first skips their startup.
+    """
+    from utility.pipeline.service import JobService, StagePools
+    from utility.video.background_video_generator import create_pexels_session
+
+    pools = StagePools(SERVICE_STAGE_CLASSES, SERVICE_IO_LIMITS, get_service_process_counts(render_workers, whisper_workers))
+    download_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS * workers)
+    pexels_session = create_pexels_session()
+
+    async def run_job(job: dict) -> tuple:
+        os.makedirs(job["work_dir"], exist_ok=True)
+        script = job["script"] if "script" in job else read_script_from_file(job["script_file"])
+        return await run_pipeline(
+            script, job["video_type"], job["work_dir"], job["output"], caption_source,
+            render_backend, render_workers, pexels_session, download_executor,
+            whisper_workers=whisper_workers, whisper_draft=whisper_draft, render_incremental=render_incremental,
+            stage_executors=pools.executors(), stage_limits=pools.limits()
+        )
+
+    service = JobService(run_job, workers, queue_size, pools)
+    try:
+        await service.start(host, port)
+        yield service
+    finally:
+        await service.stop()
+        await pexels_session.close()
+        download_executor.shutdown(wait=False, cancel_futures=True)
+        pools.shutdown()
+
+async def run_service(host: str, port: int, workers: int, queue_size: int, caption_source: str = "tts", render_backend: str = "moviepy", render_workers: int = 1,
+                      whisper_workers: int = 1, whisper_draft: bool = False, render_incremental: bool = False):
+    """Serve jobs over HTTP until interrupted."""
+    async with open_job_service(host, port, workers, queue_size, caption_source, render_backend, render_workers,
+                                whisper_workers, whisper_draft, render_incremental):
+        await asyncio.Event().wait()
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate a video from a script file.")
-    parser.add_argument("script_file", type=str, help="Path to the script file")
+    parser.add_argument("script_file", type=str, nargs="?", help="Path to the script file")
+    parser.add_argument("--batch", type=str, help="Path to a JSONL file of jobs to run instead of a single script")
+    parser.add_argument("--serve", action="store_true", help="Run as a long-lived service that accepts jobs over HTTP")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address the job service listens on")
+    parser.add_argument("--port", type=int, default=8080, help="Port the job service listens on")
+    parser.add_argument("--queue_size", type=int, default=32, help="Jobs the service holds before refusing new ones")
+    parser.add_argument("--workers", type=int, default=2, help="Number of batch or service jobs processed at the same time")
     parser.add_argument("--video_type", type=str, choices=['short', 'long'], default='short', help="Type of video to generate")
     parser.add_argument("--output_dir", type=str, default="output", help="Directory to store output files")
+    parser.add_argument("--caption_source", type=str, choices=['tts', 'whisper'], default='tts', help="Take caption timings from TTS word boundaries or from a Whisper transcription")
+    parser.add_argument("--render_backend", type=str, choices=['moviepy', 'ffmpeg'], default='moviepy', help="Render with the MoviePy compositor or a single ffmpeg filtergraph")
+    parser.add_argument("--render_workers", type=int, default=1, help="Render the MoviePy timeline as parallel chunks with this many worker processes")
+    parser.add_argument("--render_incremental", action="store_true", help="Cache rendered chunks and re-encode only the parts of the video that changed")
+    parser.add_argument("--whisper_workers", type=int, default=1, help="Transcribe long audio as parallel chunks with this many worker processes")
+    parser.add_argument("--whisper_draft", action="store_true", help="Transcribe with a smaller int8 Whisper model for faster draft runs")
+    parser.add_argument("--from_stage", type=str, choices=[stage.name for stage in build_pipeline()], help="Recompute this stage and every later one even if checkpoints are up to date")
+    parser.add_argument("--preload_whisper", action="store_true", help="Load the Whisper model before processing starts")
 
     args = parser.parse_args()
 
-    asyncio.run(main(args.script_file, args.video_type, args.output_dir))
+    if not args.batch and not args.script_file and not args.serve:
+        parser.error("either script_file, --batch or --serve is required")
+    try:
+        if args.serve:
+            asyncio.run(run_service(args.host, args.port, args.workers, args.queue_size, args.caption_source, args.render_backend, args.render_workers,
+                                    args.whisper_workers, args.whisper_draft, args.render_incremental))
+        elif args.batch:
+            asyncio.run(run_batch(args.batch, args.workers, args.preload_whisper, args.caption_source, args.render_backend, args.render_workers,
+                                  args.whisper_workers, args.whisper_draft, args.render_incremental))
+        else:
+            asyncio.run(main(args.script_file, args.video_type, args.output_dir, args.preload_whisper, args.caption_source, args.render_backend, args.render_workers, args.from_stage,
+                             args.whisper_workers, args.whisper_draft, args.render_incremental))
+    finally:
+        # Drain the telemetry queue and export the call metrics of this run
+        telemetry = get_telemetry()
+        telemetry.close()
+        telemetry.write_snapshot()
@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import math
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import subprocess
+from typing import List, Optional, Tuple
+from aiohttp import web
+from pydub import AudioSegment
+from pydub.generators import Sine
+from utility.render.segment_preprocessor import get_ffmpeg_path
+
+logger = logging.getLogger(__name__)
+
+# Speaking rate of the fake TTS voice
+SECONDS_PER_WORD = 0.3
+# Length of each caption window covered by one set of search terms
+SEARCH_SEGMENT_SECONDS = 3.0
+# Generated test clips served by the fake Pexels API
+CLIP_COUNT = 8
+CLIP_SECONDS = 6
+CLIP_SIZE = (640, 360)
+
+WORDS = (
+    "ocean mountain river forest city night light storm desert garden ancient future "
+    "machine planet music history science energy journey silence market bridge island "
+    "cloud winter summer harvest engine signal window shadow crystal"
+).split()
+
+def make_script(word_count: int, seed: int = 0) -> str:
+    """Return a deterministic script of roughly `word_count` words in 12-word sentences."""
+    rng = random.Random(seed)
+    sentences = []
+    for start in range(0, word_count, 12):
+        words = [rng.choice(WORDS) for _ in range(min(12, word_count - start))]
+        sentences.append(" ".join(words).capitalize())
+    return ". ".join(sentences) + "."
+
+def make_search_terms(captions_text: str) -> list:
+    """Build a search term list covering the end of the captions in the request."""
+    times = [float(value) for value in re.findall(r"\d+\.\d+|\d+", captions_text.split("Timed Captions:", 1)[-1])]
+    end = max(times, default=SEARCH_SEGMENT_SECONDS)
+    segments = []
+    for index in range(math.ceil(end / SEARCH_SEGMENT_SECONDS)):
+        t1 = index * SEARCH_SEGMENT_SECONDS
+        t2 = min(end, t1 + SEARCH_SEGMENT_SECONDS)
+        segments.append([[t1, t2], [WORDS[(index + k) % len(WORDS)] for k in range(3)]])
+    return segments
+
+async def fake_synthesize(sentence: str, voice: str, style: str, latency: float = 0.0) -> Tuple[AudioSegment, List[dict]]:
+    """Stand-in for `synthesize_sentence`: a tone as long as the sentence takes to speak."""
+    if latency:
+        await asyncio.sleep(latency)
+    words = sentence.split()
+    duration_ms = max(1, int(len(words) * SECONDS_PER_WORD * 1000))
+    segment = Sine(220).to_audio_segment(duration=duration_ms, volume=-20).set_frame_rate(24000)
+    word_boundaries = [
+        {"text": word, "start": index * SECONDS_PER_WORD, "end": (index + 0.8) * SECONDS_PER_WORD}
+        for index, word in enumerate(words)
+    ]
+    return segment, word_boundaries
+
+def generate_test_clips(directory: str, count: int = CLIP_COUNT) -> List[str]:
+    """Encode small ffmpeg test-pattern clips to serve as stock footage."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"clip_{index}.mp4")
+        if not os.path.exists(path):
+            subprocess.run([
+                get_ffmpeg_path(), "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"testsrc=size={CLIP_SIZE[0]}x{CLIP_SIZE[1]}:rate=30:duration={CLIP_SECONDS}",
+                "-vf", f"hue=h={index * 360 // count}",
+                "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", path
+            ], check=True, capture_output=True)
+        paths.append(path)
+    return paths
+
+class FakeServices:
+    """Local HTTP stand-ins for the chat completions and Pexels APIs.
+
+    The chat endpoint answers the script editing prompt with the script and the search
+    term prompt with terms covering the captions. The Pexels endpoint returns generated
+    results whose links point at test clips served by the same server. `latency` delays
+    every response, `error_rate` answers that share of requests with HTTP 500 and
+    `malformed_rate` answers that share of searches with a truncated JSON body.
+    """
+
+    def __init__(self, clip_dir: str, script: str, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0, malformed_rate: float = 0.0):
+        self.clip_dir = clip_dir
+        self.script = script
+        self.latency = latency
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.requests = {"chat": 0, "search": 0, "clip": 0, "errors": 0}
+        self._rng = random.Random(seed)
+        self._clips: List[str] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self.base_url = None
+
+    async def _delay_or_fail(self) -> Optional[web.Response]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.requests["errors"] += 1
+            return web.Response(status=500, text="injected error")
+        return None
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        self.requests["chat"] += 1
+        failure = await self._delay_or_fail()
+        if failure:
+            return failure
+        body = await request.json()
+        user_content = body["messages"][-1]["content"]
+        if "Timed Captions:" in user_content:
+            content = json.dumps(make_search_terms(user_content))
+        else:
+            content = self.script
+        return web.json_response({
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model", "bench"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.requests["search"] += 1
+        failure = await self._delay_or_fail()
+        if failure:
+            return failure
+        if self.malformed_rate and self._rng.random() < self.malformed_rate:
+            self.requests["errors"] += 1
+            return web.Response(text='{"videos": [', content_type="application/json")
+        query = request.query.get("query", "")
+        page = int(request.query.get("page", 1))
+        per_page = int(request.query.get("per_page", 15))
+        videos = []
+        for index in range(per_page):
+            video_id = int(hashlib.sha256(f"{query}:{page}:{index}".encode()).hexdigest()[:8], 16)
+            videos.append({
+                "id": video_id,
+                "width": 1920,
+                "height": 1080,
+                "duration": 5 + video_id % 20,
+                "video_files": [{"width": 1920, "height": 1080, "link": f"{self.base_url}/clips/{video_id}.hd.mp4"}]
+            })
+        return web.json_response({"page": page, "per_page": per_page, "videos": videos})
+
+    async def clip(self, request: web.Request) -> web.StreamResponse:
+        self.requests["clip"] += 1
+        failure = await self._delay_or_fail()
+        if failure:
+            return failure
+        video_id = int(request.match_info["video_id"])
+        return web.FileResponse(self._clips[video_id % len(self._clips)])
+
+    def start(self) -> "FakeServices":
+        """Generate the test clips and serve the endpoints from a background thread."""
+        self._clips = generate_test_clips(self.clip_dir)
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_get("/videos/search", self.search)
+        app.router.add_get("/clips/{video_id}.hd.mp4", self.clip)
+
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def serve() -> None:
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(app, access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            self._loop.run_until_complete(site.start())
+            port = self._runner.addresses[0][1]
+            self.base_url = f"http://127.0.0.1:{port}"
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name="fake-services", daemon=True)
+        self._thread.start()
+        started.wait()
+        logger.info(f"Fake services listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self) -> "FakeServices":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,60 @@
+"""Startup budget check for the CLI.
+
+Runs `python -X importtime app.py --help` in a fresh interpreter and fails when the
+imports take longer than the budget or pull in a heavy dependency that should only
+be loaded by the stage that uses it:
+
+    python -m benchmarks.import_time --budget_ms 300
+"""
+import os
+import sys
+import argparse
+import subprocess
+from typing import List, Tuple
+
+# Import time allowed for `app.py --help`, also enforced by tests/test_import_time.py
+DEFAULT_BUDGET_MS = 300
+
+# Modules that must not be imported just to parse arguments
+HEAVY_MODULES = ["torch", "whisper_timestamped", "moviepy", "openai", "groq", "edge_tts", "pydub", "aiohttp", "requests", "numpy", "PIL"]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_imports(argv: List[str]) -> List[Tuple[str, int, int, int]]:
+    """Return (module, self_us, cumulative_us, depth) for every import of a fresh run."""
+    result = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=REPO_ROOT, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check the import time of `app.py --help`.")
+    parser.add_argument("--budget_ms", type=float, default=DEFAULT_BUDGET_MS, help="Maximum total import time in milliseconds")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest top-level imports to print")
+    args = parser.parse_args()
+
+    imports = measure_imports(["app.py", "--help"])
+    top_level = [item for item in imports if item[3] == 0]
+    total_ms = sum(cumulative for _, _, cumulative, _ in top_level) / 1000
+    for name, _, cumulative, _ in sorted(top_level, key=lambda item: item[2], reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>9.1f} ms  {name}")
+    print(f"total {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    loaded = {name.split(".")[0] for name, _, _, _ in imports}
+    heavy = [name for name in HEAVY_MODULES if name in loaded]
+    failed = False
+    if heavy:
+        print(f"Heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("Import time is over budget")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
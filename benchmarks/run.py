@@ -0,0 +1,366 @@
+"""Offline benchmarks of the video pipeline.
+
+Every external service is replaced by a local stand-in (see benchmarks/fakes.py), so
+the numbers measure this code rather than the network:
+
+    python -m benchmarks.run --sizes short long --repeat 3 --output bench.json
+    python -m benchmarks.run --compare bench_before.json --output bench_after.json
+
+Results are written as JSON together with the commit they were measured on.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import logging
+import importlib.util
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from functools import partial
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+SIZES = {
+    "short": {"words": 140, "video_type": "short"},
+    "long": {"words": 1300, "video_type": "long"}
+}
+STAGES = ["audio", "tts_concurrency", "audio_handoff", "whisper_load", "captions", "timestamp_index", "timestamp_sweep", "caption_raster", "search_terms", "video_urls", "render", "render_scaling", "pipeline", "pipeline_sequential"]
+
+def configure_environment(work_dir: str) -> None:
+    """Point every cache and log directory at `work_dir` and lift the Pexels rate limit.
+
+    Must run before any `utility` module is imported, since they read these at import.
+    """
+    os.environ["ETOA_CACHE_DIR"] = os.path.join(work_dir, "cache")
+    os.environ["ETOA_TELEMETRY_DIR"] = os.path.join(work_dir, "logs")
+    os.environ["PEXELS_RATE_LIMIT"] = "1000000"
+    os.environ["PEXELS_RATE_BURST"] = "1000000"
+    os.environ["PEXELS_KEY"] = "bench"
+    os.environ["OPENAI_KEY"] = "bench"
+    os.environ["LLM_CACHE_REPLAY"] = "0"
+    os.environ.pop("GROQ_API_KEY", None)
+
+def point_at_services(base_url: str) -> None:
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ["PEXELS_API_URL"] = f"{base_url}/videos/search"
+
+def clear_cache_files(cache_dir: str) -> None:
+    """Empty the persistent caches between runs while keeping their directories."""
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            try:
+                os.remove(os.path.join(root, name))
+            except OSError:
+                pass
+
+def get_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (subprocess.CalledProcessError, OSError):
+        return "unknown"
+
+def summarize(runs: List[float]) -> dict:
+    return {"runs": runs, "min": min(runs), "median": statistics.median(runs), "mean": statistics.mean(runs)}
+
+def time_call(func: Callable[[], object], repeat: int, before: Callable[[], None] = None) -> dict:
+    runs = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return summarize(runs)
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """Return the peak of Python memory allocations made by one call, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def benchmark_size(size: str, stages: List[str], args: argparse.Namespace, work_dir: str) -> Dict[str, dict]:
+    """Run the selected stages for one input size and return their timings."""
+    from benchmarks.fakes import SECONDS_PER_WORD, fake_synthesize, make_script
+    from utility.audio import audio_generator
+    from utility.audio.audio_buffer import AudioBuffer, open_audio
+    from utility.render.segment_preprocessor import get_ffmpeg_path
+    from utility.captions.timed_captions_generator import (TimestampIndex, generate_timed_captions_from_words, get_timestamp_mapping,
+                                                           interpolate_time_from_dict, word_timings_to_analysis)
+    from utility.render.caption_renderer import render_caption
+    from utility.render.render_engine import get_output_media
+    from utility.video.background_video_generator import generate_video_url
+    from utility.video.video_search_query_generator import getVideoSearchQueriesTimed, merge_empty_intervals
+
+    script = make_script(SIZES[size]["words"], seed=args.seed)
+    synthesize = partial(fake_synthesize, latency=args.tts_latency)
+    cache_dir = os.environ["ETOA_CACHE_DIR"]
+    cold = None if args.warm else partial(clear_cache_files, cache_dir)
+    size_dir = os.path.join(work_dir, size)
+    os.makedirs(size_dir, exist_ok=True)
+    audio_file = os.path.join(size_dir, "audio.wav")
+    results = {}
+
+    # Later stages consume earlier outputs, so those are always produced once up front
+    word_timings = asyncio.run(audio_generator.generate_audio(script, audio_file, synthesize=synthesize))
+    timed_captions = generate_timed_captions_from_words(word_timings)
+
+    if "audio" in stages:
+        results["audio"] = time_call(lambda: asyncio.run(audio_generator.generate_audio(script, audio_file, synthesize=synthesize)), args.repeat)
+    if "tts_concurrency" in stages:
+        # Sentences synthesized at once against wall time and the PCM held while reordering
+        for concurrency in (1, 2, 4, 8, 16):
+            synthesize_all = lambda: asyncio.run(audio_generator.generate_audio_buffer(script, concurrency, synthesize))
+            results[f"tts_concurrency_{concurrency}"] = {**time_call(synthesize_all, args.repeat), "concurrency": concurrency,
+                                                         "peak_bytes": peak_memory(synthesize_all)}
+    if "audio_handoff" in stages:
+        # How the caption and render stages get the narration: two ffmpeg decodes of the
+        # WAV (as Whisper and AudioFileClip do) against the shared in-memory buffer
+        def decode_file() -> None:
+            for rate in (16000, 24000):
+                subprocess.run([get_ffmpeg_path(), "-nostdin", "-loglevel", "error", "-i", audio_file, "-f", "s16le", "-ac", "1", "-ar", str(rate), "-"],
+                               check=True, capture_output=True)
+
+        def decode_shared() -> None:
+            buffer = AudioBuffer(shared.samples, shared.sample_rate)
+            buffer.to_whisper()
+            buffer.to_float()
+
+        shared = open_audio(audio_file)
+        results["audio_handoff_file"] = time_call(decode_file, args.repeat)
+        results["audio_handoff_shared"] = time_call(decode_shared, args.repeat)
+    if "whisper_load" in stages:
+        # The first caption job of a process, which loads the model, against later jobs served by the registry
+        from utility.captions.timed_captions_generator import generate_timed_captions
+        from utility.captions.whisper_model_registry import get_registry
+        if importlib.util.find_spec("whisper_timestamped") is None:
+            results["whisper_captions_cold"] = results["whisper_captions_warm"] = {"skipped": "whisper_timestamped not installed"}
+        else:
+            caption = lambda: generate_timed_captions(audio_file)
+            results["whisper_captions_cold"] = time_call(caption, args.repeat, before=get_registry().clear)
+            results["whisper_captions_warm"] = time_call(caption, args.repeat)
+            get_registry().clear()
+    if "captions" in stages:
+        results["captions"] = time_call(lambda: generate_timed_captions_from_words(word_timings), args.repeat)
+    if "timestamp_index" in stages:
+        analysis = word_timings_to_analysis(word_timings)
+        index = TimestampIndex.from_analysis(analysis)
+        positions = list(range(len(script)))
+        results["timestamp_index"] = time_call(lambda: index.lookup_many(positions), args.repeat)
+    if "timestamp_sweep" in stages:
+        # Lookups of every caption end by transcript length; the linear scan is quadratic, so it stops at 10k words
+        for word_count in (100, 1000, 10000, 100000):
+            words = make_script(word_count, seed=args.seed).split()
+            analysis = word_timings_to_analysis([
+                {"text": word, "start": index * SECONDS_PER_WORD, "end": (index + 0.8) * SECONDS_PER_WORD} for index, word in enumerate(words)
+            ])
+            positions = list(range(0, len(analysis["text"]), 12))
+            results[f"timestamp_sweep_{word_count}"] = time_call(lambda: TimestampIndex.from_analysis(analysis).lookup_many(positions), args.repeat)
+            if word_count <= 10000:
+                mapping = get_timestamp_mapping(analysis)
+                results[f"timestamp_sweep_linear_{word_count}"] = time_call(
+                    lambda: [interpolate_time_from_dict(position, mapping) for position in positions], args.repeat
+                )
+    if "caption_raster" in stages:
+        from moviepy.editor import ColorClip, CompositeVideoClip
+        from utility.render.caption_renderer import FRAME_SIZE
+        from utility.render.compositor import VIDEO_FPS, build_visual_clips, close_clips, configure_imagemagick, create_caption_clip
+        from utility.timeline import Timeline
+
+        def render_all() -> None:
+            render_caption.cache_clear()
+            for _, text in timed_captions:
+                render_caption(text, fontsize=50, color="white", stroke_width=2, stroke_color="black")
+
+        def render_all_imagemagick() -> None:
+            close_clips([create_caption_clip(text, "imagemagick") for _, text in timed_captions])
+
+        results["caption_raster"] = time_call(render_all, args.repeat)
+        # The TextClip path this replaced shells out to ImageMagick for every caption
+        if shutil.which("magick") or shutil.which("convert"):
+            configure_imagemagick()
+            results["caption_raster_imagemagick"] = time_call(render_all_imagemagick, args.repeat)
+        else:
+            results["caption_raster_imagemagick"] = {"skipped": "ImageMagick not found"}
+
+        # Compositing cost per output frame: the captions over a plain background, sampled across the track
+        frame_count = int(timed_captions.end * VIDEO_FPS)
+        frame_times = [index / VIDEO_FPS for index in range(0, frame_count, max(1, frame_count // 50))]
+        for backend in ("pillow", "imagemagick"):
+            if backend == "imagemagick" and "skipped" in results["caption_raster_imagemagick"]:
+                results["caption_composite_imagemagick"] = results["caption_raster_imagemagick"]
+                continue
+            clips = build_visual_clips(timed_captions, Timeline(), backend)
+            video = CompositeVideoClip([ColorClip(FRAME_SIZE, color=(0, 0, 0), duration=timed_captions.end)] + clips, size=FRAME_SIZE)
+            timing = time_call(lambda: [video.get_frame(t) for t in frame_times], args.repeat)
+            results[f"caption_composite_{backend}"] = {**timing, "frames": len(frame_times),
+                                                       "per_frame": timing["median"] / max(1, len(frame_times))}
+            close_clips(clips)
+
+    search_terms = getVideoSearchQueriesTimed(script, timed_captions)
+    if "search_terms" in stages:
+        results["search_terms"] = time_call(lambda: getVideoSearchQueriesTimed(script, timed_captions), args.repeat, before=cold)
+
+    video_urls = generate_video_url(search_terms, "pexel")
+    if "video_urls" in stages:
+        results["video_urls"] = time_call(lambda: generate_video_url(search_terms, "pexel"), args.repeat, before=cold)
+
+    if "render" in stages:
+        merged = merge_empty_intervals(video_urls)
+        output_file = os.path.join(size_dir, "render.mp4")
+        results["render"] = time_call(
+            lambda: get_output_media(audio_file, timed_captions, merged, "pexel", backend=args.render_backend, workers=args.render_workers, output_file=output_file),
+            args.repeat, before=cold
+        )
+
+    if "render_scaling" in stages:
+        # Chunked MoviePy render at growing worker counts; one worker renders in a single pass
+        merged = merge_empty_intervals(video_urls)
+        output_file = os.path.join(size_dir, "render_scaling.mp4")
+        cores = os.cpu_count() or 1
+        worker_counts = sorted({1, cores} | {2 ** power for power in range(cores.bit_length()) if 2 ** power <= cores})
+        for workers in worker_counts:
+            timing = time_call(
+                lambda: get_output_media(audio_file, timed_captions, merged, "pexel", backend="moviepy", workers=workers, output_file=output_file),
+                args.repeat
+            )
+            baseline = results.get("render_scaling_1", timing)["median"]
+            results[f"render_scaling_{workers}"] = {**timing, "workers": workers, "speedup": baseline / timing["median"] if timing["median"] else 0.0}
+
+    if "pipeline" in stages:
+        import app
+        # The pipeline synthesizes through the module-level function, so route it to the fake
+        audio_generator.synthesize_sentence = synthesize
+        runs = []
+        stage_reports = []
+        for run_index in range(args.repeat):
+            if cold:
+                cold()
+            run_dir = os.path.join(size_dir, f"pipeline_{run_index}")
+            os.makedirs(run_dir, exist_ok=True)
+            start = time.perf_counter()
+            _, report = asyncio.run(app.run_pipeline(
+                script, SIZES[size]["video_type"], run_dir, os.path.join(run_dir, "output.mp4"),
+                render_backend=args.render_backend, render_workers=args.render_workers
+            ))
+            runs.append(time.perf_counter() - start)
+            stage_reports.append(report.as_dict())
+        results["pipeline"] = {**summarize(runs), "stage_reports": stage_reports}
+
+    if "pipeline_sequential" in stages:
+        import app
+        audio_generator.synthesize_sentence = synthesize
+
+        async def run_sequential(run_dir: str) -> None:
+            # One semaphore shared by every stage runs them one at a time, as before the stage graph
+            one_at_a_time = asyncio.Semaphore(1)
+            await app.run_pipeline(
+                script, SIZES[size]["video_type"], run_dir, os.path.join(run_dir, "output.mp4"),
+                render_backend=args.render_backend, render_workers=args.render_workers,
+                stage_limits={stage.name: one_at_a_time for stage in app.build_pipeline()}
+            )
+
+        runs = []
+        for run_index in range(args.repeat):
+            if cold:
+                cold()
+            run_dir = os.path.join(size_dir, f"pipeline_sequential_{run_index}")
+            os.makedirs(run_dir, exist_ok=True)
+            start = time.perf_counter()
+            asyncio.run(run_sequential(run_dir))
+            runs.append(time.perf_counter() - start)
+        results["pipeline_sequential"] = summarize(runs)
+        if "pipeline" in results:
+            results["pipeline_sequential"]["dag_speedup"] = results["pipeline_sequential"]["median"] / results["pipeline"]["median"]
+
+    return results
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Print median ratios against a baseline and return the regressed stages."""
+    regressions = []
+    print(f"{'size':<6} {'stage':<16} {'before':>9} {'after':>9} {'ratio':>7}")
+    for size, stages in current["results"].items():
+        for stage, timing in stages.items():
+            before = baseline.get("results", {}).get(size, {}).get(stage)
+            if not before or "median" not in before or "median" not in timing:
+                # Skipped stages, such as those whose tool is not installed, have no timing
+                continue
+            ratio = timing["median"] / before["median"] if before["median"] else float("inf")
+            flag = ""
+            if ratio > 1 + threshold:
+                regressions.append(f"{size}/{stage}")
+                flag = " REGRESSION"
+            print(f"{size:<6} {stage:<16} {before['median']:>9.3f} {timing['median']:>9.3f} {ratio:>7.2f}{flag}")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against local stand-in services.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES), help="Script sizes to benchmark")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated script and injected errors")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latency of every fake API response in seconds")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Share of fake API requests answered with HTTP 500")
+    parser.add_argument("--tts_latency", type=float, default=0.2, help="Latency of every fake TTS sentence in seconds")
+    parser.add_argument("--render_backend", choices=["moviepy", "ffmpeg"], default="ffmpeg", help="Render backend to benchmark")
+    parser.add_argument("--render_workers", type=int, default=1, help="Chunk workers of the MoviePy render")
+    parser.add_argument("--warm", action="store_true", help="Keep the persistent caches between runs instead of starting cold")
+    parser.add_argument("--work_dir", type=str, help="Directory for caches and outputs (default: a temporary directory)")
+    parser.add_argument("--output", type=str, default="bench_results.json", help="Where to write the results")
+    parser.add_argument("--compare", type=str, help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown of the median that counts as a regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="etoa-bench-")
+    configure_environment(work_dir)
+
+    from benchmarks.fakes import FakeServices, make_script
+    services = FakeServices(os.path.join(work_dir, "clips"), make_script(SIZES["long"]["words"], args.seed),
+                            latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    results = {}
+    with services:
+        point_at_services(services.base_url)
+        for size in args.sizes:
+            # The chat stand-in answers the script editing prompt with the script of this size
+            services.script = make_script(SIZES[size]["words"], args.seed)
+            results[size] = benchmark_size(size, args.stages, args, work_dir)
+
+    output = {
+        "meta": {
+            "commit": get_commit(),
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "work_dir")}
+        },
+        "requests": services.requests,
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), output, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
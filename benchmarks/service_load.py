@@ -0,0 +1,160 @@
+"""Load test of the job service against local stand-in services.
+
+Starts the service in this process (TTS replaced by the fake voice, LLM and Pexels
+by benchmarks/fakes.py), submits jobs faster than it can run them and reports
+throughput, latency, queue waits, refused submissions and cancellations:
+
+    python -m benchmarks.service_load --jobs 40 --rate 4 --workers 4 --queue_size 8 --output service.json
+
+Refused submissions (HTTP 429) are retried after the Retry-After the service asks for.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import tempfile
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.5
+
+async def submit(session, base_url: str, spec: dict, stats: dict) -> dict:
+    """Submit a job, waiting out 429 responses, and return its initial status."""
+    while True:
+        async with session.post(f"{base_url}/jobs", json=spec) as response:
+            body = await response.json()
+            if response.status == 202:
+                return body
+            if response.status != 429:
+                raise RuntimeError(f"Submission refused with HTTP {response.status}: {body}")
+            stats["refused"] += 1
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+async def wait_for(session, base_url: str, job_id: str) -> dict:
+    while True:
+        async with session.get(f"{base_url}/jobs/{job_id}") as response:
+            job = await response.json()
+        if job["status"] in ("completed", "failed", "cancelled"):
+            return job
+        await asyncio.sleep(POLL_INTERVAL)
+
+async def drive(base_url: str, args: argparse.Namespace, script: str, output_dir: str) -> dict:
+    import aiohttp
+    from utility.pipeline.batch import percentile
+
+    rng = random.Random(args.seed)
+    stats = {"refused": 0, "cancel_requests": 0}
+    peak_queued = 0
+
+    async def run_one(index: int) -> dict:
+        await asyncio.sleep(index / args.rate)
+        submitted = time.time()
+        spec = {"script": script, "video_type": "short", "output": os.path.join(output_dir, f"job_{index}.mp4")}
+        job = await submit(session, base_url, spec, stats)
+        if rng.random() < args.cancel_rate:
+            await asyncio.sleep(rng.uniform(0, 2))
+            async with session.delete(f"{base_url}/jobs/{job['id']}"):
+                stats["cancel_requests"] += 1
+        job = await wait_for(session, base_url, job["id"])
+        job["submitted"] = submitted
+        return job
+
+    async def sample_status() -> None:
+        nonlocal peak_queued
+        while True:
+            async with session.get(f"{base_url}/status") as response:
+                peak_queued = max(peak_queued, (await response.json())["queued"])
+            await asyncio.sleep(POLL_INTERVAL)
+
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        sampler = asyncio.ensure_future(sample_status())
+        try:
+            jobs = await asyncio.gather(*(run_one(index) for index in range(args.jobs)))
+        finally:
+            sampler.cancel()
+        async with session.get(f"{base_url}/status") as response:
+            final_status = await response.json()
+    elapsed = time.perf_counter() - start
+
+    completed = [job for job in jobs if job["status"] == "completed"]
+    latencies = [job["finished"] - job["submitted"] for job in completed]
+    waits = [job["started"] - job["created"] for job in jobs if job["started"]]
+    return {
+        "jobs": args.jobs,
+        "completed": len(completed),
+        "failed": sum(job["status"] == "failed" for job in jobs),
+        "cancelled": sum(job["status"] == "cancelled" for job in jobs),
+        "refused_submissions": stats["refused"],
+        "cancel_requests": stats["cancel_requests"],
+        "peak_queued": peak_queued,
+        "seconds": elapsed,
+        "videos_per_hour": len(completed) / elapsed * 3600 if elapsed > 0 else 0.0,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "queue_wait_p50": percentile(waits, 0.5),
+        "queue_wait_p95": percentile(waits, 0.95),
+        "service": final_status
+    }
+
+async def run(args: argparse.Namespace, work_dir: str) -> dict:
+    import app
+    from benchmarks.fakes import fake_synthesize, make_script
+    from utility.audio import audio_generator
+
+    # Jobs synthesize through the module-level function, so route it to the fake voice
+    audio_generator.synthesize_sentence = partial(fake_synthesize, latency=args.tts_latency)
+    script = make_script(args.words, args.seed)
+    output_dir = os.path.join(work_dir, "jobs")
+    os.makedirs(output_dir, exist_ok=True)
+    async with app.open_job_service("127.0.0.1", 0, args.workers, args.queue_size, render_backend=args.render_backend,
+                                    render_workers=args.render_workers) as service:
+        return await drive(service.url, args, script, output_dir)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the job service against local stand-in services.")
+    parser.add_argument("--jobs", type=int, default=20, help="Jobs to submit")
+    parser.add_argument("--rate", type=float, default=2.0, help="Submissions per second")
+    parser.add_argument("--words", type=int, default=140, help="Words in each job's script")
+    parser.add_argument("--workers", type=int, default=4, help="Jobs the service runs at the same time")
+    parser.add_argument("--queue_size", type=int, default=8, help="Jobs the service holds before refusing new ones")
+    parser.add_argument("--cancel_rate", type=float, default=0.1, help="Share of jobs cancelled shortly after submission")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated script, cancellations and injected errors")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latency of every fake API response in seconds")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Share of fake API requests answered with HTTP 500")
+    parser.add_argument("--tts_latency", type=float, default=0.2, help="Latency of every fake TTS sentence in seconds")
+    parser.add_argument("--render_backend", choices=["moviepy", "ffmpeg"], default="ffmpeg", help="Render backend of the jobs")
+    parser.add_argument("--render_workers", type=int, default=1, help="Chunk workers of the MoviePy render")
+    parser.add_argument("--work_dir", type=str, help="Directory for caches and outputs (default: a temporary directory)")
+    parser.add_argument("--output", type=str, default="service_load.json", help="Where to write the results")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="etoa-service-")
+
+    from benchmarks.run import configure_environment, point_at_services
+    configure_environment(work_dir)
+
+    from benchmarks.fakes import FakeServices, make_script
+    services = FakeServices(os.path.join(work_dir, "clips"), make_script(args.words, args.seed),
+                            latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    with services:
+        point_at_services(services.base_url)
+        results = asyncio.run(run(args, work_dir))
+    results["requests"] = services.requests
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"{results['completed']}/{results['jobs']} completed, {results['cancelled']} cancelled, {results['failed']} failed, "
+          f"{results['refused_submissions']} refused submissions, {results['videos_per_hour']:.1f} videos/hour, "
+          f"p95 latency {results['latency_p95']:.1f}s")
+    print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
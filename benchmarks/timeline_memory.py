@@ -0,0 +1,116 @@
+"""Peak memory and ffmpeg process count of the MoviePy background timeline.
+
+Builds timelines of growing length from generated test clips and reads them frame
+by frame, the way `write_videofile` does, while sampling the RSS of this process
+and its children (Linux /proc):
+
+    python -m benchmarks.timeline_memory --segments 25 50 100 200 --output timeline.json
+
+With the lazy timeline both numbers should stay flat as the segment count grows.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from typing import List
+
+SEGMENT_SECONDS = 2.0
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+def rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+class ResourceSampler:
+    """Samples the peak RSS and child process count of this process in a thread."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_children = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        pid = os.getpid()
+        while not self._stop.is_set():
+            children = child_pids(pid)
+            self.peak_children = max(self.peak_children, len(children))
+            self.peak_rss = max(self.peak_rss, rss_bytes(pid) + sum(rss_bytes(child) for child in children))
+            time.sleep(self.interval)
+
+    def __enter__(self) -> "ResourceSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+def measure(clips: List[str], segments: int, lazy: bool, fps: float) -> dict:
+    from moviepy.editor import CompositeVideoClip
+    from utility.render.compositor import build_visual_clips, close_clips
+
+    duration = segments * SEGMENT_SECONDS
+    local_video_data = [((i * SEGMENT_SECONDS, (i + 1) * SEGMENT_SECONDS), clips[i % len(clips)]) for i in range(segments)]
+    start = time.perf_counter()
+    with ResourceSampler() as sampler:
+        visual_clips = build_visual_clips([], local_video_data, duration=duration if lazy else None)
+        video = CompositeVideoClip(visual_clips, size=(1920, 1080)).set_duration(duration)
+        for frame_index in range(int(duration * fps)):
+            video.get_frame(frame_index / fps)
+        close_clips(visual_clips)
+    return {
+        "segments": segments,
+        "mode": "lazy" if lazy else "eager",
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": sampler.peak_rss / 1024 ** 2,
+        "peak_child_processes": sampler.peak_children
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure peak memory and processes of the background timeline.")
+    parser.add_argument("--segments", nargs="+", type=int, default=[25, 50, 100, 200], help="Timeline lengths in segments")
+    parser.add_argument("--modes", nargs="+", choices=["lazy", "eager"], default=["lazy", "eager"], help="Timelines to measure")
+    parser.add_argument("--fps", type=float, default=2, help="Frames read per second of timeline")
+    parser.add_argument("--output", type=str, default="timeline_memory.json", help="Where to write the results")
+    args = parser.parse_args()
+
+    from benchmarks.fakes import generate_test_clips
+    clips = generate_test_clips(os.path.join(tempfile.gettempdir(), "etoa-bench-clips"))
+
+    results = []
+    for segments in args.segments:
+        for mode in args.modes:
+            result = measure(clips, segments, mode == "lazy", args.fps)
+            results.append(result)
+            print(f"{segments:>5} segments {result['mode']:<6} {result['peak_rss_mb']:>8.1f} MB {result['peak_child_processes']:>4} processes {result['seconds']:>7.1f}s")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
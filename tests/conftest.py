@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Caches and telemetry of the modules under test go to a scratch directory instead of the checkout
+_scratch = tempfile.mkdtemp(prefix="etoa-tests-")
+os.environ.setdefault("ETOA_CACHE_DIR", os.path.join(_scratch, "cache"))
+os.environ.setdefault("ETOA_TELEMETRY_DIR", os.path.join(_scratch, "logs"))
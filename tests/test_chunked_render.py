@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("moviepy.editor")
+
+from utility.render.chunked_render import plan_chunks
+from utility.render.compositor import VIDEO_FPS
+from utility.render.render_cache import cover_pieces
+from utility.timeline import Timeline
+
+# Segment boundaries a fraction of a frame away from the frame grid
+BACKGROUND = Timeline([0.0, 2.51, 5.49], [2.51, 5.49, 8.0], ["a", "b", "c"])
+
+def frames_of(segments: Timeline, t1: float, t2: float) -> set:
+    """Return the payloads of the segments shown by the frames in [t1, t2)."""
+    shown = set()
+    for index in range(round(t1 * VIDEO_FPS), round(t2 * VIDEO_FPS)):
+        position = segments.find(index / VIDEO_FPS)
+        shown.add(segments.payloads[position])
+    return shown
+
+def test_chunks_do_not_carry_slivers_of_earlier_segments():
+    chunks = plan_chunks(BACKGROUND, 8.0, chunk_seconds=1.0)
+    assert len(chunks) == 3
+    for (t1, t2), expected in zip(chunks, "abc"):
+        assert frames_of(BACKGROUND, t1, t2) == {expected}
+
+def test_cached_pieces_hold_the_frames_of_their_segment():
+    pieces = cover_pieces(BACKGROUND, 8.0)
+    for (t1, t2), path in pieces:
+        assert frames_of(BACKGROUND, t1, t2) == {path}
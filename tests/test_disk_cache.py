@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from utility.cache import DiskCache
+
+def test_waiter_takes_over_a_cancelled_fetch(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    calls = []
+
+    async def fetch():
+        calls.append(True)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def run():
+        leader = asyncio.ensure_future(cache.get_or_fetch_async("key", fetch))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(cache.get_or_fetch_async("key", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == "value"
+    assert len(calls) == 2
+
+def test_event_loops_do_not_share_fetches(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    started = threading.Barrier(2)
+    results = []
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    def lookup():
+        started.wait()
+        results.append(asyncio.run(cache.get_or_fetch_async("key", fetch)))
+
+    threads = [threading.Thread(target=lookup) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["value", "value"]
@@ -0,0 +1,75 @@
+import os
+import re
+import subprocess
+import numpy as np
+import pytest
+
+pytest.importorskip("moviepy.editor")
+pytest.importorskip("imageio_ffmpeg")
+
+from utility.audio.audio_buffer import AudioBuffer
+from utility.render.compositor import VIDEO_FPS
+from utility.render.ffmpeg_backend import render_with_ffmpeg
+from utility.render.render_engine import render_with_moviepy
+from utility.render.segment_preprocessor import get_ffmpeg_path
+from utility.timeline import Timeline
+
+SAMPLE_RATE = 24000
+DURATION = 4.0
+
+def probe(path: str) -> tuple:
+    """Return (container duration, decoded video frames) of a file."""
+    result = subprocess.run([get_ffmpeg_path(), "-nostdin", "-i", path, "-map", "0:v:0", "-f", "null", "-"], capture_output=True, text=True)
+    hours, minutes, seconds = re.search(r"Duration: (\d+):(\d+):([\d.]+)", result.stderr).groups()
+    frames = re.findall(r"frame=\s*(\d+)", result.stderr)[-1]
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds), int(frames)
+
+def frame_brightness(path: str, t: float) -> float:
+    """Return the mean luma of the frame shown at `t`."""
+    result = subprocess.run([get_ffmpeg_path(), "-nostdin", "-loglevel", "error", "-ss", str(t), "-i", path, "-frames:v", "1",
+                             "-f", "rawvideo", "-pix_fmt", "gray", "-"], check=True, capture_output=True)
+    return float(np.frombuffer(result.stdout, dtype=np.uint8).mean())
+
+@pytest.fixture
+def inputs(tmp_path):
+    if not os.path.exists(get_ffmpeg_path()):
+        pytest.skip("ffmpeg is not available")
+    t = np.arange(int(SAMPLE_RATE * DURATION)) / SAMPLE_RATE
+    samples = (np.sin(2 * np.pi * 220 * t) * 8000).astype("<i2")
+    audio_file = AudioBuffer(samples, SAMPLE_RATE).save(str(tmp_path / "audio.wav"))
+
+    clips = []
+    for index in range(2):
+        path = str(tmp_path / f"clip_{index}.mp4")
+        subprocess.run([
+            get_ffmpeg_path(), "-y", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=640x360:rate=25:duration=3",
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", path
+        ], check=True, capture_output=True)
+        clips.append(path)
+
+    timed_captions = Timeline([0.0, 2.0], [2.0, DURATION], ["first caption", "second caption"])
+    background = Timeline([0.0, 2.5], [2.5, DURATION], clips)
+    return audio_file, timed_captions, background
+
+def test_backends_agree_on_duration_and_frames(inputs, tmp_path):
+    audio_file, timed_captions, background = inputs
+    ffmpeg_output = render_with_ffmpeg(audio_file, timed_captions, background, str(tmp_path / "ffmpeg.mp4"))
+    moviepy_output = render_with_moviepy(audio_file, timed_captions, background, str(tmp_path / "moviepy.mp4"))
+    assert ffmpeg_output and moviepy_output
+
+    ffmpeg_duration, ffmpeg_frames = probe(ffmpeg_output)
+    moviepy_duration, moviepy_frames = probe(moviepy_output)
+    assert ffmpeg_frames == moviepy_frames == round(DURATION * VIDEO_FPS)
+    assert abs(ffmpeg_duration - moviepy_duration) < 2 / VIDEO_FPS
+
+def test_backends_leave_a_tail_gap_black(inputs, tmp_path):
+    audio_file, _, background = inputs
+    timed_captions = Timeline([0.0], [1.0], ["caption"])
+    background = Timeline([0.0], [2.5], background.payloads[:1])
+    ffmpeg_output = render_with_ffmpeg(audio_file, timed_captions, background, str(tmp_path / "ffmpeg.mp4"))
+    moviepy_output = render_with_moviepy(audio_file, timed_captions, background, str(tmp_path / "moviepy.mp4"))
+    assert ffmpeg_output and moviepy_output
+
+    for output in (ffmpeg_output, moviepy_output):
+        assert frame_brightness(output, 1.5) > 10
+        assert frame_brightness(output, 3.5) < 5
@@ -0,0 +1,88 @@
+import os
+import hashlib
+import pytest
+
+pytest.importorskip("requests")
+
+from utility.cache import Pins
+from utility.render.footage_cache import FootageCache
+
+class FakeResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.status_code = 200
+        self.ok = True
+        self.headers = {"ETag": hashlib.md5(content).hexdigest()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+class FakeSession:
+    """Serves fixed bytes per URL, with an ETag derived from them."""
+
+    def __init__(self, files: dict):
+        self.files = files
+        self.downloads = 0
+
+    def get(self, url, **kwargs):
+        self.downloads += 1
+        return FakeResponse(self.files[url])
+
+    def head(self, url, **kwargs):
+        return FakeResponse(self.files[url])
+
+def test_same_content_is_stored_once(tmp_path):
+    cache = FootageCache(str(tmp_path), session=FakeSession({"a": b"clip" * 100, "b": b"clip" * 100, "c": b"other"}))
+    assert cache.fetch("a") == cache.fetch("b")
+    assert cache.fetch("c") != cache.fetch("a")
+    assert len([name for name in os.listdir(tmp_path / "blobs") if name.endswith(".mp4")]) == 2
+
+def test_eviction_keeps_pinned_footage(tmp_path):
+    files = {url: url.encode() * 1000 for url in ("a", "b", "c")}
+    cache = FootageCache(str(tmp_path), max_bytes=500, session=FakeSession(files))
+    with Pins() as pins:
+        pinned = cache.fetch("a", pins)
+        cache.fetch("b")
+        cache.fetch("c")
+        assert os.path.exists(pinned)
+    cache.evict()
+    assert not os.path.exists(pinned)
+
+def test_downloads_are_recorded_as_external_calls(tmp_path):
+    from utility.telemetry import get_telemetry
+
+    def downloads() -> int:
+        return sum(counter["value"] for counter in get_telemetry().snapshot()["counters"]
+                   if counter["name"] == "external_calls_total" and counter["labels"]["service"] == "footage")
+
+    before = downloads()
+    cache = FootageCache(str(tmp_path), session=FakeSession({"a": b"clip"}))
+    cache.fetch("a")
+    cache.fetch("a")
+    assert downloads() == before + 1
+
+def test_changed_footage_is_downloaded_again(tmp_path):
+    session = FakeSession({"a": b"old"})
+    cache = FootageCache(str(tmp_path), session=session, revalidate_after=0)
+    old = cache.fetch("a")
+    assert cache.fetch("a") == old and session.downloads == 1
+    session.files["a"] = b"new"
+    with open(cache.fetch("a"), "rb") as f:
+        assert f.read() == b"new"
+    assert session.downloads == 2
+
+def test_index_entries_of_evicted_footage_are_dropped(tmp_path):
+    cache = FootageCache(str(tmp_path), max_bytes=1500, session=FakeSession({url: url.encode() * 1000 for url in ("a", "b", "c")}))
+    for url in ("a", "b", "c"):
+        cache.fetch(url)
+    assert len(os.listdir(tmp_path / "index")) == 1
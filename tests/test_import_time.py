@@ -0,0 +1,19 @@
+import os
+import sys
+import subprocess
+from benchmarks.import_time import DEFAULT_BUDGET_MS, HEAVY_MODULES, REPO_ROOT, measure_imports
+
+def test_help_stays_within_the_import_budget():
+    imports = measure_imports(["app.py", "--help"])
+    assert imports
+    loaded = {name.split(".")[0] for name, _, _, _ in imports}
+    assert not [name for name in HEAVY_MODULES if name in loaded]
+    total_ms = sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1000
+    assert total_ms <= DEFAULT_BUDGET_MS
+
+def test_help_creates_no_directories(tmp_path):
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT}
+    env.pop("ETOA_CACHE_DIR", None)
+    env.pop("ETOA_TELEMETRY_DIR", None)
+    subprocess.run([sys.executable, os.path.join(REPO_ROOT, "app.py"), "--help"], cwd=tmp_path, env=env, check=True, capture_output=True)
+    assert os.listdir(tmp_path) == []
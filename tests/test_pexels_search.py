@@ -0,0 +1,94 @@
+import time
+import asyncio
+import pytest
+
+pytest.importorskip("pydub")
+pytest.importorskip("imageio_ffmpeg")
+
+from benchmarks.fakes import FakeServices
+from utility.cache import DiskCache
+from utility.video import background_video_generator as pexels
+from utility.video.footage_catalog import FootageCatalog
+
+@pytest.fixture(scope="module")
+def clip_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("clips"))
+
+@pytest.fixture
+def start_services(clip_dir, tmp_path, monkeypatch):
+    """Start the fake Pexels API with the given faults and point the search client at it."""
+    started = []
+
+    def start(**faults) -> FakeServices:
+        services = FakeServices(clip_dir, "", **faults).start()
+        started.append(services)
+        monkeypatch.setattr(pexels, "PEXELS_API_URL", f"{services.base_url}/videos/search")
+        return services
+
+    monkeypatch.setattr(pexels, "PEXELS_API_KEY", "test")
+    monkeypatch.setattr(pexels, "backoff_delay", lambda attempt: 0)
+    pexels_cache = DiskCache(str(tmp_path / "pexels"))
+    monkeypatch.setattr(pexels, "get_pexels_cache", lambda: pexels_cache)
+    catalog = FootageCatalog(str(tmp_path / "catalog.sqlite3"))
+    monkeypatch.setattr(pexels, "get_footage_catalog", lambda: catalog)
+    yield start
+    for services in started:
+        services.stop()
+    catalog.close()
+
+async def search_all(queries: list) -> list:
+    async with pexels.create_pexels_session() as session:
+        rate_limiter = pexels.TokenBucket(1000, 1000)
+        return await asyncio.gather(*(pexels.search_videos_async(session, query, rate_limiter=rate_limiter) for query in queries))
+
+def test_concurrent_searches_overlap_latency(start_services):
+    services = start_services(latency=0.25)
+    queries = [f"ocean {index}" for index in range(8)]
+    start = time.perf_counter()
+    results = asyncio.run(search_all(queries))
+    assert all(len(result["videos"]) == pexels.PER_PAGE for result in results)
+    assert services.requests["search"] == len(queries)
+    assert time.perf_counter() - start < 0.25 * len(queries) / 2
+
+class RecordingCatalog:
+    def __init__(self):
+        self.queries = []
+
+    def add_results(self, query: str, response: dict) -> int:
+        self.queries.append(query)
+        return len(response["videos"])
+
+def test_only_fresh_results_are_cataloged(start_services, monkeypatch):
+    start_services()
+    catalog = RecordingCatalog()
+    monkeypatch.setattr(pexels, "get_footage_catalog", lambda: catalog)
+    asyncio.run(search_all(["river"]))
+    asyncio.run(search_all(["river"]))
+    assert catalog.queries == ["river"]
+
+def test_failed_searches_are_retried(start_services):
+    services = start_services(error_rate=0.3, seed=3)
+    results = [asyncio.run(search_all([f"forest {index}"]))[0] for index in range(10)]
+    assert services.requests["errors"] > 0
+    assert all(result and result["videos"] for result in results)
+    assert services.requests["search"] == len(results) + services.requests["errors"]
+
+def test_search_gives_up_and_caches_nothing(start_services):
+    services = start_services(error_rate=1.0)
+    assert asyncio.run(search_all(["desert"])) == [None]
+    assert services.requests["search"] == pexels.MAX_RETRIES
+    asyncio.run(search_all(["desert"]))
+    assert services.requests["search"] == 2 * pexels.MAX_RETRIES
+
+def test_malformed_json_counts_as_no_result(start_services):
+    services = start_services(malformed_rate=1.0)
+    assert asyncio.run(search_all(["storm"])) == [None]
+    assert services.requests["search"] == pexels.MAX_RETRIES
+
+def test_blocking_searches_share_the_rate_limit(start_services):
+    start_services()
+    rate_limiter = pexels.TokenBucket(10, 1)
+    start = time.perf_counter()
+    for index in range(3):
+        assert pexels.search_videos(f"canyon {index}", rate_limiter=rate_limiter)["videos"]
+    assert time.perf_counter() - start >= 0.2
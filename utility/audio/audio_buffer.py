@@ -0,0 +1,173 @@
+import os
+import wave
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from math import gcd
+from typing import Optional, Tuple, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sample rate Whisper expects its input arrays in
+WHISPER_SAMPLE_RATE = 16000
+# Buffers kept for reuse by later stages of the same process
+MAX_SHARED_BUFFERS = 4
+
+class AudioBuffer:
+    """Mono 16-bit PCM held once in memory and shared by every stage that needs the audio.
+
+    `samples` is an int16 array, either owned or memory-mapped from a WAV file. The
+    float and 16 kHz views are computed on first use and cached. Nothing is written to
+    disk until `save` is called.
+    """
+
+    __slots__ = ("samples", "sample_rate", "path", "_whisper")
+
+    def __init__(self, samples: np.ndarray, sample_rate: int, path: Optional[str] = None):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.path = path
+        self._whisper = None
+
+    @classmethod
+    def from_pcm(cls, data: Union[bytes, bytearray], sample_rate: int) -> "AudioBuffer":
+        """Wrap 16-bit PCM without copying it; the buffer shares memory with `data`."""
+        return cls(np.frombuffer(data, dtype="<i2"), sample_rate)
+
+    @classmethod
+    def from_wav(cls, path: str) -> "AudioBuffer":
+        """Memory-map the PCM of a 16-bit WAV file; multi-channel files are mixed down."""
+        with wave.open(path, "rb") as audio:
+            channels, sample_width, sample_rate, frames = audio.getnchannels(), audio.getsampwidth(), audio.getframerate(), audio.getnframes()
+        if sample_width != 2:
+            raise ValueError(f"Unsupported sample width {sample_width} in {path}")
+
+        offset, _ = find_data_chunk(path)
+        samples = np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(frames * channels,))
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1).astype("<i2")
+        return cls(samples, sample_rate, path)
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def to_float(self) -> np.ndarray:
+        """Return the samples as float32 in [-1, 1]."""
+        return self.samples.astype(np.float32) / 32768.0
+
+    def to_whisper(self) -> np.ndarray:
+        """Return the 16 kHz float32 array Whisper transcribes directly, without ffmpeg."""
+        if self._whisper is None:
+            audio = self.to_float()
+            if self.sample_rate != WHISPER_SAMPLE_RATE:
+                from scipy.signal import resample_poly
+                divisor = gcd(WHISPER_SAMPLE_RATE, self.sample_rate)
+                audio = resample_poly(audio, WHISPER_SAMPLE_RATE // divisor, self.sample_rate // divisor).astype(np.float32)
+            self._whisper = audio
+        return self._whisper
+
+    def as_audio_clip(self):
+        """Return a MoviePy audio clip of the buffer, so the renderer does not decode the file again.
+
+        The clip reads the int16 samples (owned or memory-mapped) in place and converts
+        only the chunk MoviePy asks for to the stereo floats it mixes with. Write the clip
+        with `audio_fps=clip.fps` to keep the buffer's sample rate.
+        """
+        from moviepy.audio.AudioClip import AudioClip
+        samples, sample_rate = self.samples, self.sample_rate
+
+        def make_frame(t):
+            if isinstance(t, np.ndarray):
+                indices = np.round(sample_rate * t).astype(int)
+                inside = (indices >= 0) & (indices < len(samples))
+                frame = np.zeros((len(t), 2))
+                frame[inside] = (samples[indices[inside]] / 32768.0)[:, None]
+                return frame
+            index = int(sample_rate * t)
+            value = samples[index] / 32768.0 if 0 <= index < len(samples) else 0.0
+            return np.array([value, value])
+
+        return AudioClip(make_frame, duration=self.duration, fps=sample_rate)
+
+    def save(self, path: str) -> str:
+        """Write the buffer as a WAV file and remember it as the buffer's location."""
+        with wave.open(path, "wb") as output:
+            output.setnchannels(1)
+            output.setsampwidth(2)
+            output.setframerate(self.sample_rate)
+            output.writeframes(np.ascontiguousarray(self.samples, dtype="<i2").tobytes())
+        self.path = path
+        return path
+
+def find_data_chunk(path: str) -> Tuple[int, int]:
+    """Return (offset, size) of the PCM data chunk of a RIFF/WAVE file."""
+    with open(path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"Not a WAV file: {path}")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"No data chunk in {path}")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"data":
+                return f.tell(), size
+            f.seek(size + (size & 1), os.SEEK_CUR)
+
+_shared = OrderedDict()
+_shared_lock = threading.Lock()
+
+def _file_signature(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def share_audio(buffer: AudioBuffer, path: Optional[str] = None) -> None:
+    """Make a buffer available to later `open_audio` calls for its path.
+
+    A buffer that was not saved yet is shared under `path` and only written there when
+    `ensure_audio_file` is called for it.
+    """
+    key = os.path.abspath(path or buffer.path)
+    saved = buffer.path is not None and os.path.abspath(buffer.path) == key
+    signature = _file_signature(buffer.path) if saved else None
+    with _shared_lock:
+        _shared[key] = (signature, buffer)
+        _shared.move_to_end(key)
+        while len(_shared) > MAX_SHARED_BUFFERS:
+            _shared.popitem(last=False)
+
+def open_audio(path: str) -> AudioBuffer:
+    """Return the in-memory buffer of a WAV file, memory-mapping the file if none is shared.
+
+    A shared buffer is only reused while the file on disk is unchanged; one that was
+    not saved yet is always returned.
+    """
+    key = os.path.abspath(path)
+    with _shared_lock:
+        entry = _shared.get(key)
+    if entry is not None:
+        signature, buffer = entry
+        if signature is None:
+            return buffer
+        try:
+            if _file_signature(path) == signature:
+                return buffer
+        except OSError:
+            pass
+    buffer = AudioBuffer.from_wav(path)
+    share_audio(buffer)
+    return buffer
+
+def ensure_audio_file(path: str) -> str:
+    """Write the unsaved buffer shared under `path`, for stages that read the file itself."""
+    key = os.path.abspath(path)
+    with _shared_lock:
+        entry = _shared.get(key)
+    if entry is not None and entry[0] is None:
+        buffer = entry[1]
+        buffer.save(path)
+        share_audio(buffer)
+    return path
@@ -1,51 +1,154 @@
 import edge_tts
+import time
 import logging
 import asyncio
 from pydub import AudioSegment
 import io
 import random
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from utility.audio.audio_buffer import AudioBuffer, share_audio
+from utility.telemetry import get_telemetry
 
 logger = logging.getLogger(__name__)
 
-async def generate_audio(text: str, output_filename: str) -> None:
-    """Generate audio from text using edge-tts with enhanced naturalness."""
+# Maximum number of sentences synthesized at the same time
+DEFAULT_TTS_CONCURRENCY = 4
+
+# Output format of the assembled track
+OUTPUT_FRAME_RATE = 24000
+OUTPUT_CHANNELS = 1
+OUTPUT_SAMPLE_WIDTH = 2
+
+VOICES = [
+    ("en-US-AriaNeural", "cheerful"),
+    ("en-US-ChristopherNeural", "friendly"),
+    ("en-GB-SoniaNeural", "empathetic"),
+    ("en-AU-NatashaNeural", "excited"),
+    ("en-CA-ClaraNeural", "calm")
+]
+
+# Approximate pitch change in Hz for one semitone around a typical speaking voice
+HZ_PER_SEMITONE = 12
+
+# edge-tts reports word boundary offsets in 100-nanosecond ticks
+TICKS_PER_SECOND = 10_000_000
+
+SynthesizeFn = Callable[[str, str, str], Awaitable[Tuple[AudioSegment, List[dict]]]]
+
+async def synthesize_sentence(sentence: str, voice: str, style: str) -> Tuple[AudioSegment, List[dict]]:
+    """Synthesize a single sentence with edge-tts.
+
+    Returns the audio together with the word boundaries reported by the service, as
+    dicts with `text`, `start` and `end` in seconds from the start of the sentence.
+    edge-tts builds its own SSML, so `style` only selects the voice pairing here.
+    """
+    rate = random.uniform(0.9, 1.1)
+    pitch = random.uniform(-2, 2)
+
+    communicate = edge_tts.Communicate(
+        sentence,
+        voice,
+        rate=f"{round((rate - 1) * 100):+d}%",
+        pitch=f"{round(pitch * HZ_PER_SEMITONE):+d}Hz"
+    )
+
+    audio_data = io.BytesIO()
+    word_boundaries = []
+    start = time.perf_counter()
     try:
-        voices = [
-            ("en-US-AriaNeural", "cheerful"),
-            ("en-US-ChristopherNeural", "friendly"),
-            ("en-GB-SoniaNeural", "empathetic"),
-            ("en-AU-NatashaNeural", "excited"),
-            ("en-CA-ClaraNeural", "calm")
-        ]
-
-        voice, style = random.choice(voices)
-        sentences = text.split('. ')
-        audio_segments = []
-
-        for sentence in sentences:
-            rate = random.uniform(0.9, 1.1)
-            pitch = random.uniform(-2, 2)
-
-            communicate = edge_tts.Communicate(sentence, voice)
-            
-            ssml = f"""
-            <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="en-US">
-                <voice name="{voice}">
-                    <prosody rate="{rate}" pitch="{pitch}st" style="{style}">
-                        {sentence}
-                    </prosody>
-                </voice>
-            </speak>
-            """
-            
-            audio_data = await communicate.synthesize_ssml(ssml)
-            audio_segment = AudioSegment.from_wav(io.BytesIO(audio_data))
-            audio_segments.append(audio_segment)
-
-        final_audio = sum(audio_segments)
-        final_audio.export(output_filename, format="wav")
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                audio_data.write(chunk["data"])
+            elif chunk["type"] == "WordBoundary":
+                word_boundaries.append({
+                    "text": chunk["text"],
+                    "start": chunk["offset"] / TICKS_PER_SECOND,
+                    "end": (chunk["offset"] + chunk["duration"]) / TICKS_PER_SECOND
+                })
+    except Exception as e:
+        get_telemetry().record_call("tts", voice, time.perf_counter() - start, "error", audio_data.tell(), error=str(e))
+        raise
+    get_telemetry().record_call("tts", voice, time.perf_counter() - start, "ok", audio_data.tell(), words=len(word_boundaries))
+
+    audio_data.seek(0)
+    return AudioSegment.from_file(audio_data, format="mp3"), word_boundaries
+
+async def synthesize_in_order(sentences: List[str], synthesize: Callable[[str], Awaitable[tuple]], concurrency: int) -> AsyncIterator[tuple]:
+    """Yield synthesized sentences in order while keeping at most `concurrency` requests in flight."""
+    pending = deque()
+    remaining = iter(sentences)
 
+    def schedule_next() -> None:
+        sentence = next(remaining, None)
+        if sentence is not None:
+            pending.append(asyncio.ensure_future(synthesize(sentence)))
+
+    try:
+        for _ in range(max(1, concurrency)):
+            schedule_next()
+        while pending:
+            result = await pending.popleft()
+            schedule_next()
+            yield result
+    finally:
+        for task in pending:
+            task.cancel()
+
+def normalize_segment(segment: AudioSegment) -> AudioSegment:
+    """Convert a segment to the output frame rate, channel count and sample width."""
+    return (segment.set_frame_rate(OUTPUT_FRAME_RATE)
+                   .set_channels(OUTPUT_CHANNELS)
+                   .set_sample_width(OUTPUT_SAMPLE_WIDTH))
+
+async def generate_audio_buffer(text: str, concurrency: int = DEFAULT_TTS_CONCURRENCY, synthesize: Optional[SynthesizeFn] = None) -> Tuple[AudioBuffer, List[dict]]:
+    """Synthesize text into an in-memory audio buffer.
+
+    Sentences are synthesized concurrently (bounded by `concurrency`) and their PCM is
+    appended in sentence order as soon as each one is ready.
+
+    Returns the buffer and the word timings of the whole track (`text`, `start`, `end`
+    in seconds), built from the TTS word boundaries shifted by each sentence's offset.
+    """
+    voice, style = random.choice(VOICES)
+    sentences = [sentence for sentence in text.split('. ') if sentence.strip()]
+    synthesize = synthesize or synthesize_sentence
+    word_timings = []
+    pcm = bytearray()
+
+    frames_written = 0
+    async for segment, word_boundaries in synthesize_in_order(sentences, lambda sentence: synthesize(sentence, voice, style), concurrency):
+        sentence_offset = frames_written / OUTPUT_FRAME_RATE
+        word_timings.extend({
+            "text": word["text"],
+            "start": word["start"] + sentence_offset,
+            "end": word["end"] + sentence_offset
+        } for word in word_boundaries)
+
+        segment = normalize_segment(segment)
+        pcm += segment.raw_data
+        frames_written += int(segment.frame_count())
+
+    # The buffer wraps the assembled PCM without copying it
+    return AudioBuffer.from_pcm(pcm, OUTPUT_FRAME_RATE), word_timings
+
+async def generate_audio(text: str, output_filename: str, concurrency: int = DEFAULT_TTS_CONCURRENCY, synthesize: Optional[SynthesizeFn] = None,
+                         write: bool = True) -> List[dict]:
+    """Generate audio from text using edge-tts with enhanced naturalness.
+
+    The track is kept in memory under `output_filename`, so the caption and render
+    stages of this process read it through `open_audio` without decoding a file. It is
+    written there right away only with `write`; otherwise it is written the first time
+    a stage that needs the file calls `ensure_audio_file`. Returns the word timings of
+    the whole track.
+    """
+    try:
+        buffer, word_timings = await generate_audio_buffer(text, concurrency, synthesize)
+        if write:
+            buffer.save(output_filename)
+        share_audio(buffer, output_filename)
         logger.info(f"Audio generated successfully with enhanced naturalness: {output_filename}")
+        return word_timings
     except Exception as e:
         logger.error(f"Error generating audio: {str(e)}")
         raise
@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+import uuid
+from filelock import FileLock
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Root directory for every on-disk cache
+CACHE_ROOT = os.environ.get("ETOA_CACHE_DIR", ".cache")
+# Directory, inside a cache directory, of the markers of files in use
+PINS_DIR = ".pins"
+
+def make_key(*parts) -> str:
+    """Return a stable hash of the given JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Write a file so that readers only ever see the old or the complete new content."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def evict_lru(directory: str, max_bytes: int, suffix: str = "", keep: Iterable[str] = ()) -> int:
+    """Delete the least recently used files in a directory until it fits in `max_bytes`.
+
+    Recency is the file's modification time, which caches refresh on every hit. Files
+    named in `keep` are never deleted. Returns the number of bytes freed.
+    """
+    keep = set(keep)
+    entries = []
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.is_file() or entry.name.startswith(".") or not entry.name.endswith(suffix):
+                continue
+            if entry.name in keep:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+    return freed
+
+def _eviction_lock(directory: str) -> FileLock:
+    return FileLock(os.path.join(directory, ".evict.lock"))
+
+def _process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # Signal 0 is CTRL_C_EVENT on Windows, so liveness is not probed there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def pin(path: str) -> Optional[str]:
+    """Mark a cache file as in use, so `evict_unpinned` keeps it until `unpin`.
+
+    Markers name the pinning process and are ignored once it has exited, so a crash
+    does not pin files forever. Returns the marker, or None if the file is gone.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    pins_dir = os.path.join(directory, PINS_DIR)
+    os.makedirs(pins_dir, exist_ok=True)
+    marker = os.path.join(pins_dir, f"{os.path.basename(path)}.{os.getpid()}.{uuid.uuid4().hex[:8]}")
+    with _eviction_lock(directory):
+        if not os.path.exists(path):
+            return None
+        open(marker, "wb").close()
+    return marker
+
+def unpin(marker: str) -> None:
+    try:
+        os.remove(marker)
+    except FileNotFoundError:
+        pass
+
+def pinned_names(directory: str) -> Set[str]:
+    """Return the names of the files in a directory pinned by running processes."""
+    names = set()
+    pins_dir = os.path.join(directory, PINS_DIR)
+    try:
+        markers = os.listdir(pins_dir)
+    except FileNotFoundError:
+        return names
+    for marker in markers:
+        name, pid, _ = marker.rsplit(".", 2)
+        if _process_alive(int(pid)):
+            names.add(name)
+        else:
+            unpin(os.path.join(pins_dir, marker))
+    return names
+
+def evict_unpinned(directory: str, max_bytes: int, suffix: str = "") -> int:
+    """`evict_lru` for directories whose files may be pinned by renders in other threads or processes."""
+    with _eviction_lock(directory):
+        return evict_lru(directory, max_bytes, suffix, keep=pinned_names(directory))
+
+class Pins:
+    """Cache files pinned by one user, such as a render, until `release` or the end of a `with` block."""
+
+    def __init__(self):
+        self.markers: List[str] = []
+
+    def add(self, path: str) -> bool:
+        """Pin a file; returns False if it was evicted before it could be pinned."""
+        marker = pin(path)
+        if marker is None:
+            return False
+        self.markers.append(marker)
+        return True
+
+    def release(self) -> None:
+        for marker in self.markers:
+            unpin(marker)
+        self.markers = []
+
+    def __enter__(self) -> "Pins":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+def touch(path: str) -> None:
+    """Mark a cache file as recently used."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+class DiskCache:
+    """Persistent JSON cache with a TTL, an LRU size cap and request coalescing.
+
+    Entries are single files written atomically, so several processes can share a
+    cache directory; eviction runs under a directory lock. Identical lookups that
+    miss at the same time share one fetch.
+    """
+
+    def __init__(self, directory: str, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evicted_bytes": 0}
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_async = {}
+        self._bytes_since_evict = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for a key, or None if it is missing or expired."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._count("misses")
+            return None
+
+        if self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl:
+            # Expired entries are dropped as they are found
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._count("misses")
+            return None
+
+        touch(path)
+        self._count("hits")
+        return entry.get("value")
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value under a key."""
+        data = json.dumps({"created": time.time(), "value": value}).encode("utf-8")
+        try:
+            atomic_write(self._path(key), data)
+        except OSError as e:
+            logger.error(f"Error writing cache entry {key}: {str(e)}")
+            return
+        self._count("stores")
+
+        if self.max_bytes is not None:
+            with self._lock:
+                self._bytes_since_evict += len(data)
+                should_evict = self._bytes_since_evict >= self.max_bytes // 10
+                if should_evict:
+                    self._bytes_since_evict = 0
+            if should_evict:
+                self.evict()
+
+    def evict(self) -> None:
+        """Trim the cache directory to `max_bytes`."""
+        if self.max_bytes is None:
+            return
+        with FileLock(os.path.join(self.directory, ".evict.lock")):
+            freed = evict_lru(self.directory, self.max_bytes, suffix=".json")
+        self._count("evicted_bytes", freed)
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """Return the cached value or call `fetch` once for all concurrent callers.
+
+        None results are returned but not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if not leader:
+            self._count("coalesced")
+            event.wait()
+            return self.get(key)
+
+        try:
+            value = fetch()
+            if value is not None:
+                self.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    async def get_or_fetch_async(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Coroutine version of `get_or_fetch`; the file I/O runs in the default executor.
+
+        Identical lookups on the same event loop share one fetch. If the coroutine doing
+        the fetch is cancelled, one of those waiting on it takes over.
+        """
+        loop = asyncio.get_running_loop()
+        inflight_key = (loop, key)
+        while True:
+            value = await loop.run_in_executor(None, self.get, key)
+            if value is not None:
+                return value
+
+            future = self._inflight_async.get(inflight_key)
+            if future is None:
+                break
+            self._count("coalesced")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+        future = self._inflight_async[inflight_key] = loop.create_future()
+        try:
+            value = await fetch()
+            if value is not None:
+                await loop.run_in_executor(None, self.set, key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight_async[inflight_key]
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
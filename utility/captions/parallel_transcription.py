@@ -0,0 +1,151 @@
+import os
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+import numpy as np
+from utility.audio.audio_buffer import WHISPER_SAMPLE_RATE
+from utility.captions.whisper_model_registry import DEFAULT_DEVICE, DEFAULT_DTYPE, get_whisper_model
+
+logger = logging.getLogger(__name__)
+
+# Target chunk length; chunks are cut at the nearest pause within SEARCH_WINDOW of it
+DEFAULT_CHUNK_SECONDS = 60.0
+SEARCH_WINDOW = 15.0
+# Energy analysis used to find pauses when no sentence boundaries are known
+FRAME_SECONDS = 0.02
+SILENCE_THRESHOLD = 0.01
+# Pauses between TTS words at least this long count as sentence boundaries
+MIN_BOUNDARY_GAP = 0.15
+
+def boundaries_from_word_timings(word_timings: list) -> List[float]:
+    """Return the middle of every pause between consecutive TTS words."""
+    boundaries = []
+    for previous, current in zip(word_timings, word_timings[1:]):
+        if current["start"] - previous["end"] >= MIN_BOUNDARY_GAP:
+            boundaries.append((previous["end"] + current["start"]) / 2)
+    return boundaries
+
+def find_silences(audio: np.ndarray, sample_rate: int = WHISPER_SAMPLE_RATE) -> List[float]:
+    """Return the centers of low-energy frames, in seconds."""
+    frame = max(1, int(FRAME_SECONDS * sample_rate))
+    count = len(audio) // frame
+    if count == 0:
+        return []
+    rms = np.sqrt(np.mean(np.square(audio[:count * frame].reshape(count, frame)), axis=1))
+    quiet = np.flatnonzero(rms < SILENCE_THRESHOLD)
+    return ((quiet + 0.5) * frame / sample_rate).tolist()
+
+def plan_audio_chunks(duration: float, boundaries: List[float], chunk_seconds: float = DEFAULT_CHUNK_SECONDS) -> List[Tuple[float, float]]:
+    """Split [0, duration] into chunks of about `chunk_seconds`, cutting at boundaries.
+
+    Each cut goes to the boundary closest to the target within SEARCH_WINDOW; if there
+    is none, the chunk is cut at the target so that no chunk grows unbounded.
+    """
+    boundaries = sorted(boundaries)
+    chunks = []
+    start = 0.0
+    while duration - start > chunk_seconds + SEARCH_WINDOW:
+        target = start + chunk_seconds
+        candidates = [b for b in boundaries if abs(b - target) <= SEARCH_WINDOW and b > start]
+        cut = min(candidates, key=lambda b: abs(b - target)) if candidates else target
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, duration))
+    return chunks
+
+def _init_worker(model_size: str, device: str, dtype: str, threads: int) -> None:
+    # Each worker loads the model once, before its first chunk
+    import torch
+    torch.set_num_threads(threads)
+    get_whisper_model(model_size, device, dtype)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+def get_transcription_pool(workers: int, model_size: str, device: str, dtype: str) -> ProcessPoolExecutor:
+    """Return the transcription worker pool, started on first use and kept for the life of the process.
+
+    Workers load their model once, so later calls skip the model load. Asking for a
+    different model or worker count replaces the pool.
+    """
+    global _pool, _pool_key
+    key = (workers, model_size, device, dtype)
+    with _pool_lock:
+        if _pool is not None and _pool_key != key:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # Spawned workers do not inherit torch's thread pools from this process
+            context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(model_size, device, dtype, threads))
+            _pool_key = key
+        return _pool
+
+def shutdown_transcription_pool() -> None:
+    """Stop the transcription workers, if they were started."""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _pool_key = None, None
+
+atexit.register(shutdown_transcription_pool)
+
+def transcribe_chunk(audio: np.ndarray, offset: float, model_size: str, device: str, dtype: str, language: Optional[str]) -> dict:
+    """Transcribe one chunk and shift its timestamps by `offset` seconds."""
+    from whisper_timestamped import transcribe_timestamped
+
+    model = get_whisper_model(model_size, device, dtype)
+    result = transcribe_timestamped(model, audio, language=language, verbose=False, fp16=(dtype == "float16"))
+    for segment in result["segments"]:
+        segment["start"] += offset
+        segment["end"] += offset
+        for word in segment.get("words", []):
+            word["start"] += offset
+            word["end"] += offset
+    return {"text": result["text"].strip(), "segments": result["segments"], "language": result.get("language")}
+
+def stitch_transcriptions(parts: List[dict]) -> dict:
+    """Join chunk transcriptions into one analysis in the shape Whisper returns."""
+    segments = []
+    for part in parts:
+        for segment in part["segments"]:
+            segment["id"] = len(segments)
+            segments.append(segment)
+    return {
+        "text": " ".join(part["text"] for part in parts if part["text"]),
+        "segments": segments,
+        "language": next((part["language"] for part in parts if part.get("language")), None)
+    }
+
+def transcribe_parallel(audio: np.ndarray, workers: int, model_size: str = "base", device: str = DEFAULT_DEVICE, dtype: str = DEFAULT_DTYPE,
+                        boundaries: Optional[List[float]] = None, chunk_seconds: float = DEFAULT_CHUNK_SECONDS, language: Optional[str] = None) -> dict:
+    """Transcribe 16 kHz audio as chunks in a process pool and stitch the results.
+
+    Chunks are cut at `boundaries` (e.g. sentence ends known from TTS) or, without
+    them, at detected silences. Pass `language` to skip per-chunk language detection.
+    """
+    duration = len(audio) / WHISPER_SAMPLE_RATE
+    if boundaries is None:
+        boundaries = find_silences(audio)
+    chunks = plan_audio_chunks(duration, boundaries, chunk_seconds)
+    logger.info(f"Transcribing {duration:.1f}s of audio as {len(chunks)} chunks with {workers} workers")
+
+    def samples(t1: float, t2: float) -> np.ndarray:
+        return np.ascontiguousarray(audio[int(t1 * WHISPER_SAMPLE_RATE):int(t2 * WHISPER_SAMPLE_RATE)])
+
+    executor = get_transcription_pool(workers, model_size, device, dtype)
+    try:
+        futures = [executor.submit(transcribe_chunk, samples(t1, t2), t1, model_size, device, dtype, language) for t1, t2 in chunks]
+        parts = [future.result() for future in futures]
+    except BrokenProcessPool:
+        # A crashed worker breaks the pool for good; the next call starts a new one
+        shutdown_transcription_pool()
+        raise
+    return stitch_transcriptions(parts)
@@ -1,20 +1,55 @@
-import whisper_timestamped as whisper
-from whisper_timestamped import load_model, transcribe_timestamped
 import re
 import logging
+from bisect import bisect_left
+from utility.captions.whisper_model_registry import get_registry, get_whisper_model, DEFAULT_DEVICE, DEFAULT_DTYPE
+from utility.timeline import Timeline
 
 logger = logging.getLogger(__name__)
 
-def generate_timed_captions(audio_filename: str, model_size: str = "base") -> list:
-    """Generate timed captions from an audio file."""
+def generate_timed_captions(audio_filename: str, model_size: str = "base", device: str = DEFAULT_DEVICE, dtype: str = DEFAULT_DTYPE,
+                            workers: int = 1, boundaries: list = None) -> Timeline:
+    """Generate timed captions from an audio file by transcribing it with Whisper.
+
+    The audio is handed to Whisper as a 16 kHz array from the shared audio buffer, so
+    it is not decoded again by ffmpeg. With `workers` > 1, audio longer than one chunk
+    is transcribed in parallel chunks cut at `boundaries` (seconds) or at silences.
+    """
     try:
-        whisper_model = load_model(model_size)
-        transcription = transcribe_timestamped(whisper_model, audio_filename, verbose=False, fp16=False)
+        from utility.audio.audio_buffer import WHISPER_SAMPLE_RATE, open_audio
+
+        audio = open_audio(audio_filename).to_whisper()
+        if workers > 1:
+            from utility.captions.parallel_transcription import DEFAULT_CHUNK_SECONDS, transcribe_parallel
+            if len(audio) / WHISPER_SAMPLE_RATE > DEFAULT_CHUNK_SECONDS:
+                transcription = transcribe_parallel(audio, workers, model_size, device, dtype, boundaries)
+                return get_captions_with_time(transcription)
+
+        from whisper_timestamped import transcribe_timestamped
+        whisper_model = get_whisper_model(model_size, device, dtype)
+        # Batch jobs caption on threads that share this model
+        with get_registry().transcription_lock(model_size, device, dtype):
+            transcription = transcribe_timestamped(whisper_model, audio, verbose=False, fp16=(dtype == "float16"))
         return get_captions_with_time(transcription)
     except Exception as e:
         logger.error(f"Error generating timed captions: {str(e)}")
         return None
 
+def generate_timed_captions_from_words(word_timings: list) -> Timeline:
+    """Generate timed captions from known word timings, such as TTS word boundaries."""
+    try:
+        return get_captions_with_time(word_timings_to_analysis(word_timings))
+    except Exception as e:
+        logger.error(f"Error generating timed captions from word timings: {str(e)}")
+        return None
+
+def word_timings_to_analysis(word_timings: list) -> dict:
+    """Wrap word timings in the structure produced by Whisper transcription."""
+    words = [{"text": word["text"], "start": word["start"], "end": word["end"]} for word in word_timings]
+    return {
+        "text": " ".join(word["text"] for word in words),
+        "segments": [{"words": words}]
+    }
+
 def split_words_by_size(words: list, max_caption_size: int) -> list:
     """Split words into captions of a maximum size."""
     half_caption_size = max_caption_size / 2
@@ -54,6 +89,66 @@ def get_timestamp_mapping(whisper_analysis: dict) -> dict:
             index = new_index
     return location_to_timestamp
 
+class TimestampIndex:
+    """Word position ranges and end times stored as parallel sorted arrays.
+
+    Holds the same data as `get_timestamp_mapping`, but answers lookups with a binary
+    search instead of scanning every range.
+    """
+
+    __slots__ = ("starts", "ends", "times")
+
+    def __init__(self, starts: list, ends: list, times: list):
+        self.starts = starts
+        self.ends = ends
+        self.times = times
+
+    @classmethod
+    def from_analysis(cls, whisper_analysis: dict) -> "TimestampIndex":
+        """Build the index from a Whisper analysis."""
+        starts, ends, times = [], [], []
+        index = 0
+        for segment in whisper_analysis['segments']:
+            for word in segment['words']:
+                new_index = index + len(word['text']) + 1
+                starts.append(index)
+                ends.append(new_index)
+                times.append(word['end'])
+                index = new_index
+        return cls(starts, ends, times)
+
+    def _find(self, word_position: int, lo: int = 0) -> int:
+        k = bisect_left(self.ends, word_position, lo)
+        if k < len(self.ends) and self.starts[k] <= word_position:
+            return k
+        return -1
+
+    def lookup(self, word_position: int) -> float:
+        """Return the time for a word position, as `interpolate_time_from_dict` does."""
+        k = self._find(word_position)
+        return self.times[k] if k >= 0 else None
+
+    def lookup_many(self, word_positions: list) -> list:
+        """Return the times for many word positions in one pass.
+
+        Ascending positions, as produced while walking a caption list, reuse the previous
+        match as the lower bound of the next search.
+        """
+        results = []
+        lo = 0
+        previous = None
+        for word_position in word_positions:
+            if previous is not None and word_position < previous:
+                lo = 0
+            k = self._find(word_position, lo)
+            if k >= 0:
+                results.append(self.times[k])
+                lo = k
+            else:
+                results.append(None)
+            previous = word_position
+        return results
+
 def clean_word(word: str) -> str:
     """Remove non-alphanumeric characters from a word."""
     return re.sub(r'[^\w\s\-_"\'\']', '', word)
@@ -65,13 +160,13 @@ def interpolate_time_from_dict(word_position: int, d: dict) -> float:
             return value
     return None
 
-def get_captions_with_time(whisper_analysis: dict, max_caption_size: int = 15, consider_punctuation: bool = False) -> list:
-    """Generate timed captions from Whisper analysis."""
+def get_captions_with_time(whisper_analysis: dict, max_caption_size: int = 15, consider_punctuation: bool = False) -> Timeline:
+    """Generate a timeline of captions from Whisper analysis."""
     try:
-        word_location_to_time = get_timestamp_mapping(whisper_analysis)
+        timestamp_index = TimestampIndex.from_analysis(whisper_analysis)
         position = 0
         start_time = 0
-        captions_pairs = []
+        captions = Timeline()
         text = whisper_analysis['text']
         
         if consider_punctuation:
@@ -81,14 +176,17 @@ def get_captions_with_time(whisper_analysis: dict, max_caption_size: int = 15, c
             words = text.split()
             words = [clean_word(word) for word in split_words_by_size(words, max_caption_size)]
         
+        positions = []
         for word in words:
             position += len(word) + 1
-            end_time = interpolate_time_from_dict(position, word_location_to_time)
+            positions.append(position)
+
+        for word, end_time in zip(words, timestamp_index.lookup_many(positions)):
             if end_time and word:
-                captions_pairs.append(((start_time, end_time), word))
+                captions.append(start_time, end_time, word)
                 start_time = end_time
 
-        return captions_pairs
+        return captions
     except Exception as e:
         logger.error(f"Error processing captions: {str(e)}")
         return None
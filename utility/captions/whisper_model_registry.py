@@ -0,0 +1,153 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the combined parameter size of the cached models (bytes)
+DEFAULT_MEMORY_BUDGET = int(os.environ.get("WHISPER_MODEL_MEMORY_BUDGET", 4 * 1024 ** 3))
+
+DEFAULT_DEVICE = "cpu"
+DEFAULT_DTYPE = "float32"
+
+ModelKey = Tuple[str, str, str]
+
+def load_whisper_model(model_size: str, device: str, dtype: str):
+    """Load a whisper_timestamped model on the given device and cast it to the given dtype.
+
+    `dtype` is "float32", "float16" or "int8" (CPU only).
+    """
+    from whisper_timestamped import load_model
+
+    model = load_model(model_size, device=device)
+    if dtype == "float16":
+        model = model.half()
+    elif dtype == "int8":
+        model = quantize_linear_layers(model)
+    return model
+
+def quantize_linear_layers(model):
+    """Replace the model's linear layers with dynamically quantized int8 ones, for faster CPU drafts.
+
+    Whisper builds its layers from `whisper.model.Linear`, a subclass that only casts
+    the weights to the input's dtype. `quantize_dynamic` matches exact types and would
+    skip them, so they are turned into plain `torch.nn.Linear` layers first (the same
+    computation in float32). Raises RuntimeError if no layer was quantized.
+    """
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as QuantizedLinear
+
+    model = model.float()
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+            module.__class__ = torch.nn.Linear
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    quantized = sum(isinstance(module, QuantizedLinear) for module in model.modules())
+    if not quantized:
+        raise RuntimeError("int8 quantization did not replace any linear layer")
+    logger.info(f"Quantized {quantized} linear layers to int8")
+    return model
+
+def estimate_model_bytes(model) -> int:
+    """Return the memory held by a model's parameters and buffers."""
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    except AttributeError:
+        return 0
+
+class WhisperModelRegistry:
+    """Process-wide cache of loaded Whisper models keyed by (model size, device, dtype).
+
+    Each model is loaded at most once; concurrent callers asking for the same key wait
+    for the first load instead of starting their own. Threads sharing a model take its
+    `transcription_lock` around every transcription. Least recently used models are
+    evicted once the combined size exceeds `memory_budget`.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, loader: Callable = load_whisper_model):
+        self.memory_budget = memory_budget
+        self._loader = loader
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._use_locks = {}
+
+    def get(self, model_size: str = "base", device: str = DEFAULT_DEVICE, dtype: str = DEFAULT_DTYPE):
+        """Return the model for the given key, loading it on first use."""
+        key = (model_size, device, dtype)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+
+            logger.info(f"Loading Whisper model: size={model_size}, device={device}, dtype={dtype}")
+            model = self._loader(model_size, device, dtype)
+
+            with self._lock:
+                self._models[key] = model
+                self._sizes[key] = estimate_model_bytes(model)
+                self._evict(keep=key)
+            return model
+
+    def transcription_lock(self, model_size: str = "base", device: str = DEFAULT_DEVICE, dtype: str = DEFAULT_DTYPE) -> threading.Lock:
+        """Return the lock that serializes transcriptions with one model.
+
+        Whisper installs per-call hooks and caches on the model while decoding, so a
+        model must not transcribe from several threads at once.
+        """
+        with self._lock:
+            return self._use_locks.setdefault((model_size, device, dtype), threading.Lock())
+
+    def warm_up(self, keys: Iterable[ModelKey]) -> None:
+        """Load the given models ahead of the first captioning request."""
+        for model_size, device, dtype in keys:
+            self.get(model_size, device, dtype)
+
+    def loaded_keys(self) -> list:
+        """Return the keys of the loaded models, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def clear(self) -> None:
+        """Drop every cached model."""
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+
+    def _evict(self, keep: ModelKey) -> None:
+        total = sum(self._sizes.values())
+        for key in list(self._models):
+            if total <= self.memory_budget:
+                break
+            if key == keep:
+                continue
+            logger.info(f"Evicting Whisper model {key} to stay under the memory budget")
+            del self._models[key]
+            total -= self._sizes.pop(key)
+
+_registry: Optional[WhisperModelRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> WhisperModelRegistry:
+    """Return the process-wide model registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = WhisperModelRegistry()
+        return _registry
+
+def get_whisper_model(model_size: str = "base", device: str = DEFAULT_DEVICE, dtype: str = DEFAULT_DTYPE):
+    """Return a shared Whisper model from the process-wide registry."""
+    return get_registry().get(model_size, device, dtype)
@@ -0,0 +1,74 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional
+from utility.cache import CACHE_ROOT, DiskCache, make_key
+from utility.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+# Responses are kept for 30 days, up to 100 MB
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", 30 * 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 100 * 1024 ** 2))
+
+# Replay mode answers repeated requests from the cache, so a rerun gets the same script and timeline
+LLM_CACHE_REPLAY = os.environ.get("LLM_CACHE_REPLAY", "0") == "1"
+
+_llm_cache: Optional[DiskCache] = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> DiskCache:
+    """Return the process-wide LLM response cache, creating its directory on first use."""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = DiskCache(os.path.join(CACHE_ROOT, "llm"), ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES)
+        return _llm_cache
+
+def complete_chat(client, model: str, system_prompt: str, user_content: str, temperature: Optional[float] = None) -> str:
+    """Send a system + user chat request and return the response text."""
+    kwargs = {"temperature": temperature} if temperature is not None else {}
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
+            ],
+            **kwargs
+        )
+    except Exception as e:
+        get_telemetry().record_call("llm", model, time.perf_counter() - start, "error", error=str(e))
+        raise
+    text = response.choices[0].message.content
+    get_telemetry().record_call("llm", model, time.perf_counter() - start, "ok", len((text or "").encode("utf-8")))
+    return text
+
+def cached_chat_completion(client, model: str, system_prompt: str, user_content: str, temperature: Optional[float] = None, replay: Optional[bool] = None) -> str:
+    """Return a chat completion, served from the persistent cache in replay mode.
+
+    Outside replay mode (`replay` or LLM_CACHE_REPLAY=1) every request calls the model.
+    In replay mode, identical requests made at the same time share one API call.
+    """
+    replay = LLM_CACHE_REPLAY if replay is None else replay
+    if not replay:
+        return complete_chat(client, model, system_prompt, user_content, temperature)
+
+    llm_cache = get_llm_cache()
+    key = make_key(model, system_prompt, user_content, temperature)
+    fetched = []
+
+    def fetch() -> str:
+        fetched.append(True)
+        logger.info(f"LLM cache miss, calling {model}")
+        return complete_chat(client, model, system_prompt, user_content, temperature)
+
+    text = llm_cache.get_or_fetch(key, fetch)
+    get_telemetry().record_cache("llm", hit=not fetched)
+    if text is None:
+        raise RuntimeError(f"LLM request to {model} failed")
+    if not fetched:
+        logger.info(f"LLM cache hit for {model}, skipped API call (stats: {llm_cache.stats})")
+    return text
@@ -0,0 +1,53 @@
+import os
+import logging
+import threading
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_GROQ = "groq"
+PROVIDER_OPENAI = "openai"
+
+# Model used for each task, per provider
+MODELS = {
+    PROVIDER_GROQ: {"script": "mixtral-8x7b-32768", "search_terms": "llama3-70b-8192"},
+    PROVIDER_OPENAI: {"script": "gpt-4", "search_terms": "gpt-4"}
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def select_provider() -> str:
+    """Return the LLM provider to use.
+
+    LLM_PROVIDER picks one explicitly. Otherwise Groq is used when a Groq API key is
+    configured and OpenAI in every other case.
+    """
+    provider = os.environ.get("LLM_PROVIDER", "").lower()
+    if provider:
+        if provider not in MODELS:
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+        return provider
+    if len(os.environ.get("GROQ_API_KEY", "")) > 30:
+        return PROVIDER_GROQ
+    return PROVIDER_OPENAI
+
+def create_client(provider: str):
+    """Build an API client for a provider, importing its SDK only now."""
+    if provider == PROVIDER_GROQ:
+        from groq import Groq
+        return Groq(api_key=os.environ.get("GROQ_API_KEY"))
+    if provider == PROVIDER_OPENAI:
+        from openai import OpenAI
+        return OpenAI(api_key=os.environ.get("OPENAI_KEY"))
+    raise ValueError(f"Unsupported LLM provider: {provider}")
+
+def get_llm_client(task: str, provider: Optional[str] = None) -> Tuple[object, str]:
+    """Return (client, model) for a task; each provider's client is built once on first use."""
+    provider = provider or select_provider()
+    with _clients_lock:
+        client = _clients.get(provider)
+        if client is None:
+            client = _clients[provider] = create_client(provider)
+            logger.info(f"LLM client created for {provider}")
+    return client, MODELS[provider][task]
@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional
+from utility.cache import atomic_write
+from utility.timeline import Timeline
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR_NAME = "artifacts"
+# Key of the JSON object a Timeline output is saved as
+TIMELINE_TAG = "__timeline__"
+
+def file_fingerprint(path: str) -> Optional[list]:
+    """Return (size, mtime) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def encode_output(value: Any) -> Any:
+    """JSON fallback for stage outputs that are not plain JSON values."""
+    if isinstance(value, Timeline):
+        return {TIMELINE_TAG: value.to_list()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def decode_output(obj: dict) -> Any:
+    if len(obj) == 1 and TIMELINE_TAG in obj:
+        return Timeline.from_pairs(obj[TIMELINE_TAG])
+    return obj
+
+class ArtifactStore:
+    """Per-job directory of stage outputs, each saved with the key of the inputs that produced it.
+
+    A stage's artifact is reused only if its key matches and every file the stage
+    wrote is still present and unchanged since it was recorded.
+    """
+
+    def __init__(self, work_dir: str):
+        self.directory = os.path.join(work_dir, ARTIFACT_DIR_NAME)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, stage_name: str) -> str:
+        return os.path.join(self.directory, f"{stage_name}.json")
+
+    def load(self, stage_name: str, version: int, key: str) -> Optional[Dict[str, Any]]:
+        """Return the saved outputs of a stage, or None if they are missing or stale."""
+        try:
+            with open(self._path(stage_name), "r", encoding="utf-8") as f:
+                artifact = json.load(f, object_hook=decode_output)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if artifact.get("version") != version or artifact.get("key") != key:
+            return None
+        for path, fingerprint in artifact.get("files", {}).items():
+            if file_fingerprint(path) != fingerprint:
+                logger.info(f"Artifact of {stage_name} is stale: {path} changed")
+                return None
+        return artifact["outputs"]
+
+    def save(self, stage_name: str, version: int, key: str, outputs: Dict[str, Any], files: List[str]) -> None:
+        """Save the outputs of a stage together with fingerprints of the files it wrote."""
+        artifact = {
+            "stage": stage_name,
+            "version": version,
+            "key": key,
+            "created": time.time(),
+            "outputs": outputs,
+            "files": {path: file_fingerprint(path) for path in files}
+        }
+        try:
+            atomic_write(self._path(stage_name), json.dumps(artifact, indent=2, default=encode_output).encode("utf-8"))
+        except (OSError, TypeError) as e:
+            logger.error(f"Error saving artifact of {stage_name}: {str(e)}")
@@ -0,0 +1,65 @@
+import os
+import json
+import math
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+def normalize_job(job: dict, label: str = "Job") -> dict:
+    """Check a job description and fill in its defaults and work directory."""
+    if not isinstance(job, dict):
+        raise ValueError(f"{label} is not an object")
+    if "script" not in job and "script_file" not in job:
+        raise ValueError(f"{label} has neither 'script' nor 'script_file'")
+    if "output" not in job:
+        raise ValueError(f"{label} has no 'output' path")
+    job.setdefault("video_type", "short")
+    job["work_dir"] = os.path.splitext(job["output"])[0] + "_work"
+    return job
+
+def read_jobs(jobs_file: str) -> List[dict]:
+    """Read a JSONL batch of jobs.
+
+    Each line holds `script` (text) or `script_file`, an optional `video_type` and an
+    `output` path. Every job gets its own work directory derived from its output path,
+    so concurrent jobs never share intermediate files.
+    """
+    jobs = []
+    with open(jobs_file, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            job.setdefault("id", str(line_number))
+            jobs.append(normalize_job(job, f"Job on line {line_number}"))
+
+    outputs = [job["output"] for job in jobs]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError("Batch jobs must have distinct output paths")
+    return jobs
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+def format_batch_summary(reports: list, failed: int, elapsed: float) -> str:
+    """Summarize a batch: throughput in videos per hour and per-stage p50/p95 durations."""
+    completed = len(reports)
+    videos_per_hour = completed / elapsed * 3600 if elapsed > 0 else 0.0
+    lines = [
+        f"Batch finished: {completed} completed, {failed} failed in {elapsed:.1f}s ({videos_per_hour:.1f} videos/hour)",
+        f"{'stage':<20} {'p50':>8} {'p95':>8}"
+    ]
+
+    durations = {}
+    for report in reports:
+        for name in report.timings:
+            durations.setdefault(name, []).append(report.duration(name))
+    for name, values in durations.items():
+        lines.append(f"{name:<20} {percentile(values, 0.5):>8.2f} {percentile(values, 0.95):>8.2f}")
+    return "\n".join(lines)
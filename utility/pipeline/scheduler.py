@@ -0,0 +1,241 @@
+import time
+import asyncio
+import logging
+from functools import partial
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from utility.cache import make_key
+from utility.pipeline.artifacts import ArtifactStore
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_ASYNC = "async"
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+class Stage:
+    """One step of a pipeline: a function from named inputs to named outputs.
+
+    `func` is called with the inputs as keyword arguments. With a single output it
+    returns the value; with several it returns a dict keyed by output name. Coroutine
+    functions use the "async" executor, blocking ones "thread" or "process".
+
+    With an artifact store, outputs are checkpointed under a key derived from `version`
+    and the inputs. `files` names the inputs that are paths the stage writes to, and
+    `checkpoint=False` marks stages whose effect cannot be saved (e.g. loading a model).
+    """
+
+    __slots__ = ("name", "func", "inputs", "outputs", "executor", "version", "files", "checkpoint")
+
+    def __init__(self, name: str, func: Callable, inputs: List[str], outputs: List[str], executor: str = EXECUTOR_THREAD,
+                 version: int = 1, files: Iterable[str] = (), checkpoint: bool = True):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.executor = executor
+        self.version = version
+        self.files = list(files)
+        self.checkpoint = checkpoint
+
+class TimingReport:
+    """Start and end times of every stage of one run, relative to the start of the run."""
+
+    def __init__(self, stages: List[Stage], timings: Dict[str, tuple], producers: Dict[str, str], reused: Iterable[str] = ()):
+        self.stages = stages
+        self.timings = timings
+        self.producers = producers
+        self.reused = set(reused)
+
+    def duration(self, name: str) -> float:
+        start, end = self.timings[name]
+        return end - start
+
+    def total(self) -> float:
+        return max((end for _, end in self.timings.values()), default=0.0)
+
+    def critical_path(self) -> List[str]:
+        """Return the chain of stages that determined the end-to-end latency.
+
+        Starting from the stage that finished last, repeatedly step to the upstream
+        stage whose output arrived last, i.e. the one that gated the start.
+        """
+        if not self.timings:
+            return []
+        by_name = {stage.name: stage for stage in self.stages}
+        current = max(self.timings, key=lambda name: self.timings[name][1])
+        path = [current]
+        while True:
+            upstream = {self.producers[key] for key in by_name[current].inputs if key in self.producers}
+            upstream = [name for name in upstream if name in self.timings]
+            if not upstream:
+                break
+            current = max(upstream, key=lambda name: self.timings[name][1])
+            path.append(current)
+        return list(reversed(path))
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total(),
+            "stages": {name: {"start": start, "end": end, "duration": end - start} for name, (start, end) in self.timings.items()},
+            "critical_path": self.critical_path(),
+            "reused": sorted(self.reused)
+        }
+
+    def format(self) -> str:
+        critical = set(self.critical_path())
+        lines = [f"{'stage':<20} {'start':>8} {'end':>8} {'duration':>9}"]
+        for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            marker = (" *" if name in critical else "") + (" (reused)" if name in self.reused else "")
+            lines.append(f"{name:<20} {start:>8.2f} {end:>8.2f} {end - start:>9.2f}{marker}")
+        lines.append(f"total {self.total():.2f}s, critical path: {' -> '.join(self.critical_path())}")
+        return "\n".join(lines)
+
+class StageGraph:
+    """Runs stages as soon as their inputs are available.
+
+    Blocking stages run in thread or process executors, so independent stages and
+    the event loop overlap instead of running strictly in sequence. Without explicit
+    executors, thread stages use the loop's default executor and a process pool is
+    created on first use.
+
+    `executors` assigns blocking stages to specific executors by stage name, and
+    `limits` caps how many calls of a stage run at once by semaphores that may be
+    shared with other graphs, e.g. by every job of a long-running service.
+    """
+
+    def __init__(self, stages: List[Stage], thread_executor: Optional[Executor] = None, process_executor: Optional[Executor] = None,
+                 executors: Optional[Dict[str, Executor]] = None, limits: Optional[Dict[str, asyncio.Semaphore]] = None):
+        self.stages = stages
+        self.thread_executor = thread_executor
+        self.process_executor = process_executor
+        self.executors = executors or {}
+        self.limits = limits or {}
+        self.producers = {}
+        for stage in stages:
+            for key in stage.outputs:
+                if key in self.producers:
+                    raise ValueError(f"Output '{key}' is produced by both {self.producers[key]} and {stage.name}")
+                self.producers[key] = stage.name
+
+    def downstream(self, stage_name: str) -> set:
+        """Return a stage and every stage that transitively consumes its outputs."""
+        by_name = {stage.name: stage for stage in self.stages}
+        if stage_name not in by_name:
+            raise ValueError(f"Unknown stage: {stage_name}")
+        result = {stage_name}
+        changed = True
+        while changed:
+            changed = False
+            for stage in self.stages:
+                if stage.name not in result and any(self.producers.get(key) in result for key in stage.inputs):
+                    result.add(stage.name)
+                    changed = True
+        return result
+
+    def _check_inputs(self, initial: Dict[str, Any]) -> None:
+        for stage in self.stages:
+            for key in stage.inputs:
+                if key not in initial and key not in self.producers:
+                    raise ValueError(f"Stage {stage.name} needs '{key}', which nothing provides")
+
+    async def _call(self, stage: Stage, kwargs: Dict[str, Any]) -> Any:
+        if stage.executor == EXECUTOR_ASYNC:
+            return await stage.func(**kwargs)
+
+        loop = asyncio.get_running_loop()
+        if stage.name in self.executors:
+            executor = self.executors[stage.name]
+        elif stage.executor == EXECUTOR_PROCESS:
+            if self.process_executor is None:
+                self.process_executor = ProcessPoolExecutor()
+            executor = self.process_executor
+        elif stage.executor == EXECUTOR_THREAD:
+            executor = self.thread_executor
+        else:
+            raise ValueError(f"Unknown executor for stage {stage.name}: {stage.executor}")
+        future = loop.run_in_executor(executor, partial(stage.func, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The call cannot be stopped, so the cancellation only completes once it has
+            # returned; callers can then rely on it no longer writing its outputs
+            await asyncio.wait([future])
+            if not future.cancelled():
+                future.exception()
+            raise
+
+    async def run(self, initial: Dict[str, Any], runtime: Optional[Dict[str, Any]] = None,
+                  store: Optional[ArtifactStore] = None, from_stage: Optional[str] = None) -> tuple:
+        """Run every stage and return (values, TimingReport).
+
+        `initial` values are part of each stage's checkpoint key; `runtime` values (sessions,
+        callbacks) are passed to stages but never hashed. With a `store`, stages whose key
+        matches a saved artifact are skipped; `from_stage` forces that stage and everything
+        downstream of it to run again.
+        """
+        runtime = runtime or {}
+        self._check_inputs({**initial, **runtime})
+        forced = self.downstream(from_stage) if from_stage else set()
+        loop = asyncio.get_running_loop()
+        values = {key: loop.create_future() for key in self.producers}
+        hashes = {}
+        for key, value in list(initial.items()) + list(runtime.items()):
+            future = values.setdefault(key, loop.create_future())
+            future.set_result(value)
+        for key, value in initial.items():
+            hashes[key] = make_key(key, value)
+
+        run_start = time.perf_counter()
+        timings = {}
+        reused = set()
+
+        async def run_stage(stage: Stage) -> None:
+            try:
+                kwargs = {key: await values[key] for key in stage.inputs}
+                start = time.perf_counter() - run_start
+                stage_key = make_key(stage.name, stage.version, [hashes[key] for key in stage.inputs if key in hashes])
+                checkpointed = store is not None and stage.checkpoint
+
+                result = None
+                if checkpointed and stage.name not in forced:
+                    result = store.load(stage.name, stage.version, stage_key)
+                if result is not None:
+                    reused.add(stage.name)
+                    logger.info(f"Stage {stage.name} reused from checkpoint")
+                else:
+                    logger.info(f"Stage {stage.name} started")
+                    limit = self.limits.get(stage.name)
+                    if limit is None:
+                        result = await self._call(stage, kwargs)
+                    else:
+                        async with limit:
+                            result = await self._call(stage, kwargs)
+                    if len(stage.outputs) == 1:
+                        result = {stage.outputs[0]: result}
+                    if checkpointed:
+                        store.save(stage.name, stage.version, stage_key, result, [kwargs[key] for key in stage.files])
+                timings[stage.name] = (start, time.perf_counter() - run_start)
+                logger.info(f"Stage {stage.name} finished in {timings[stage.name][1] - start:.2f}s")
+
+                for key in stage.outputs:
+                    hashes[key] = make_key(stage_key, key)
+                    values[key].set_result(result[key])
+            except BaseException as e:
+                for key in stage.outputs:
+                    if not values[key].done():
+                        values[key].set_exception(e)
+                raise
+
+        tasks = [asyncio.ensure_future(run_stage(stage)) for stage in self.stages]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for future in values.values():
+                if future.done() and not future.cancelled():
+                    future.exception()
+
+        report = TimingReport(self.stages, timings, self.producers, reused)
+        return {key: future.result() for key, future in values.items()}, report
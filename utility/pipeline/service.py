@@ -0,0 +1,280 @@
+import os
+import math
+import time
+import uuid
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+from aiohttp import web
+from utility.pipeline.batch import normalize_job, percentile
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+DEFAULT_QUEUE_SIZE = 32
+# Finished jobs kept for status queries before the oldest are forgotten
+MAX_FINISHED_JOBS = 1000
+# Suggested wait before resubmitting while the queue is full and no job has finished yet
+DEFAULT_RETRY_AFTER = 5
+
+def _limit_threads(threads: int) -> None:
+    # Workers of the same pool share the cores instead of each using all of them
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+
+class StagePools:
+    """Concurrency limits per class of stage, shared by every job of a service.
+
+    `stage_classes` maps stage names to a class such as "llm" or "render", and `limits`
+    gives each class its number of concurrent calls. Classes listed in `processes`
+    also get a process pool of that size (started with spawn, each worker limited to
+    its share of the cores), so CPU-bound stages neither hold the GIL of the event
+    loop nor oversubscribe the machine.
+    """
+
+    def __init__(self, stage_classes: Dict[str, str], limits: Dict[str, int], processes: Dict[str, int]):
+        self.stage_classes = stage_classes
+        self.sizes = {**limits, **processes}
+        self.semaphores = {name: asyncio.Semaphore(size) for name, size in self.sizes.items()}
+        context = multiprocessing.get_context("spawn")
+        cores = os.cpu_count() or 1
+        self.pools: Dict[str, Executor] = {
+            name: ProcessPoolExecutor(max_workers=size, mp_context=context, initializer=_limit_threads, initargs=(max(1, cores // size),))
+            for name, size in processes.items()
+        }
+
+    def limits(self) -> Dict[str, asyncio.Semaphore]:
+        """Return the semaphore of every stage, keyed by stage name."""
+        return {stage: self.semaphores[name] for stage, name in self.stage_classes.items() if name in self.semaphores}
+
+    def executors(self) -> Dict[str, Executor]:
+        """Return the process pool of every CPU-bound stage, keyed by stage name."""
+        return {stage: self.pools[name] for stage, name in self.stage_classes.items() if name in self.pools}
+
+    def as_dict(self) -> dict:
+        # Reads the semaphores' counters for the status endpoint
+        return {
+            name: {"limit": size, "busy": size - self.semaphores[name]._value, "processes": name in self.pools}
+            for name, size in self.sizes.items()
+        }
+
+    def shutdown(self) -> None:
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+class Job:
+    __slots__ = ("id", "spec", "status", "created", "started", "finished", "output", "error", "report", "task")
+
+    def __init__(self, spec: dict):
+        self.id = spec["id"]
+        self.spec = spec
+        self.status = JOB_QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.output = None
+        self.error = None
+        self.report = None
+        self.task: Optional[asyncio.Task] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "video_type": self.spec["video_type"],
+            "output": self.output or self.spec["output"],
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "stages": self.report.as_dict() if self.report else None
+        }
+
+class JobService:
+    """Runs jobs submitted over a local HTTP API in one long-lived process.
+
+    Jobs wait in a bounded queue and `workers` of them run at a time; once
+    `queue_size` jobs are waiting, submissions are refused with HTTP 429 and a
+    Retry-After estimate, so clients back off instead of piling up work. `run_job` runs one normalized job
+    (see `normalize_job`) and returns (output, TimingReport).
+
+        POST   /jobs       submit {"script" or "script_file", "output", "video_type"}
+        GET    /jobs       list jobs
+        GET    /jobs/{id}  job status and stage timings
+        DELETE /jobs/{id}  cancel a queued or running job
+        GET    /status     queue depth, running jobs and stage pool usage
+    """
+
+    def __init__(self, run_job: Callable[[dict], Awaitable[tuple]], workers: int = 2, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 pools: Optional[StagePools] = None):
+        self.run_job = run_job
+        self.workers = workers
+        self.pools = pools
+        self.queue_size = queue_size
+        # Unbounded: cancelled jobs stay in it until a worker skips them, so capacity is counted in `queued`
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.durations: List[float] = []
+        self._worker_tasks: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+        self._stopping = False
+        self.url = None
+
+    def submit(self, spec: dict) -> Job:
+        """Queue a job; raises ValueError for invalid jobs and asyncio.QueueFull when full."""
+        if not isinstance(spec, dict):
+            raise ValueError("Job must be a JSON object")
+        spec = normalize_job(dict(spec))
+        spec["id"] = uuid.uuid4().hex[:12]
+        active_outputs = {job.spec["output"] for job in self.jobs.values() if job.status not in FINISHED_STATES}
+        if spec["output"] in active_outputs:
+            raise ValueError(f"Another active job writes to {spec['output']}")
+        if self.queued() >= self.queue_size:
+            raise asyncio.QueueFull()
+        job = Job(spec)
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        logger.info(f"Job {job.id} queued ({self.queued()} waiting)")
+        return job
+
+    def queued(self) -> int:
+        """Return the number of jobs waiting for a worker."""
+        return sum(job.status == JOB_QUEUED for job in self.jobs.values())
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a job. Queued jobs are skipped; running ones are interrupted between
+        stages. A call already running in an executor cannot be interrupted, so the job
+        stays running (and its output reserved) until that call returns."""
+        job = self.jobs[job_id]
+        if job.status == JOB_QUEUED:
+            self._finish(job, JOB_CANCELLED)
+        elif job.status == JOB_RUNNING and job.task is not None:
+            job.task.cancel()
+        return job
+
+    def retry_after(self) -> int:
+        """Estimate the seconds until a queue slot frees up."""
+        if not self.durations:
+            return DEFAULT_RETRY_AFTER
+        return max(1, math.ceil(percentile(self.durations, 0.5) / self.workers))
+
+    def status(self) -> dict:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "queued": self.queued(),
+            "queue_size": self.queue_size,
+            "workers": self.workers,
+            "jobs": counts,
+            "job_seconds_p50": percentile(self.durations, 0.5),
+            "job_seconds_p95": percentile(self.durations, 0.95),
+            "pools": self.pools.as_dict() if self.pools else {}
+        }
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        finished = [job_id for job_id, other in self.jobs.items() if other.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.status != JOB_QUEUED:
+                    continue
+                job.status = JOB_RUNNING
+                job.started = time.time()
+                job.task = asyncio.ensure_future(self.run_job(job.spec))
+                try:
+                    job.output, job.report = await job.task
+                    self.durations.append(time.time() - job.started)
+                    del self.durations[:-MAX_FINISHED_JOBS]
+                    self._finish(job, JOB_COMPLETED)
+                    logger.info(f"Job {job.id} completed. Output: {job.output}")
+                except asyncio.CancelledError:
+                    self._finish(job, JOB_CANCELLED)
+                    logger.info(f"Job {job.id} cancelled")
+                    if self._stopping:
+                        raise
+                except Exception as e:
+                    self._finish(job, JOB_FAILED, str(e))
+                    logger.error(f"Job {job.id} failed: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def handle_submit(self, request: web.Request) -> web.Response:
+        try:
+            spec = await request.json()
+            job = self.submit(spec)
+        except asyncio.QueueFull:
+            retry_after = self.retry_after()
+            return web.json_response({"error": "queue full", "retry_after": retry_after}, status=429, headers={"Retry-After": str(retry_after)})
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(job.as_dict(), status=202, headers={"Location": f"/jobs/{job.id}"})
+
+    async def handle_list(self, request: web.Request) -> web.Response:
+        return web.json_response([job.as_dict() for job in self.jobs.values()])
+
+    async def handle_get(self, request: web.Request) -> web.Response:
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            return web.json_response({"error": "unknown job"}, status=404)
+        return web.json_response(job.as_dict())
+
+    async def handle_cancel(self, request: web.Request) -> web.Response:
+        job_id = request.match_info["job_id"]
+        if job_id not in self.jobs:
+            return web.json_response({"error": "unknown job"}, status=404)
+        return web.json_response(self.cancel(job_id).as_dict(), status=202)
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        return web.json_response(self.status())
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/jobs", self.handle_submit)
+        app.router.add_get("/jobs", self.handle_list)
+        app.router.add_get("/jobs/{job_id}", self.handle_get)
+        app.router.add_delete("/jobs/{job_id}", self.handle_cancel)
+        app.router.add_get("/status", self.handle_status)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> str:
+        """Start the job workers and the HTTP server; returns the server's base URL."""
+        self._worker_tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.url = f"http://{bound_host}:{bound_port}"
+        logger.info(f"Job service listening on {self.url} with {self.workers} workers and a queue of {self.queue_size}")
+        return self.url
+
+    async def stop(self) -> None:
+        """Stop accepting jobs, cancel running ones and stop the workers."""
+        self._stopping = True
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        for job in self.jobs.values():
+            if job.status == JOB_RUNNING and job.task is not None:
+                job.task.cancel()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
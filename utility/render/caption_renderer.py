@@ -0,0 +1,74 @@
+import os
+import logging
+from functools import lru_cache
+from typing import List, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+CAPTION_FONT = os.environ.get("CAPTION_FONT", "DejaVuSans-Bold.ttf")
+FRAME_SIZE = (1920, 1080)
+LINE_SPACING = 4
+
+@lru_cache(maxsize=32)
+def get_font(fontsize: int) -> ImageFont.ImageFont:
+    """Return the caption font at the given size, falling back to Pillow's bundled font."""
+    try:
+        return ImageFont.truetype(CAPTION_FONT, fontsize)
+    except OSError:
+        logger.warning(f"Caption font {CAPTION_FONT} not found, using the default font")
+        return ImageFont.load_default(size=fontsize)
+
+@lru_cache(maxsize=8192)
+def measure_text(text: str, fontsize: int) -> float:
+    """Return the advance width of a word or glyph run, cached across captions."""
+    return get_font(fontsize).getlength(text)
+
+def wrap_text(text: str, fontsize: int, max_width: int) -> List[str]:
+    """Greedily wrap words into lines no wider than `max_width`."""
+    space = measure_text(" ", fontsize)
+    lines = []
+    current, current_width = [], 0.0
+    for word in text.split():
+        word_width = measure_text(word, fontsize)
+        if current and current_width + space + word_width > max_width:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+        else:
+            current_width += (space if current else 0) + word_width
+            current.append(word)
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+@lru_cache(maxsize=1024)
+def render_caption(text: str, fontsize: int = 50, color: str = "white", stroke_width: int = 2, stroke_color: str = "black", max_width: int = FRAME_SIZE[0]) -> Tuple[np.ndarray, np.ndarray]:
+    """Rasterize a caption and crop it to its text bounding box.
+
+    Returns read-only RGB and alpha (0-1) arrays. Identical captions share one bitmap.
+    """
+    font = get_font(fontsize)
+    content = "\n".join(wrap_text(text, fontsize, max_width - 2 * stroke_width))
+
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    left, top, right, bottom = measure.multiline_textbbox((0, 0), content, font=font, spacing=LINE_SPACING, align="center", stroke_width=stroke_width)
+    width, height = max(1, right - left), max(1, bottom - top)
+
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text(
+        (-left, -top), content, font=font, fill=color, spacing=LINE_SPACING, align="center",
+        stroke_width=stroke_width, stroke_fill=stroke_color
+    )
+
+    pixels = np.asarray(image)
+    rgb = np.ascontiguousarray(pixels[:, :, :3])
+    alpha = pixels[:, :, 3] / 255.0
+    rgb.setflags(write=False)
+    alpha.setflags(write=False)
+    return rgb, alpha
+
+def caption_position(size: Tuple[int, int], frame_size: Tuple[int, int] = FRAME_SIZE) -> Tuple[int, int]:
+    """Return the top-left offset that centers a caption bitmap in the frame."""
+    width, height = size
+    return (frame_size[0] - width) // 2, (frame_size[1] - height) // 2
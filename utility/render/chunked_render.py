@@ -0,0 +1,147 @@
+import os
+import shutil
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from moviepy.editor import CompositeVideoClip
+from utility.render.caption_renderer import CAPTION_FONT, FRAME_SIZE
+from utility.render.compositor import (VIDEO_CODEC, VIDEO_FFMPEG_PARAMS, VIDEO_FPS, build_visual_clips, ceil_to_frame, close_clips,
+                                       frame_duration)
+from utility.render.ffmpeg_backend import concat_stream_copy, get_audio_duration
+from utility.render.render_cache import (RenderReport, cached_chunk, chunk_key, cover_pieces, evict_render_cache,
+                                         piece_signatures, plan_cached_chunks, store_chunk)
+from utility.timeline import Timeline
+
+logger = logging.getLogger(__name__)
+
+# Chunks close at the first background cut after this many seconds
+DEFAULT_CHUNK_SECONDS = 30
+
+def plan_chunks(local_video_data: Timeline, duration: float, chunk_seconds: float = DEFAULT_CHUNK_SECONDS) -> List[Tuple[float, float]]:
+    """Split [0, duration] into chunks that end on background segment boundaries.
+
+    Cutting where the background changes anyway means every chunk starts on a fresh
+    keyframe without splitting a clip across two encoders. Cuts are moved to the first
+    frame at or after each boundary, so every chunk but the last holds a whole number
+    of frames, no frame of a segment lands in the next chunk (where it would be drawn
+    from the start of its source) and the joined video stays in sync with the narration.
+    """
+    cuts = sorted({ceil_to_frame(t2) for t2 in Timeline.coerce(local_video_data).ends})
+    cuts = [cut for cut in cuts if 0 < cut < duration]
+    chunks = []
+    start = 0.0
+    for cut in cuts:
+        if cut - start >= chunk_seconds:
+            chunks.append((start, cut))
+            start = cut
+    if start < duration:
+        chunks.append((start, duration))
+    return chunks
+
+def render_settings(caption_backend: str) -> dict:
+    """Everything besides the timeline that decides how a rendered chunk looks."""
+    return {
+        "codec": VIDEO_CODEC,
+        "fps": VIDEO_FPS,
+        "ffmpeg_params": VIDEO_FFMPEG_PARAMS,
+        "size": FRAME_SIZE,
+        "caption_backend": caption_backend,
+        "caption_font": CAPTION_FONT
+    }
+
+def slice_timeline(items: Timeline, chunk_start: float, chunk_end: float) -> Timeline:
+    """Return the items overlapping a chunk, clipped to it and shifted to chunk time."""
+    return Timeline.coerce(items).clip(chunk_start, chunk_end)
+
+def render_chunk(timed_captions: list, local_video_data: list, duration: float, output_file: str, caption_backend: str = "pillow") -> Optional[str]:
+    """Render one silent chunk with the shared encoder settings (runs in a worker process)."""
+    visual_clips = []
+    try:
+        # The lazy background covers the whole chunk, gaps included, in black
+        visual_clips = build_visual_clips(timed_captions, local_video_data, caption_backend, duration=duration)
+        video = CompositeVideoClip(visual_clips, size=(1920, 1080)).set_duration(duration)
+        video.write_videofile(output_file, codec=VIDEO_CODEC, fps=VIDEO_FPS, audio=False, threads=1,
+                              ffmpeg_params=VIDEO_FFMPEG_PARAMS, logger=None)
+        return output_file
+    except Exception as e:
+        logger.error(f"Error rendering chunk {output_file}: {str(e)}")
+        return None
+    finally:
+        close_clips(visual_clips)
+
+def render_chunked(audio_file_path: str, timed_captions: list, local_video_data: list, output_file: str, workers: Optional[int] = None, caption_backend: str = "pillow",
+                   chunk_seconds: float = DEFAULT_CHUNK_SECONDS, incremental: bool = False, work_dir: Optional[str] = None) -> Optional[str]:
+    """Render the timeline as independent chunks in a process pool and join them by stream copy.
+
+    Chunks are rendered without audio; the full narration is muxed once while joining,
+    which avoids AAC priming gaps at every chunk boundary.
+
+    With `incremental`, rendered chunks are cached under a hash of what they show (the
+    background sources, their lengths and the captions over them, in chunk time), so a
+    re-render after an edit only encodes the chunks whose content changed. How many
+    seconds were reused and re-encoded is logged and saved next to the output as
+    `<name>.render.json`. Chunks are written to a temporary directory inside `work_dir`
+    (default: the output's directory).
+    """
+    try:
+        duration = get_audio_duration(audio_file_path)
+    except Exception as e:
+        logger.error(f"Error loading audio file: {str(e)}")
+        return None
+
+    workers = workers or os.cpu_count() or 1
+    timed_captions = Timeline.coerce(timed_captions)
+    # Slicing uses binary search, so overlapping segments are cut first (the later one wins)
+    local_video_data = Timeline.coerce(local_video_data).repair(duration, fill_gaps=False)
+    if incremental:
+        pieces = cover_pieces(local_video_data, duration)
+        signatures = piece_signatures(pieces, timed_captions)
+        settings = render_settings(caption_backend)
+        groups = plan_cached_chunks(pieces, signatures, chunk_seconds)
+        chunks = [(pieces.starts[first], pieces.ends[last - 1]) for first, last in groups]
+        keys = [chunk_key(signatures[first:last], settings) for first, last in groups]
+    else:
+        chunks = plan_chunks(local_video_data, duration, chunk_seconds)
+        keys = [None] * len(chunks)
+
+    work_dir = tempfile.mkdtemp(prefix="chunks-", dir=work_dir or os.path.dirname(os.path.abspath(output_file)))
+    try:
+        # Cached chunks are linked into the work directory, so eviction cannot remove them before the join
+        chunk_files = [cached_chunk(key, work_dir) if key else None for key in keys]
+        pending = [index for index, chunk_file in enumerate(chunk_files) if chunk_file is None]
+        logger.info(f"Rendering {len(pending)} of {len(chunks)} chunks with {workers} workers")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                index: executor.submit(
+                    render_chunk,
+                    slice_timeline(timed_captions, *chunks[index]),
+                    slice_timeline(local_video_data, *chunks[index]),
+                    frame_duration(chunks[index][1] - chunks[index][0]),
+                    os.path.join(work_dir, f"chunk_{index:05d}.mp4"),
+                    caption_backend
+                )
+                for index in pending
+            }
+            for index, future in futures.items():
+                chunk_file = future.result()
+                if chunk_file and keys[index]:
+                    store_chunk(keys[index], chunk_file)
+                chunk_files[index] = chunk_file
+
+        if not all(chunk_files):
+            logger.error("Error rendering final video: some chunks failed")
+            return None
+        output = concat_stream_copy(chunk_files, output_file, audio_file_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if incremental and output:
+        report = RenderReport()
+        for index, chunk in enumerate(chunks):
+            (report.encoded if index in futures else report.reused).append(chunk)
+        logger.info(f"Incremental render: {report.summary()}")
+        report.save(os.path.splitext(output_file)[0] + ".render.json")
+        evict_render_cache()
+    return output
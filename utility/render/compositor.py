@@ -0,0 +1,111 @@
+import os
+import math
+import platform
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from moviepy.editor import ImageClip, TextClip, VideoFileClip
+from utility.render.caption_renderer import FRAME_SIZE, caption_position, render_caption
+from utility.render.lazy_timeline import LazyBackgroundClip
+
+# Encoder settings shared by every MoviePy render so that chunks can be stream-copied together
+VIDEO_CODEC = "libx264"
+VIDEO_FPS = 30
+VIDEO_FFMPEG_PARAMS = ["-pix_fmt", "yuv420p"]
+
+def ceil_to_frame(t, fps=VIDEO_FPS):
+    """Return the time of the first frame shown at or after `t`.
+
+    A segment covering [t1, t2) shows exactly the frames in [ceil_to_frame(t1),
+    ceil_to_frame(t2)), so cuts made there never leave part of it in the next chunk.
+    """
+    return math.ceil(round(t * fps, 6)) / fps
+
+def frame_duration(duration, fps=VIDEO_FPS):
+    """Return a clip duration for which MoviePy writes exactly the frames starting within `duration`.
+
+    MoviePy writes a frame at every multiple of 1/fps below the clip's duration, so a
+    duration ending half a frame early keeps float error from adding or losing one.
+    """
+    frames = max(1, math.ceil(round(duration * fps, 6)))
+    return (frames - 0.5) / fps
+
+def search_program(program_name):
+    try:
+        search_cmd = "where" if platform.system() == "Windows" else "which"
+        return subprocess.check_output([search_cmd, program_name]).decode().strip()
+    except subprocess.CalledProcessError:
+        return None
+
+def get_program_path(program_name):
+    program_path = search_program(program_name)
+    return program_path
+
+def configure_imagemagick():
+    magick_path = get_program_path("magick")
+    logging.info(f"ImageMagick path: {magick_path}")
+    if magick_path:
+        os.environ['IMAGEMAGICK_BINARY'] = magick_path
+    else:
+        os.environ['IMAGEMAGICK_BINARY'] = '/usr/bin/convert'
+
+def create_caption_clip(text, caption_backend="pillow"):
+    if caption_backend == "imagemagick":
+        text_clip = TextClip(txt=text, fontsize=50, color="white", stroke_width=2, stroke_color="black", method='caption', size=(1920, 1080))
+        return text_clip.set_position(('center', 'bottom'))
+
+    # Cropped bitmap placed where the full-frame ImageMagick caption draws its text
+    rgb, alpha = render_caption(text, fontsize=50, color="white", stroke_width=2, stroke_color="black")
+    text_clip = ImageClip(rgb).set_mask(ImageClip(alpha, ismask=True))
+    return text_clip.set_position(caption_position((rgb.shape[1], rgb.shape[0])))
+
+def open_background_clip(item):
+    (t1, t2), video_filename = item
+    if video_filename:
+        try:
+            video_clip = VideoFileClip(video_filename)
+            video_clip = video_clip.subclip(0, min(t2-t1, video_clip.duration))
+            video_clip = video_clip.set_start(t1).set_end(t2)
+            return video_clip
+        except Exception as e:
+            logging.error(f"Error processing video clip: {str(e)}")
+    return None
+
+def build_visual_clips(timed_captions, local_video_data, caption_backend="pillow", duration=None):
+    """Open the background clips and create the caption clips of a timeline.
+
+    With a `duration`, the background is a single `LazyBackgroundClip` that opens each
+    source only while it is on screen; otherwise every source is opened up front.
+    Callers should `close` the returned clips after rendering.
+    """
+    if caption_backend == "imagemagick":
+        configure_imagemagick()
+
+    visual_clips = []
+    if duration is not None:
+        visual_clips.append(LazyBackgroundClip(local_video_data, duration, FRAME_SIZE))
+    else:
+        with ThreadPoolExecutor() as executor:
+            future_to_video = {executor.submit(open_background_clip, item): item for item in local_video_data}
+            for future in as_completed(future_to_video):
+                video_clip = future.result()
+                if video_clip:
+                    visual_clips.append(video_clip)
+
+    for (t1, t2), text in timed_captions:
+        try:
+            text_clip = create_caption_clip(text, caption_backend)
+            text_clip = text_clip.set_start(t1).set_end(t2)
+            visual_clips.append(text_clip)
+        except Exception as e:
+            logging.error(f"Error creating text clip: {str(e)}")
+
+    return visual_clips
+
+def close_clips(clips):
+    """Release the ffmpeg readers held by rendered clips."""
+    for clip in clips:
+        try:
+            clip.close()
+        except Exception as e:
+            logging.warning(f"Error closing clip: {str(e)}")
@@ -0,0 +1,168 @@
+import os
+import wave
+import logging
+import subprocess
+import tempfile
+from typing import List, Optional, Tuple
+from utility.render.segment_preprocessor import TARGET_PROFILE, get_ffmpeg_path
+from utility.timeline import Timeline
+
+logger = logging.getLogger(__name__)
+
+CAPTION_FONT_NAME = "DejaVu Sans"
+CAPTION_FONT_SIZE = 50
+CAPTION_OUTLINE = 2
+
+def get_audio_duration(audio_file_path: str) -> float:
+    """Return the duration of a WAV file in seconds."""
+    with wave.open(audio_file_path, "rb") as audio:
+        return audio.getnframes() / audio.getframerate()
+
+def build_background_timeline(background_video_data: Timeline, duration: float) -> List[Tuple[float, float, Optional[str]]]:
+    """Turn (interval, path) pairs into contiguous pieces covering [0, duration].
+
+    Gaps between intervals, including one after the last interval, become pieces
+    without a source (rendered black), as in `LazyBackgroundClip`; overlaps are cut
+    and the last piece is cut to end at `duration`.
+    """
+    pieces = []
+    cursor = 0.0
+    for (t1, t2), path in sorted(background_video_data, key=lambda item: item[0][0]):
+        t1, t2 = max(float(t1), cursor), min(float(t2), duration)
+        if t2 <= t1:
+            continue
+        if t1 > cursor:
+            pieces.append((cursor, t1, None))
+        pieces.append((t1, t2, path))
+        cursor = t2
+
+    if cursor < duration:
+        pieces.append((cursor, duration, None))
+    return pieces
+
+def format_ass_time(seconds: float) -> str:
+    centiseconds = int(round(seconds * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+def write_ass_subtitles(timed_captions: Timeline, path: str, profile: dict = TARGET_PROFILE) -> None:
+    """Write captions as an ASS file styled like the MoviePy captions (white, black outline, centered)."""
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {profile['width']}",
+        f"PlayResY: {profile['height']}",
+        "WrapStyle: 0",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Caption,{CAPTION_FONT_NAME},{CAPTION_FONT_SIZE},&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,{CAPTION_OUTLINE},0,5,0,0,0,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+    ]
+    for (t1, t2), text in timed_captions:
+        text = text.replace("\\", "\\\\").replace("{", "\\{").replace("}", "\\}").replace("\n", "\\N")
+        lines.append(f"Dialogue: 0,{format_ass_time(t1)},{format_ass_time(t2)},Caption,,0,0,0,,{text}")
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+def escape_filter_path(path: str) -> str:
+    """Escape a file path for use as a filtergraph option value."""
+    path = path.replace("\\", "/").replace(":", "\\:").replace("'", "\\'")
+    return f"'{path}'"
+
+def build_render_command(audio_file_path: str, pieces: list, subtitles_path: str, output_file: str, duration: float, profile: dict = TARGET_PROFILE) -> List[str]:
+    """Build a single ffmpeg invocation that renders the whole video."""
+    width, height, fps = profile["width"], profile["height"], profile["fps"]
+    normalize = f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},fps={fps},setsar=1,format={profile['pix_fmt']}"
+
+    inputs = []
+    filters = []
+    labels = []
+    for index, (t1, t2, path) in enumerate(pieces):
+        piece_duration = t2 - t1
+        label = f"v{index}"
+        if path:
+            input_index = len(inputs) // 2
+            inputs += ["-i", path]
+            # Pad short sources with their last frame so every piece has its exact length
+            filters.append(
+                f"[{input_index}:v]{normalize},tpad=stop_mode=clone:stop_duration={piece_duration:.3f},"
+                f"trim=duration={piece_duration:.3f},setpts=PTS-STARTPTS[{label}]"
+            )
+        else:
+            filters.append(f"color=c=black:s={width}x{height}:r={fps}:d={piece_duration:.3f},setsar=1,format={profile['pix_fmt']}[{label}]")
+        labels.append(f"[{label}]")
+
+    audio_index = len(inputs) // 2
+    inputs += ["-i", audio_file_path]
+    filters.append(f"{''.join(labels)}concat=n={len(labels)}:v=1:a=0[bg]")
+    filters.append(f"[bg]subtitles=filename={escape_filter_path(subtitles_path)}[out]")
+
+    return [
+        get_ffmpeg_path(), "-y", "-loglevel", "error",
+        *inputs,
+        "-filter_complex", ";".join(filters),
+        "-map", "[out]", "-map", f"{audio_index}:a",
+        "-c:v", profile["codec"], "-preset", profile["preset"], "-crf", str(profile["crf"]),
+        "-pix_fmt", profile["pix_fmt"], "-r", str(fps),
+        "-c:a", "aac",
+        "-t", f"{duration:.3f}",
+        output_file
+    ]
+
+def render_with_ffmpeg(audio_file_path: str, timed_captions: Timeline, background_video_data: Timeline, output_file: str, profile: dict = TARGET_PROFILE) -> Optional[str]:
+    """Render the final video with one ffmpeg filtergraph.
+
+    `background_video_data` holds ((t1, t2), local_path) pairs; missing paths render black.
+    """
+    try:
+        duration = get_audio_duration(audio_file_path)
+    except (OSError, wave.Error) as e:
+        logger.error(f"Error loading audio file: {str(e)}")
+        return None
+
+    pieces = build_background_timeline(background_video_data, duration)
+    with tempfile.TemporaryDirectory() as work_dir:
+        subtitles_path = os.path.join(work_dir, "captions.ass")
+        write_ass_subtitles(timed_captions, subtitles_path, profile)
+        command = build_render_command(audio_file_path, pieces, subtitles_path, output_file, duration, profile)
+        try:
+            subprocess.run(command, check=True, capture_output=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            stderr = getattr(e, "stderr", b"") or b""
+            logger.error(f"Error rendering final video with ffmpeg: {str(e)} {stderr.decode(errors='ignore').strip()}")
+            return None
+    return output_file
+
+def concat_stream_copy(video_files: List[str], output_file: str, audio_file_path: Optional[str] = None) -> Optional[str]:
+    """Join files with identical encoder settings using the concat demuxer and stream copy.
+
+    When `audio_file_path` is given, the joined video is muxed with that track (encoded
+    once as AAC) instead of the inputs' own audio.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        list_path = os.path.join(work_dir, "inputs.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in video_files:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        command = [get_ffmpeg_path(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_file_path:
+            command += ["-i", audio_file_path, "-map", "0:v", "-map", "1:a", "-c:v", "copy", "-c:a", "aac", "-shortest"]
+        else:
+            command += ["-c", "copy"]
+        command.append(output_file)
+
+        try:
+            subprocess.run(command, check=True, capture_output=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            stderr = getattr(e, "stderr", b"") or b""
+            logger.error(f"Error concatenating video files: {str(e)} {stderr.decode(errors='ignore').strip()}")
+            return None
+    return output_file
@@ -0,0 +1,230 @@
+import os
+import json
+import hashlib
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from filelock import FileLock
+from typing import Optional
+from utility.cache import CACHE_ROOT, Pins, atomic_write, evict_unpinned, make_key, touch
+from utility.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+FOOTAGE_CACHE_DIR = os.path.join(CACHE_ROOT, "footage")
+FOOTAGE_CACHE_MAX_BYTES = int(os.environ.get("FOOTAGE_CACHE_MAX_BYTES", 10 * 1024 ** 3))
+# Cached files are checked against the remote ETag at most once a day
+FOOTAGE_REVALIDATE_SECONDS = float(os.environ.get("FOOTAGE_REVALIDATE_SECONDS", 24 * 3600))
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+MAX_CONNECTIONS = 16
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+def create_download_session() -> requests.Session:
+    """Create a pooled HTTP session for footage downloads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_CONNECTIONS, pool_maxsize=MAX_CONNECTIONS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+class FootageCache:
+    """Content-addressed local cache of downloaded stock footage.
+
+    Files are streamed to disk in chunks and stored under the SHA-256 of their content,
+    so the same footage behind several URLs is kept once; an index maps each URL to its
+    blob. Interrupted downloads resume with a Range request, concurrent requests for the
+    same URL (from threads or processes) share one download, and the least recently used
+    files are evicted once the cache exceeds `max_bytes`, except those pinned by renders.
+    A cached file older than `revalidate_after` seconds is checked against the URL's
+    current ETag and downloaded again if the remote file changed.
+    """
+
+    def __init__(self, directory: str = FOOTAGE_CACHE_DIR, max_bytes: int = FOOTAGE_CACHE_MAX_BYTES, session: Optional[requests.Session] = None,
+                 revalidate_after: float = FOOTAGE_REVALIDATE_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.session = session or create_download_session()
+        self.stats = {"hits": 0, "misses": 0, "resumed": 0, "downloaded_bytes": 0, "revalidated": 0, "changed": 0}
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._blob_dir = os.path.join(directory, "blobs")
+        self._index_dir = os.path.join(directory, "index")
+        self._partial_dir = os.path.join(directory, "partial")
+        for path in (self._blob_dir, self._index_dir, self._partial_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def _read_json(self, path: str) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get_path(self, url: str) -> Optional[str]:
+        """Return the cached file for a URL, or None if it has not been downloaded or has changed remotely."""
+        index_path = os.path.join(self._index_dir, f"{make_key(url)}.json")
+        entry = self._read_json(index_path)
+        if entry is None:
+            return None
+        path = os.path.join(self._blob_dir, entry["blob"])
+        if not os.path.exists(path) or not self._revalidate(url, index_path, entry):
+            return None
+        touch(path)
+        return path
+
+    def _revalidate(self, url: str, index_path: str, entry: dict) -> bool:
+        """Return False if the remote file no longer has the ETag it was downloaded with."""
+        if not entry.get("etag") or time.time() - entry.get("checked", 0) < self.revalidate_after:
+            return True
+
+        start = time.perf_counter()
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+        except requests.RequestException as e:
+            # Unreachable footage is served from the cache as it is
+            get_telemetry().record_call("footage", "revalidate", time.perf_counter() - start, "error", url=url, error=str(e))
+            logger.warning(f"Could not revalidate {url}, using the cached file: {str(e)}")
+            return True
+        get_telemetry().record_call("footage", "revalidate", time.perf_counter() - start, response.status_code, url=url)
+        self._count("revalidated")
+
+        etag = response.headers.get("ETag")
+        if response.ok and etag and etag != entry["etag"]:
+            logger.info(f"Footage at {url} changed since it was cached, downloading it again")
+            self._count("changed")
+            return False
+        atomic_write(index_path, json.dumps({**entry, "checked": time.time()}).encode("utf-8"))
+        return True
+
+    def fetch(self, url: str, pins: Optional[Pins] = None) -> Optional[str]:
+        """Return a local file for a URL, downloading it if needed. Returns None on failure.
+
+        With `pins`, the file is pinned so eviction keeps it until the pins are released;
+        a file evicted before it could be pinned is downloaded again.
+        """
+        path = self.get_path(url)
+        if path and (pins is None or pins.add(path)):
+            self._count("hits")
+            return path
+
+        url_key = make_key(url)
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url_key, threading.Lock())
+
+        with url_lock, FileLock(os.path.join(self._partial_dir, f"{url_key}.lock")):
+            path = self.get_path(url)
+            if path and (pins is None or pins.add(path)):
+                self._count("hits")
+                return path
+            self._count("misses")
+            try:
+                return self._download(url, url_key, pins)
+            except (requests.RequestException, OSError) as e:
+                logger.error(f"Error downloading file from {url}: {str(e)}")
+                return None
+
+    def _download(self, url: str, url_key: str, pins: Optional[Pins] = None, retries: int = 0) -> str:
+        part_path = os.path.join(self._partial_dir, f"{url_key}.part")
+        part_meta_path = os.path.join(self._partial_dir, f"{url_key}.json")
+        part_meta = self._read_json(part_meta_path) or {}
+
+        headers = {}
+        resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if resume_from and part_meta.get("etag"):
+            headers["Range"] = f"bytes={resume_from}-"
+            headers["If-Range"] = part_meta["etag"]
+
+        start = time.perf_counter()
+        status = "error"
+        received = 0
+        try:
+            with self.session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                status = response.status_code
+                if response.status_code == 416 and resume_from:
+                    # The partial file no longer matches the remote one; start over
+                    get_telemetry().record_call("footage", "download", time.perf_counter() - start, status, 0, retries, url=url)
+                    os.remove(part_path)
+                    return self._download(url, url_key, pins, retries + 1)
+                response.raise_for_status()
+                if response.status_code == 206:
+                    mode = "ab"
+                    self._count("resumed")
+                else:
+                    mode = "wb"
+                    resume_from = 0
+
+                etag = response.headers.get("ETag") or part_meta.get("etag")
+                atomic_write(part_meta_path, json.dumps({"url": url, "etag": etag}).encode("utf-8"))
+
+                digest = hashlib.sha256()
+                if mode == "ab":
+                    with open(part_path, "rb") as f:
+                        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                            digest.update(block)
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        received += len(chunk)
+                        self._count("downloaded_bytes", len(chunk))
+        except (requests.RequestException, OSError) as e:
+            get_telemetry().record_call("footage", "download", time.perf_counter() - start, status, received, retries, url=url, error=str(e))
+            raise
+        get_telemetry().record_call("footage", "download", time.perf_counter() - start, status, received, retries, url=url, resumed_from=resume_from)
+
+        blob = f"{digest.hexdigest()}.mp4"
+        blob_path = os.path.join(self._blob_dir, blob)
+        if os.path.exists(blob_path):
+            # Same content as footage downloaded from another URL
+            os.remove(part_path)
+            touch(blob_path)
+        else:
+            os.replace(part_path, blob_path)
+        entry = {"url": url, "etag": etag, "blob": blob, "size": os.path.getsize(blob_path), "checked": time.time()}
+        atomic_write(os.path.join(self._index_dir, f"{url_key}.json"), json.dumps(entry).encode("utf-8"))
+        os.remove(part_meta_path)
+
+        if pins is not None and not pins.add(blob_path):
+            raise OSError(f"{blob_path} was evicted before it could be pinned")
+        self.evict()
+        return blob_path
+
+    def evict(self) -> None:
+        """Trim the cached footage to `max_bytes`, keeping pinned files, and drop index entries of evicted files."""
+        if evict_unpinned(self._blob_dir, self.max_bytes):
+            self._prune_index()
+
+    def _prune_index(self) -> None:
+        with os.scandir(self._index_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                index_entry = self._read_json(entry.path)
+                if index_entry is not None and not os.path.exists(os.path.join(self._blob_dir, index_entry["blob"])):
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
+
+_footage_cache: Optional[FootageCache] = None
+_footage_cache_lock = threading.Lock()
+
+def get_footage_cache() -> FootageCache:
+    """Return the process-wide footage cache."""
+    global _footage_cache
+    with _footage_cache_lock:
+        if _footage_cache is None:
+            _footage_cache = FootageCache()
+        return _footage_cache
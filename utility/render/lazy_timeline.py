@@ -0,0 +1,105 @@
+import logging
+import threading
+from bisect import bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import numpy as np
+from moviepy.editor import VideoClip, VideoFileClip
+from utility.timeline import Timeline
+
+logger = logging.getLogger(__name__)
+
+# Clips opened ahead of the playhead
+DEFAULT_PREFETCH = 2
+
+class LazyBackgroundClip(VideoClip):
+    """The whole background track as one clip that only keeps nearby sources open.
+
+    Each source is opened shortly before its segment starts (the next `prefetch`
+    segments are opened in background threads) and closed once the playhead passes its
+    end, so the number of ffmpeg readers and decoded frame buffers stays constant
+    however long the timeline is. Segments behave like `open_background_clip`: a
+    source shorter than its segment holds its last frame, gaps are black and where
+    segments overlap the later one wins.
+    """
+
+    def __init__(self, local_video_data: Timeline, duration: float, size: Tuple[int, int] = (1920, 1080), prefetch: int = DEFAULT_PREFETCH):
+        # Cutting overlaps up front gives the later segment precedence, as in the compositor
+        timeline = Timeline.coerce(local_video_data).repair(duration, fill_gaps=False)
+        self.segments = Timeline.from_pairs(item for item in timeline if item[1])
+        self.starts = self.segments.starts
+        self.prefetch = prefetch
+        self._open: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=prefetch + 1, thread_name_prefix="clip-prefetch")
+        self._black = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        self._black.setflags(write=False)
+        self.peak_open = 0
+        super().__init__(make_frame=self._make_frame, duration=duration)
+
+    def _load(self, index: int) -> Optional[VideoFileClip]:
+        (t1, t2), path = self.segments[index]
+        try:
+            clip = VideoFileClip(path, audio=False)
+            return clip.subclip(0, min(t2 - t1, clip.duration))
+        except Exception as e:
+            logger.error(f"Error processing video clip: {str(e)}")
+            return None
+
+    def _request(self, index: int) -> Future:
+        with self._lock:
+            future = self._open.get(index)
+            if future is None:
+                future = self._open[index] = self._executor.submit(self._load, index)
+                self.peak_open = max(self.peak_open, len(self._open))
+            return future
+
+    def _release(self, keep: set) -> None:
+        with self._lock:
+            stale = [index for index in self._open if index not in keep]
+            futures = [self._open.pop(index) for index in stale]
+        for future in futures:
+            # Clips still opening are closed as soon as they are ready
+            future.add_done_callback(close_loaded_clip)
+
+    def _fit(self, frame: np.ndarray) -> np.ndarray:
+        if frame.shape == self._black.shape:
+            return frame
+        # Smaller sources sit in the top-left corner of a black frame, as in the compositor
+        canvas = self._black.copy()
+        height, width = min(frame.shape[0], canvas.shape[0]), min(frame.shape[1], canvas.shape[1])
+        canvas[:height, :width] = frame[:height, :width, :3]
+        return canvas
+
+    def _make_frame(self, t: float) -> np.ndarray:
+        index = self.segments.find(t)
+        upcoming = bisect_right(self.starts, t)
+        keep = set(range(upcoming, min(upcoming + self.prefetch, len(self.segments))))
+        if index >= 0:
+            keep.add(index)
+        self._release(keep)
+        for i in sorted(keep):
+            self._request(i)
+
+        if index < 0:
+            return self._black
+        clip = self._request(index).result()
+        if clip is None:
+            return self._black
+        local_t = min(t - self.starts[index], max(0.0, clip.duration - 1.0 / (clip.fps or 30)))
+        return self._fit(clip.get_frame(local_t))
+
+    def close(self) -> None:
+        self._release(set())
+        self._executor.shutdown(wait=True)
+        super().close()
+
+def close_loaded_clip(future: Future) -> None:
+    """Stop the ffmpeg reader of a loaded clip and release its frame buffer."""
+    clip = future.result()
+    if clip is None:
+        return
+    try:
+        clip.close()
+    except Exception as e:
+        logger.warning(f"Error closing video clip: {str(e)}")
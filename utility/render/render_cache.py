@@ -0,0 +1,157 @@
+import os
+import json
+import shutil
+import logging
+from typing import List, Optional, Tuple
+from utility.cache import CACHE_ROOT, atomic_write, evict_lru, make_key, touch
+from utility.render.compositor import VIDEO_FPS, ceil_to_frame
+from utility.render.segment_preprocessor import file_digest
+from utility.timeline import Timeline
+
+logger = logging.getLogger(__name__)
+
+RENDER_CACHE_DIR = os.path.join(CACHE_ROOT, "rendered_chunks")
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+# A chunk may end at a piece whose signature is divisible by CUT_MODULUS once it is
+# half the target length, and always ends at twice the target length
+CUT_MODULUS = 4
+# Bump when the compositor changes what a chunk looks like for the same inputs
+RENDER_CACHE_VERSION = 3
+
+def cover_pieces(local_video_data: Timeline, duration: float) -> Timeline:
+    """Return background pieces covering [0, duration]; gaps become pieces without a source.
+
+    Piece bounds are moved to the first frame at or after them, so chunks cut between
+    pieces hold whole frames and each piece holds exactly the frames its segment shows. Expects a sorted, non-overlapping timeline, as produced by `Timeline.repair`.
+    """
+    pieces = Timeline()
+    cursor = 0.0
+    for (t1, t2), path in local_video_data:
+        t1, t2 = max(ceil_to_frame(t1), cursor), min(ceil_to_frame(t2), duration)
+        if t2 <= t1:
+            continue
+        if t1 > cursor:
+            pieces.append(cursor, t1, None)
+        pieces.append(t1, t2, path)
+        cursor = t2
+    if cursor < duration:
+        pieces.append(cursor, duration, None)
+    return pieces
+
+def piece_signatures(pieces: Timeline, timed_captions: Timeline) -> List[str]:
+    """Hash what every piece shows: its source's content, its length and the captions over it.
+
+    Lengths and caption times are counted in frames, and caption times are taken
+    relative to the piece, so a piece that only moved in time (because an earlier
+    sentence changed) keeps its signature.
+    """
+    digests = {}
+    signatures = []
+    for (t1, t2), path in pieces:
+        if path and path not in digests:
+            try:
+                digests[path] = file_digest(path)
+            except OSError:
+                digests[path] = path
+        captions = [[round(c1 * VIDEO_FPS), round(c2 * VIDEO_FPS), text] for (c1, c2), text in timed_captions.clip(t1, t2)]
+        signatures.append(make_key(digests.get(path), round((t2 - t1) * VIDEO_FPS), captions))
+    return signatures
+
+def plan_cached_chunks(pieces: Timeline, signatures: List[str], chunk_seconds: float) -> List[Tuple[int, int]]:
+    """Group pieces into chunks, returned as [first, last) piece index ranges.
+
+    Cuts are content-defined: whether a chunk may end after a piece depends on that
+    piece's signature and the chunk length so far, not on absolute time. An edit that
+    changes one piece therefore changes the chunk around it, and the chunking falls
+    back in step with the previous render shortly after, so later chunks are reused.
+    """
+    chunks = []
+    first = 0
+    for index in range(len(pieces)):
+        length = pieces.ends[index] - pieces.starts[first]
+        boundary = int(signatures[index][:8], 16) % CUT_MODULUS == 0
+        if length >= 2 * chunk_seconds or (length >= chunk_seconds / 2 and boundary):
+            chunks.append((first, index + 1))
+            first = index + 1
+    if first < len(pieces):
+        chunks.append((first, len(pieces)))
+    return chunks
+
+def chunk_key(signatures: List[str], settings: dict) -> str:
+    return make_key(RENDER_CACHE_VERSION, signatures, settings)
+
+def _link_or_copy(source: str, destination: str) -> None:
+    try:
+        os.link(source, destination)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # The cache and the work directory are on different filesystems
+        shutil.copyfile(source, destination)
+
+def cached_chunk(key: str, work_dir: str) -> Optional[str]:
+    """Return a link to the cached render of a chunk inside `work_dir`, or None.
+
+    The link keeps the chunk readable until the join, even if another render evicts
+    it from the cache in the meantime.
+    """
+    path = os.path.join(RENDER_CACHE_DIR, f"{key}.mp4")
+    pinned = os.path.join(work_dir, f"cached_{key}.mp4")
+    try:
+        _link_or_copy(path, pinned)
+    except FileNotFoundError:
+        return None
+    touch(path)
+    return pinned
+
+def store_chunk(key: str, rendered_path: str) -> None:
+    """Add a freshly rendered chunk to the cache; the rendered file itself stays in place."""
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    tmp_path = os.path.join(RENDER_CACHE_DIR, f".tmp-{key}-{os.getpid()}.mp4")
+    try:
+        _link_or_copy(rendered_path, tmp_path)
+        os.replace(tmp_path, os.path.join(RENDER_CACHE_DIR, f"{key}.mp4"))
+    except OSError as e:
+        logger.error(f"Error caching rendered chunk {key}: {str(e)}")
+
+def evict_render_cache() -> int:
+    if not os.path.isdir(RENDER_CACHE_DIR):
+        return 0
+    return evict_lru(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES, suffix=".mp4")
+
+class RenderReport:
+    """Spans of an incremental render that were taken from the cache or encoded again."""
+
+    def __init__(self):
+        self.reused: List[Tuple[float, float]] = []
+        self.encoded: List[Tuple[float, float]] = []
+
+    @property
+    def reused_seconds(self) -> float:
+        return sum(t2 - t1 for t1, t2 in self.reused)
+
+    @property
+    def encoded_seconds(self) -> float:
+        return sum(t2 - t1 for t1, t2 in self.encoded)
+
+    def as_dict(self) -> dict:
+        return {
+            "reused_seconds": self.reused_seconds,
+            "encoded_seconds": self.encoded_seconds,
+            "reused_chunks": len(self.reused),
+            "encoded_chunks": len(self.encoded),
+            "reused": self.reused,
+            "encoded": self.encoded
+        }
+
+    def summary(self) -> str:
+        total = self.reused_seconds + self.encoded_seconds
+        share = self.reused_seconds / total * 100 if total else 0.0
+        return (f"Reused {self.reused_seconds:.1f}s in {len(self.reused)} chunks, "
+                f"re-encoded {self.encoded_seconds:.1f}s in {len(self.encoded)} chunks ({share:.0f}% reused)")
+
+    def save(self, path: str) -> None:
+        try:
+            atomic_write(path, json.dumps(self.as_dict(), indent=2).encode("utf-8"))
+        except OSError as e:
+            logger.error(f"Error saving render report: {str(e)}")
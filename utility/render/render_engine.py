@@ -1,107 +1,106 @@
 import os
-import tempfile
-import platform
-import subprocess
-from moviepy.editor import (AudioFileClip, CompositeVideoClip, TextClip, VideoFileClip, concatenate_videoclips)
-import requests
+from moviepy.editor import CompositeVideoClip, VideoFileClip, concatenate_videoclips
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+from utility.audio.audio_buffer import ensure_audio_file, open_audio
+from utility.cache import Pins
+from utility.render.footage_cache import get_footage_cache
+from utility.render.segment_preprocessor import prepare_segments
+from utility.render.compositor import VIDEO_CODEC, VIDEO_FPS, build_visual_clips, close_clips
+from utility.render.ffmpeg_backend import render_with_ffmpeg
+from utility.render.chunked_render import render_chunked
+from utility.timeline import Timeline
 
-def download_file(url, filename):
-    try:
-        with open(filename, 'wb') as f:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            f.write(response.content)
-        return True
-    except requests.RequestException as e:
-        logging.error(f"Error downloading file from {url}: {str(e)}")
-        return False
-
-def search_program(program_name):
-    try: 
-        search_cmd = "where" if platform.system() == "Windows" else "which"
-        return subprocess.check_output([search_cmd, program_name]).decode().strip()
-    except subprocess.CalledProcessError:
-        return None
+def fetch_background_videos(background_video_data, pretrim=True, pins=None):
+    footage_cache = get_footage_cache()
+    background_video_data = Timeline.coerce(background_video_data)
 
-def get_program_path(program_name):
-    program_path = search_program(program_name)
-    return program_path
-
-def get_output_media(audio_file_path, timed_captions, background_video_data, video_server):
-    OUTPUT_FILE_NAME = "rendered_video.mp4"
-    magick_path = get_program_path("magick")
-    logging.info(f"ImageMagick path: {magick_path}")
-    if magick_path:
-        os.environ['IMAGEMAGICK_BINARY'] = magick_path
-    else:
-        os.environ['IMAGEMAGICK_BINARY'] = '/usr/bin/convert'
-    
-    visual_clips = []
-    
-    def process_video(item):
-        (t1, t2), video_url = item
+    def fetch_video(video_url):
         if video_url:
-            video_filename = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4").name
-            if download_file(video_url, video_filename):
-                try:
-                    video_clip = VideoFileClip(video_filename).subclip(0, t2-t1)
-                    video_clip = video_clip.set_start(t1).set_end(t2)
-                    return video_clip
-                except Exception as e:
-                    logging.error(f"Error processing video clip: {str(e)}")
-            else:
-                logging.warning(f"Failed to download video from {video_url}")
+            video_filename = footage_cache.fetch(video_url, pins)
+            if video_filename:
+                return video_filename
+            logging.warning(f"Failed to download video from {video_url}")
         return None
-    
+
     with ThreadPoolExecutor() as executor:
-        future_to_video = {executor.submit(process_video, item): item for item in background_video_data}
-        for future in as_completed(future_to_video):
-            video_clip = future.result()
-            if video_clip:
-                visual_clips.append(video_clip)
-    
+        local_paths = list(executor.map(fetch_video, background_video_data.payloads))
+    local_video_data = Timeline(background_video_data.starts, background_video_data.ends, local_paths)
+    logging.info(f"Footage cache: {footage_cache.stats}")
+
+    if pretrim:
+        # Trimmed clips are already exactly the segment length in the output profile
+        local_video_data = prepare_segments(local_video_data, pins=pins)
+    return local_video_data
+
+def render_with_moviepy(audio_file_path, timed_captions, local_video_data, output_file, caption_backend="pillow", work_dir=None):
     try:
-        audio_clip = AudioFileClip(audio_file_path)
+        # Reuse the narration PCM already in memory instead of decoding the file again
+        audio_clip = open_audio(audio_file_path).as_audio_clip()
     except Exception as e:
         logging.error(f"Error loading audio file: {str(e)}")
         return None
 
-    for (t1, t2), text in timed_captions:
-        try:
-            text_clip = TextClip(txt=text, fontsize=50, color="white", stroke_width=2, stroke_color="black", method='caption', size=(1920, 1080))
-            text_clip = text_clip.set_start(t1).set_end(t2).set_position(('center', 'bottom'))
-            visual_clips.append(text_clip)
-        except Exception as e:
-            logging.error(f"Error creating text clip: {str(e)}")
-
+    visual_clips = build_visual_clips(timed_captions, local_video_data, caption_backend, duration=audio_clip.duration)
     try:
         video = CompositeVideoClip(visual_clips, size=(1920, 1080))
         video = video.set_audio(audio_clip)
         video = video.set_duration(audio_clip.duration)
 
-        video.write_videofile(OUTPUT_FILE_NAME, codec='libx264', audio_codec='aac', fps=30, threads=4, logger=None)
+        # MoviePy encodes the audio to a temporary file first, by default in the current directory
+        work_dir = work_dir or os.path.dirname(os.path.abspath(output_file))
+        temp_audiofile = os.path.join(work_dir, os.path.splitext(os.path.basename(output_file))[0] + "-audio.m4a")
+        video.write_videofile(output_file, codec=VIDEO_CODEC, audio_codec='aac', audio_fps=audio_clip.fps, fps=VIDEO_FPS, threads=4,
+                              temp_audiofile=temp_audiofile, logger=None)
     except Exception as e:
         logging.error(f"Error rendering final video: {str(e)}")
         return None
-    
-    # Clean up downloaded files
-    for clip in visual_clips:
-        if isinstance(clip, VideoFileClip) and os.path.exists(clip.filename):
-            os.remove(clip.filename)
+    finally:
+        close_clips(visual_clips)
+
+    return output_file
+
+def get_output_media(audio_file_path, timed_captions, background_video_data, video_server, pretrim=True, caption_backend="pillow", backend="moviepy", workers=1, output_file="rendered_video.mp4", incremental=False,
+                     work_dir=None):
+    """Render the final video with the MoviePy compositor (reference) or a single ffmpeg filtergraph.
+
+    With `workers` > 1 the MoviePy timeline is rendered as parallel chunks joined by stream copy.
+    With `incremental`, it is always rendered as chunks, and chunks whose content is
+    unchanged since an earlier render are reused from the render cache. Temporary
+    MoviePy files go to `work_dir` (default: the output's directory). Cached footage
+    and segments stay pinned against eviction until the render is done.
+    """
+    OUTPUT_FILE_NAME = output_file
+    timed_captions = Timeline.coerce(timed_captions)
+    with Pins() as pins:
+        local_video_data = fetch_background_videos(background_video_data, pretrim, pins)
+
+        if backend == "ffmpeg" or workers != 1 or incremental:
+            # ffmpeg reads the narration from disk, so a track kept in memory is written now
+            ensure_audio_file(audio_file_path)
 
-    return OUTPUT_FILE_NAME
+        if backend == "ffmpeg":
+            if incremental:
+                logging.warning("Incremental rendering is only supported by the MoviePy backend, rendering in full")
+            return render_with_ffmpeg(audio_file_path, timed_captions, local_video_data, OUTPUT_FILE_NAME)
+        if backend != "moviepy":
+            logging.error(f"Unsupported render backend: {backend}")
+            return None
+        if workers != 1 or incremental:
+            return render_chunked(audio_file_path, timed_captions, local_video_data, OUTPUT_FILE_NAME, workers, caption_backend, incremental=incremental,
+                                  work_dir=work_dir)
+        return render_with_moviepy(audio_file_path, timed_captions, local_video_data, OUTPUT_FILE_NAME, caption_backend, work_dir)
 
 def combine_video_segments(segment_videos):
+    """Join rendered segments, re-encoding them since their encoder settings may differ."""
+    clips = []
     try:
         clips = [VideoFileClip(video) for video in segment_videos]
         final_clip = concatenate_videoclips(clips)
-        final_clip.write_videofile("final_video.mp4", codec='libx264', audio_codec='aac', threads=4, logger=None)
+        final_clip.write_videofile("final_video.mp4", codec=VIDEO_CODEC, audio_codec='aac', fps=VIDEO_FPS, threads=4, logger=None)
         return "final_video.mp4"
     except Exception as e:
         logging.error(f"Error combining video segments: {str(e)}")
         return None
+    finally:
+        close_clips(clips)
@@ -0,0 +1,134 @@
+import os
+import hashlib
+import logging
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from utility.cache import CACHE_ROOT, Pins, evict_unpinned, make_key, touch
+from utility.timeline import Timeline
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_CACHE_DIR = os.path.join(CACHE_ROOT, "segments")
+SEGMENT_CACHE_MAX_BYTES = int(os.environ.get("SEGMENT_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+# Bump when the trim command changes what a prepared segment looks like
+SEGMENT_CACHE_VERSION = 2
+
+# Every background segment is normalized to this profile before compositing
+TARGET_PROFILE = {
+    "width": 1920,
+    "height": 1080,
+    "fps": 30,
+    "codec": "libx264",
+    "preset": "veryfast",
+    "crf": 20,
+    "pix_fmt": "yuv420p"
+}
+
+_digest_cache = {}
+_digest_lock = threading.Lock()
+
+def get_ffmpeg_path() -> str:
+    """Return the ffmpeg binary used by MoviePy."""
+    from imageio_ffmpeg import get_ffmpeg_exe
+    return get_ffmpeg_exe()
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 of a file, memoized by path, size and modification time."""
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime)
+    with _digest_lock:
+        if memo_key in _digest_cache:
+            return _digest_cache[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+
+    with _digest_lock:
+        _digest_cache[memo_key] = digest.hexdigest()
+    return _digest_cache[memo_key]
+
+def build_trim_command(source_path: str, duration: float, output_path: str, profile: dict = TARGET_PROFILE) -> List[str]:
+    """Return the ffmpeg command that trims a clip to `duration` and normalizes it to `profile`.
+
+    `-t` alone does not lengthen a source shorter than `duration`, so its last frame is
+    held (tpad) until the segment is full.
+    """
+    width, height, fps = profile["width"], profile["height"], profile["fps"]
+    video_filter = (
+        f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+        f"crop={width}:{height},fps={fps},setsar=1,"
+        f"tpad=stop_mode=clone:stop_duration={duration:.3f}"
+    )
+    return [
+        get_ffmpeg_path(), "-y", "-loglevel", "error",
+        "-i", source_path,
+        "-t", f"{duration:.3f}",
+        "-vf", video_filter,
+        "-an",
+        "-c:v", profile["codec"],
+        "-preset", profile["preset"],
+        "-crf", str(profile["crf"]),
+        "-pix_fmt", profile["pix_fmt"],
+        output_path
+    ]
+
+def prepare_segment(source_path: str, duration: float, profile: dict = TARGET_PROFILE) -> Optional[str]:
+    """Return a clip of exactly `duration` seconds in the target profile, reusing cached results.
+
+    If the clip cannot be trimmed, the source clip is returned for the compositor to
+    cut as before; None means the source itself is unreadable.
+    """
+    try:
+        key = make_key(SEGMENT_CACHE_VERSION, file_digest(source_path), round(duration, 3), profile)
+    except OSError as e:
+        logger.error(f"Error reading source clip {source_path}: {str(e)}")
+        return None
+
+    output_path = os.path.join(SEGMENT_CACHE_DIR, f"{key}.mp4")
+    if os.path.exists(output_path):
+        touch(output_path)
+        return output_path
+
+    os.makedirs(SEGMENT_CACHE_DIR, exist_ok=True)
+    tmp_path = os.path.join(SEGMENT_CACHE_DIR, f".tmp-{key}-{os.getpid()}-{threading.get_ident()}.mp4")
+    try:
+        subprocess.run(build_trim_command(source_path, duration, tmp_path, profile), check=True, capture_output=True)
+        os.replace(tmp_path, output_path)
+    except (subprocess.CalledProcessError, OSError) as e:
+        stderr = getattr(e, "stderr", b"") or b""
+        logger.error(f"Error pre-trimming {source_path}: {str(e)} {stderr.decode(errors='ignore').strip()}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return source_path
+    return output_path
+
+def prepare_segments(segments: Timeline, workers: Optional[int] = None, profile: dict = TARGET_PROFILE, pins: Optional[Pins] = None) -> Timeline:
+    """Pre-trim and normalize the source clip of every timeline segment in parallel.
+
+    Each ffmpeg invocation is its own process, so a thread pool is enough to keep
+    `workers` encoders busy. Segments whose clip could not be trimmed keep their source
+    clip; those whose source is unreadable get None. With `pins`, the prepared clips
+    are pinned so eviction keeps them until the pins are released.
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(SEGMENT_CACHE_DIR, exist_ok=True)
+    segments = Timeline.coerce(segments)
+
+    def prepare(source_path, t1, t2):
+        if not source_path:
+            return None
+        for _ in range(2):
+            path = prepare_segment(source_path, t2 - t1, profile)
+            if pins is None or pins.add(path):
+                return path
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        prepared = list(executor.map(prepare, segments.payloads, segments.starts, segments.ends))
+
+    evict_unpinned(SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES, suffix=".mp4")
+    return Timeline(segments.starts, segments.ends, prepared)
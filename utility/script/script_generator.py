@@ -1,16 +1,6 @@
-import os
 import json
-
-# Determine which API client to use
-if len(os.environ.get("GROQ_API_KEY", "")) > 30:
-    from groq import Groq
-    model = "mixtral-8x7b-32768"
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-else:
-    from openai import OpenAI
-    OPENAI_API_KEY = os.getenv('OPENAI_KEY')
-    model = "gpt-4"
-    client = OpenAI(api_key=OPENAI_API_KEY)
+from utility.llm_cache import cached_chat_completion
+from utility.llm_client import get_llm_client
 
 def process_script(script, video_type='short'):
     if video_type == 'short':
@@ -39,15 +29,9 @@ def process_script(script, video_type='short'):
         )
 
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": "Please edit the script as instructed."}
-            ]
-        )
-        
-        processed_script = response.choices[0].message.content.strip()
+        client, model = get_llm_client("script")
+        response_text = cached_chat_completion(client, model, prompt, "Please edit the script as instructed.")
+        processed_script = response_text.strip()
         return processed_script
     except Exception as e:
         print("An error occurred while processing the script:", str(e))
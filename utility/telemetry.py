@@ -0,0 +1,266 @@
+import os
+import gzip
+import json
+import queue
+import atexit
+import shutil
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from utility.cache import atomic_write
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_DIR = os.environ.get("ETOA_TELEMETRY_DIR", ".logs")
+# Rotate a sink once it grows past 50 MB and keep the last 5 rotated files
+TELEMETRY_MAX_BYTES = int(os.environ.get("ETOA_TELEMETRY_MAX_BYTES", 50 * 1024 ** 2))
+TELEMETRY_BACKUPS = int(os.environ.get("ETOA_TELEMETRY_BACKUPS", 5))
+TELEMETRY_GZIP = os.environ.get("ETOA_TELEMETRY_GZIP", "1") == "1"
+FLUSH_INTERVAL = 1.0
+QUEUE_SIZE = 10000
+
+# Sink that receives the structured record of every external call
+LOG_TYPE_CALLS = "CALLS"
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class JsonlSink:
+    """Append-only JSONL file that rotates past `max_bytes`, optionally gzipping rotated files.
+
+    Only the telemetry writer thread touches a sink, so it does no locking of its own.
+    """
+
+    def __init__(self, path: str, max_bytes: int = TELEMETRY_MAX_BYTES, backups: int = TELEMETRY_BACKUPS, compress: bool = TELEMETRY_GZIP):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self._file = None
+        self._size = 0
+
+    def _open(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def write(self, lines: List[str]) -> None:
+        if self._file is None:
+            self._open()
+        data = "".join(lines)
+        self._file.write(data)
+        self._size += len(data.encode("utf-8"))
+        if self._size >= self.max_bytes:
+            self.rotate()
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def rotate(self) -> None:
+        """Move the current file aside and start a new one."""
+        self.close()
+        if not os.path.exists(self.path):
+            return
+        base, ext = os.path.splitext(self.path)
+        rotated = f"{base}.{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{ext}"
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        self._prune(os.path.basename(base) + ".")
+
+    def _prune(self, prefix: str) -> None:
+        directory = os.path.dirname(self.path) or "."
+        rotated = sorted(name for name in os.listdir(directory) if name.startswith(prefix) and name != os.path.basename(self.path))
+        for name in rotated[:max(0, len(rotated) - self.backups)]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+class Telemetry:
+    """Structured records of external calls, written as JSONL by a background thread.
+
+    Callers never block on disk: records go through a bounded queue and are dropped
+    (and counted) if the writer falls behind. Each log type gets its own sink.
+    Counters and latency histograms are kept in memory for `snapshot`.
+    """
+
+    def __init__(self, directory: str = TELEMETRY_DIR, max_bytes: int = TELEMETRY_MAX_BYTES, backups: int = TELEMETRY_BACKUPS, compress: bool = TELEMETRY_GZIP):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._sinks: Dict[str, JsonlSink] = {}
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._thread = None
+        self._closed = False
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                items = [self._queue.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batches: Dict[str, List[str]] = {}
+            for item in items:
+                if item is not None:
+                    log_type, line = item
+                    batches.setdefault(log_type, []).append(line)
+            for log_type, lines in batches.items():
+                try:
+                    sink = self._sinks.get(log_type)
+                    if sink is None:
+                        sink = self._sinks[log_type] = JsonlSink(os.path.join(self.directory, f"{log_type.lower()}.jsonl"), self.max_bytes, self.backups, self.compress)
+                    sink.write(lines)
+                    sink.flush()
+                except OSError as e:
+                    logger.error(f"Error writing {log_type} telemetry: {str(e)}")
+            for _ in items:
+                self._queue.task_done()
+            if None in items:
+                for sink in self._sinks.values():
+                    sink.close()
+                return
+
+    def _count(self, name: str, labels: tuple, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + amount
+
+    def log(self, log_type: str, record: dict) -> None:
+        """Queue a record for the sink of `log_type`."""
+        if self._closed:
+            return
+        self._start()
+        record = {"timestamp": datetime.now().isoformat(), **record}
+        try:
+            self._queue.put_nowait((log_type, json.dumps(record, default=str) + "\n"))
+        except queue.Full:
+            self._count("telemetry_dropped_total", (("type", log_type),))
+
+    def record_call(self, service: str, operation: str, latency: float, status: str, bytes_received: int = 0, retries: int = 0, **fields) -> None:
+        """Record one external call: update the metrics and log it to the CALLS sink."""
+        labels = (("service", service), ("status", str(status)))
+        self._count("external_calls_total", labels)
+        self._count("external_call_bytes_total", (("service", service),), bytes_received)
+        self._count("external_call_retries_total", (("service", service),), retries)
+        with self._lock:
+            self._histograms.setdefault(service, Histogram()).observe(latency)
+
+        self.log(LOG_TYPE_CALLS, {
+            "service": service,
+            "operation": operation,
+            "latency": round(latency, 6),
+            "status": status,
+            "bytes": bytes_received,
+            "retries": retries,
+            **fields
+        })
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        """Count a lookup in one of the persistent caches, as a hit or a miss."""
+        self._count("cache_lookups_total", (("cache", cache), ("result", "hit" if hit else "miss")))
+
+    def snapshot(self) -> dict:
+        """Return the current counters and latency histograms."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self._counters.items())]
+            histograms = {
+                service: {"buckets": dict(zip(map(str, LATENCY_BUCKETS), histogram.counts)), "sum": histogram.total, "count": histogram.count}
+                for service, histogram in self._histograms.items()
+            }
+        return {"counters": counters, "latency_seconds": histograms}
+
+    def format_prometheus(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        seen = set()
+        for counter in snapshot["counters"]:
+            if counter["name"] not in seen:
+                seen.add(counter["name"])
+                lines.append(f"# TYPE etoa_{counter['name']} counter")
+            labels = ",".join(f'{key}="{value}"' for key, value in counter["labels"].items())
+            lines.append(f"etoa_{counter['name']}{{{labels}}} {counter['value']}")
+        if snapshot["latency_seconds"]:
+            lines.append("# TYPE etoa_external_call_latency_seconds histogram")
+        for service, histogram in snapshot["latency_seconds"].items():
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'etoa_external_call_latency_seconds_bucket{{service="{service}",le="{bound}"}} {count}')
+            lines.append(f'etoa_external_call_latency_seconds_bucket{{service="{service}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'etoa_external_call_latency_seconds_sum{{service="{service}"}} {histogram["sum"]}')
+            lines.append(f'etoa_external_call_latency_seconds_count{{service="{service}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, directory: Optional[str] = None) -> None:
+        """Write metrics.json and metrics.prom (for the node exporter textfile collector)."""
+        directory = directory or self.directory
+        os.makedirs(directory, exist_ok=True)
+        atomic_write(os.path.join(directory, "metrics.json"), json.dumps(self.snapshot(), indent=2).encode("utf-8"))
+        atomic_write(os.path.join(directory, "metrics.prom"), self.format_prometheus().encode("utf-8"))
+
+    def flush(self) -> None:
+        """Block until every queued record has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """Write the remaining records and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+def get_telemetry() -> Telemetry:
+    """Return the process-wide telemetry writer."""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry()
+            atexit.register(_telemetry.close)
+        return _telemetry
@@ -0,0 +1,171 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+Interval = Tuple[float, float]
+
+class Timeline:
+    """Intervals with payloads, stored as parallel arrays of starts, ends and payloads.
+
+    Captions (payload: text), search terms (list of queries), video URLs and local
+    clip paths all share this shape. Iterating yields `((t1, t2), payload)` pairs, so
+    code written against the old lists of tuples keeps working. Point and range
+    queries use binary search and expect a sorted, non-overlapping timeline, which
+    is what `repair` produces.
+    """
+
+    __slots__ = ("starts", "ends", "payloads")
+
+    def __init__(self, starts: Iterable[float] = (), ends: Iterable[float] = (), payloads: Iterable[Any] = ()):
+        self.starts = array("d", starts)
+        self.ends = array("d", ends)
+        self.payloads = list(payloads)
+        if not len(self.starts) == len(self.ends) == len(self.payloads):
+            raise ValueError("Timeline needs as many starts, ends and payloads")
+
+    @classmethod
+    def from_pairs(cls, items: Iterable) -> "Timeline":
+        """Build a timeline from `((t1, t2), payload)` pairs, as tuples or JSON lists."""
+        starts, ends, payloads = array("d"), array("d"), []
+        for (t1, t2), payload in items:
+            starts.append(float(t1))
+            ends.append(float(t2))
+            payloads.append(payload)
+        timeline = cls.__new__(cls)
+        timeline.starts, timeline.ends, timeline.payloads = starts, ends, payloads
+        return timeline
+
+    @classmethod
+    def coerce(cls, value) -> "Timeline":
+        """Return `value` as a timeline, converting pair lists (e.g. loaded from a checkpoint)."""
+        if isinstance(value, Timeline):
+            return value
+        return cls.from_pairs(value or [])
+
+    def append(self, t1: float, t2: float, payload: Any) -> None:
+        self.starts.append(t1)
+        self.ends.append(t2)
+        self.payloads.append(payload)
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def __iter__(self) -> Iterator[Tuple[Interval, Any]]:
+        return iter(zip(zip(self.starts, self.ends), self.payloads))
+
+    def __getitem__(self, index: int) -> Tuple[Interval, Any]:
+        return (self.starts[index], self.ends[index]), self.payloads[index]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Timeline):
+            return NotImplemented
+        return self.starts == other.starts and self.ends == other.ends and self.payloads == other.payloads
+
+    def __repr__(self) -> str:
+        return f"Timeline({self.to_pairs()!r})"
+
+    def to_pairs(self) -> List[Tuple[Interval, Any]]:
+        return list(self)
+
+    def to_list(self) -> list:
+        """Return the timeline as JSON-serializable `[[t1, t2], payload]` lists."""
+        return [[[t1, t2], payload] for (t1, t2), payload in self]
+
+    @property
+    def end(self) -> float:
+        return max(self.ends, default=0.0)
+
+    def find(self, t: float) -> int:
+        """Return the index of the interval containing t, or -1."""
+        index = bisect_right(self.starts, t) - 1
+        if index >= 0 and t < self.ends[index]:
+            return index
+        return -1
+
+    def overlapping(self, t1: float, t2: float) -> range:
+        """Return the indices of the intervals that overlap [t1, t2)."""
+        return range(bisect_right(self.ends, t1), bisect_left(self.starts, t2))
+
+    def clip(self, t1: float, t2: float, shift: bool = True) -> "Timeline":
+        """Return the intervals overlapping [t1, t2), cut to it and (with `shift`) moved to start at 0."""
+        offset = t1 if shift else 0.0
+        indices = self.overlapping(t1, t2)
+        return Timeline(
+            (max(self.starts[i], t1) - offset for i in indices),
+            (min(self.ends[i], t2) - offset for i in indices),
+            (self.payloads[i] for i in indices)
+        )
+
+    def validate(self, duration: Optional[float] = None, tolerance: float = 1e-3) -> List[str]:
+        """Return a description of every problem: empty or reversed intervals, disorder,
+        overlaps, gaps and intervals outside [0, duration]."""
+        problems = []
+        for index, ((t1, t2), _) in enumerate(self):
+            if t2 - t1 <= 0:
+                problems.append(f"interval {index} [{t1}, {t2}] is empty or reversed")
+            if t1 < -tolerance or (duration is not None and t2 > duration + tolerance):
+                problems.append(f"interval {index} [{t1}, {t2}] is outside [0, {duration}]")
+            if index:
+                previous_end = self.ends[index - 1]
+                if t1 < self.starts[index - 1]:
+                    problems.append(f"interval {index} starts before interval {index - 1}")
+                elif t1 < previous_end - tolerance:
+                    problems.append(f"interval {index} overlaps the previous one by {previous_end - t1:.3f}s")
+                elif t1 > previous_end + tolerance:
+                    problems.append(f"gap of {t1 - previous_end:.3f}s before interval {index}")
+        if duration is not None and len(self):
+            if self.starts[0] > tolerance:
+                problems.append(f"gap of {self.starts[0]:.3f}s at the start")
+            if self.end < duration - tolerance:
+                problems.append(f"gap of {duration - self.end:.3f}s at the end")
+        return problems
+
+    def repair(self, duration: Optional[float] = None, fill_gaps: bool = True) -> "Timeline":
+        """Return a sorted, non-overlapping copy clamped to [0, duration].
+
+        Overlaps are cut at the next interval's start and empty intervals dropped. With
+        `fill_gaps`, every interval is extended to the next one and the timeline is
+        stretched to cover [0, duration] without holes.
+        """
+        import numpy as np
+
+        if not len(self):
+            return Timeline()
+        order = np.argsort(np.frombuffer(self.starts, dtype=np.float64), kind="stable")
+        starts = np.frombuffer(self.starts, dtype=np.float64)[order]
+        ends = np.frombuffer(self.ends, dtype=np.float64)[order]
+        payloads = [self.payloads[i] for i in order]
+
+        upper = np.inf if duration is None else duration
+        starts = np.clip(starts, 0.0, upper)
+        ends = np.clip(ends, 0.0, upper)
+        ends[:-1] = np.minimum(ends[:-1], starts[1:])
+
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+        payloads = [payload for payload, kept in zip(payloads, keep) if kept]
+        if fill_gaps and len(starts):
+            ends[:-1] = starts[1:]
+            starts[0] = 0.0
+            if duration is not None:
+                ends[-1] = duration
+        return Timeline(starts.tolist(), ends.tolist(), payloads)
+
+    def merge_empty(self) -> "Timeline":
+        """Absorb runs of intervals without a payload into the interval before them.
+
+        A run at the very start has nothing to absorb it and becomes one empty interval.
+        """
+        import numpy as np
+
+        if not len(self):
+            return Timeline()
+        has_payload = np.fromiter((payload is not None for payload in self.payloads), dtype=bool, count=len(self))
+        groups = np.cumsum(has_payload)
+        firsts = np.flatnonzero(np.diff(groups, prepend=-1))
+        ends = np.maximum.reduceat(np.frombuffer(self.ends, dtype=np.float64), firsts)
+        return Timeline(
+            (self.starts[i] for i in firsts),
+            ends.tolist(),
+            (self.payloads[i] for i in firsts)
+        )
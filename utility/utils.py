@@ -1,42 +1,16 @@
-import os
-from datetime import datetime
-import json
 import logging
+from utility.telemetry import get_telemetry
 
-# Log types
+# Log types, each written to its own JSONL sink in the telemetry directory
 LOG_TYPE_GPT = "GPT"
 LOG_TYPE_PEXEL = "PEXEL"
 
-# log directory paths
-DIRECTORY_LOG_GPT = ".logs/gpt_logs"
-DIRECTORY_LOG_PEXEL = ".logs/pexel_logs"
-
-def ensure_directory_exists(directory):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-
 def log_response(log_type, query, response):
-    log_entry = {
-        "query": query,
-        "response": response,
-        "timestamp": datetime.now().isoformat()
-    }
-
-    if log_type == LOG_TYPE_GPT:
-        directory = DIRECTORY_LOG_GPT
-    elif log_type == LOG_TYPE_PEXEL:
-        directory = DIRECTORY_LOG_PEXEL
-    else:
+    if log_type not in (LOG_TYPE_GPT, LOG_TYPE_PEXEL):
         logging.error(f"Invalid log type: {log_type}")
         return
 
-    ensure_directory_exists(directory)
-    filename = f'{datetime.now().strftime("%Y%m%d_%H%M%S")}_{log_type.lower()}.txt'
-    filepath = os.path.join(directory, filename)
-
-    try:
-        with open(filepath, "w") as outfile:
-            json.dump(log_entry, outfile, indent=2)
-        logging.info(f"Log entry saved: {filepath}")
-    except IOError as e:
-        logging.error(f"Error writing log file {filepath}: {str(e)}")
+    get_telemetry().log(log_type, {
+        "query": query,
+        "response": response
+    })
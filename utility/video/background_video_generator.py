@@ -1,38 +1,153 @@
 import os 
 import requests
+import aiohttp
+import asyncio
+import random
+import threading
+from functools import partial
 from utility.utils import log_response, LOG_TYPE_PEXEL
+from utility.telemetry import get_telemetry
+from utility.cache import CACHE_ROOT, DiskCache, make_key
+from utility.video.footage_catalog import get_footage_catalog, is_16_9
+from utility.timeline import Timeline
 import logging
 import time
-from typing import List, Tuple, Optional
+from typing import Callable, List, Optional
 
 logger = logging.getLogger(__name__)
 
 PEXELS_API_KEY = os.environ.get('PEXELS_KEY')
+PEXELS_API_URL = os.environ.get('PEXELS_API_URL', "https://api.pexels.com/videos/search")
 MAX_RETRIES = 3
 RETRY_DELAY = 2
+PER_PAGE = 15
+MAX_PAGES = 3
 
-def search_videos(query_string: str, orientation_landscape: bool = True, page: int = 1) -> Optional[dict]:
-    """Search for videos using the Pexels API."""
-    url = "https://api.pexels.com/videos/search"
-    headers = {
+# Pexels allows 200 requests per hour by default
+PEXELS_RATE_LIMIT = float(os.environ.get('PEXELS_RATE_LIMIT', 200 / 3600))
+PEXELS_RATE_BURST = int(os.environ.get('PEXELS_RATE_BURST', 200))
+MAX_CONNECTIONS = 10
+REQUEST_TIMEOUT = 30
+
+# Answer every search from the local footage catalog without calling the API
+PEXELS_OFFLINE = os.environ.get('PEXELS_OFFLINE', "0") == "1"
+
+class TokenBucket:
+    """Token bucket rate limiter shared by coroutines and blocking callers in threads."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token if one is available; otherwise return the seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self) -> None:
+        """`acquire` for synchronous callers."""
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+pexels_rate_limiter = TokenBucket(PEXELS_RATE_LIMIT, PEXELS_RATE_BURST)
+
+# Search responses are reused across runs for a week, up to 200 MB
+PEXELS_CACHE_TTL = float(os.environ.get('PEXELS_CACHE_TTL', 7 * 24 * 3600))
+PEXELS_CACHE_MAX_BYTES = int(os.environ.get('PEXELS_CACHE_MAX_BYTES', 200 * 1024 ** 2))
+
+_pexels_cache: Optional[DiskCache] = None
+_pexels_cache_lock = threading.Lock()
+
+def get_pexels_cache() -> DiskCache:
+    """Return the process-wide Pexels search cache, creating its directory on first use."""
+    global _pexels_cache
+    with _pexels_cache_lock:
+        if _pexels_cache is None:
+            _pexels_cache = DiskCache(os.path.join(CACHE_ROOT, "pexels"), ttl=PEXELS_CACHE_TTL, max_bytes=PEXELS_CACHE_MAX_BYTES)
+        return _pexels_cache
+
+def get_search_headers() -> dict:
+    return {
         "Authorization": PEXELS_API_KEY,
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
-    params = {
+
+def get_search_params(query_string: str, orientation_landscape: bool, page: int) -> dict:
+    return {
         "query": query_string,
         "orientation": "landscape" if orientation_landscape else "portrait",
-        "per_page": 15,
+        "per_page": PER_PAGE,
         "page": page
     }
 
+def backoff_delay(attempt: int) -> float:
+    """Return an exponential backoff delay with full jitter for the given attempt."""
+    return random.uniform(0, RETRY_DELAY * 2 ** attempt)
+
+def create_pexels_session() -> aiohttp.ClientSession:
+    """Create a pooled HTTP session for Pexels requests."""
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS),
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    )
+
+def get_search_cache_key(query_string: str, orientation_landscape: bool, page: int) -> str:
+    params = get_search_params(query_string, orientation_landscape, page)
+    return make_key(params["query"], params["orientation"], params["page"], params["per_page"])
+
+def search_videos(query_string: str, orientation_landscape: bool = True, page: int = 1, rate_limiter: Optional[TokenBucket] = None) -> Optional[dict]:
+    """Search for videos using the Pexels API, served from the response cache when possible."""
+    cache_key = get_search_cache_key(query_string, orientation_landscape, page)
+
+    def fetch() -> Optional[dict]:
+        # Only fresh API results go into the catalog, so cache hits do not count as new sightings
+        vids = fetch_videos(query_string, orientation_landscape, page, rate_limiter)
+        get_footage_catalog().add_results(query_string, vids)
+        return vids
+
+    return get_pexels_cache().get_or_fetch(cache_key, fetch)
+
+def fetch_videos(query_string: str, orientation_landscape: bool = True, page: int = 1, rate_limiter: Optional[TokenBucket] = None) -> Optional[dict]:
+    """Search for videos using the Pexels API."""
+    headers = get_search_headers()
+    params = get_search_params(query_string, orientation_landscape, page)
+    rate_limiter = rate_limiter or pexels_rate_limiter
+
     for attempt in range(MAX_RETRIES):
+        rate_limiter.acquire_blocking()
+        start = time.perf_counter()
+        status = "error"
+        size = 0
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = requests.get(PEXELS_API_URL, headers=headers, params=params)
+            status, size = response.status_code, len(response.content)
             response.raise_for_status()
             json_data = response.json()
+            get_telemetry().record_call("pexels", "search", time.perf_counter() - start, status, size, attempt, query=query_string, page=page)
             log_response(LOG_TYPE_PEXEL, query_string, json_data)
             return json_data
         except requests.RequestException as e:
+            get_telemetry().record_call("pexels", "search", time.perf_counter() - start, status, size, attempt, query=query_string, page=page, error=str(e))
             logger.error(f"Error in API request (attempt {attempt + 1}/{MAX_RETRIES}): {str(e)}")
             if attempt < MAX_RETRIES - 1:
                 time.sleep(RETRY_DELAY)
@@ -40,10 +155,57 @@ def search_videos(query_string: str, orientation_landscape: bool = True, page: i
                 logger.error("Max retries reached. Giving up.")
                 return None
 
+async def search_videos_async(session: aiohttp.ClientSession, query_string: str, orientation_landscape: bool = True, page: int = 1, rate_limiter: Optional[TokenBucket] = None) -> Optional[dict]:
+    """Search for videos on a shared session, served from the response cache when possible."""
+    cache_key = get_search_cache_key(query_string, orientation_landscape, page)
+
+    async def fetch() -> Optional[dict]:
+        vids = await fetch_videos_async(session, query_string, orientation_landscape, page, rate_limiter)
+        if vids:
+            # SQLite writes block, so they run off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, get_footage_catalog().add_results, query_string, vids)
+        return vids
+
+    return await get_pexels_cache().get_or_fetch_async(cache_key, fetch)
+
+async def fetch_videos_async(session: aiohttp.ClientSession, query_string: str, orientation_landscape: bool = True, page: int = 1, rate_limiter: Optional[TokenBucket] = None) -> Optional[dict]:
+    """Search for videos using the Pexels API on a shared session."""
+    headers = get_search_headers()
+    params = get_search_params(query_string, orientation_landscape, page)
+    rate_limiter = rate_limiter or pexels_rate_limiter
+
+    for attempt in range(MAX_RETRIES):
+        await rate_limiter.acquire()
+        start = time.perf_counter()
+        status = "error"
+        size = 0
+        try:
+            async with session.get(PEXELS_API_URL, headers=headers, params=params) as response:
+                status = response.status
+                body = await response.read()
+                size = len(body)
+                response.raise_for_status()
+                json_data = await response.json()
+            get_telemetry().record_call("pexels", "search", time.perf_counter() - start, status, size, attempt, query=query_string, page=page)
+            log_response(LOG_TYPE_PEXEL, query_string, json_data)
+            return json_data
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # A body that is not JSON fails like the sync path: retried, then treated as no result
+            get_telemetry().record_call("pexels", "search", time.perf_counter() - start, status, size, attempt, query=query_string, page=page, error=str(e))
+            logger.error(f"Error in API request (attempt {attempt + 1}/{MAX_RETRIES}): {str(e)}")
+            if attempt < MAX_RETRIES - 1:
+                await asyncio.sleep(backoff_delay(attempt))
+            else:
+                logger.error("Max retries reached. Giving up.")
+                return None
+
 def getBestVideo(query_string: str, orientation_landscape: bool = True, used_vids: List[str] = [], page: int = 1) -> Optional[str]:
     """Get the best video for a given query string."""
     vids = search_videos(query_string, orientation_landscape, page)
-    
+    return select_best_video(vids, query_string, orientation_landscape, used_vids)
+
+def select_best_video(vids: Optional[dict], query_string: str, orientation_landscape: bool = True, used_vids: List[str] = []) -> Optional[str]:
+    """Pick the best unused video link from a Pexels search response."""
     if vids is None or 'videos' not in vids:
         logger.warning(f"No valid response for query: {query_string}")
         return None
@@ -55,9 +217,9 @@ def getBestVideo(query_string: str, orientation_landscape: bool = True, used_vid
         return None
 
     if orientation_landscape:
-        filtered_videos = [video for video in videos if video['width'] >= 1920 and video['height'] >= 1080 and video['width']/video['height'] == 16/9]
+        filtered_videos = [video for video in videos if video['width'] >= 1920 and video['height'] >= 1080 and is_16_9(video['width'], video['height'])]
     else:
-        filtered_videos = [video for video in videos if video['width'] >= 1080 and video['height'] >= 1920 and video['height']/video['width'] == 16/9]
+        filtered_videos = [video for video in videos if video['width'] >= 1080 and video['height'] >= 1920 and is_16_9(video['height'], video['width'])]
 
     sorted_videos = sorted(filtered_videos, key=lambda x: abs(15-int(x['duration'])))
 
@@ -75,25 +237,90 @@ def getBestVideo(query_string: str, orientation_landscape: bool = True, used_vid
     logger.warning(f"No suitable videos found for query: {query_string}")
     return None
 
-def generate_video_url(timed_video_searches: List[Tuple[Tuple[float, float], List[str]]], video_server: str) -> List[Tuple[Tuple[float, float], Optional[str]]]:
-    """Generate video URLs for timed video searches."""
-    timed_video_urls = []
-    if video_server == "pexel":
-        used_links = []
+async def resolve_pexels_urls(session: aiohttp.ClientSession, timed_video_searches: Timeline, rate_limiter: Optional[TokenBucket] = None, on_url: Optional[Callable[[str], None]] = None) -> Timeline:
+    """Resolve a video URL for every segment with concurrent Pexels searches.
+
+    The first query of every segment is searched up front, concurrently. Selection then
+    walks the segments in order with the same page x query fallback and `used_links`
+    bookkeeping as the sequential version, fetching other pages and queries only when
+    needed, so the chosen clips are the same for the same search responses.
+
+    `on_url` is called with each URL as soon as its segment is resolved, so downstream
+    work such as downloading can start before the whole list is ready.
+
+    Segments the API cannot serve (errors, exhausted quota, no suitable result) fall
+    back to the local footage catalog; with PEXELS_OFFLINE=1 only the catalog is used.
+    """
+    searches = {}
+    catalog = get_footage_catalog()
+    loop = asyncio.get_running_loop()
+
+    def search(query: str, page: int) -> asyncio.Future:
+        key = (query, page)
+        if key not in searches:
+            searches[key] = asyncio.ensure_future(search_videos_async(session, query, True, page, rate_limiter))
+        return searches[key]
+
+    timed_video_searches = Timeline.coerce(timed_video_searches)
+    if not PEXELS_OFFLINE:
+        for search_terms in timed_video_searches.payloads:
+            if search_terms:
+                search(search_terms[0], 1)
+
+    timed_video_urls = Timeline()
+    used_links = []
+    try:
         for (t1, t2), search_terms in timed_video_searches:
             url = None
-            for page in range(1, 4):  # Try up to 3 pages
+            for page in range(1, MAX_PAGES + 1):
+                if PEXELS_OFFLINE:
+                    break
                 for query in search_terms:
-                    url = getBestVideo(query, orientation_landscape=True, used_vids=used_links, page=page)
+                    vids = await search(query, page)
+                    url = select_best_video(vids, query, orientation_landscape=True, used_vids=used_links)
                     if url:
-                        used_links.append(url.split('.hd')[0])
                         break
                 if url:
                     break
-            timed_video_urls.append(((t1, t2), url))
+            if not url:
+                for query in search_terms:
+                    # SQLite queries block, so they run off the event loop
+                    links = await loop.run_in_executor(None, partial(catalog.find_clips, query, t2 - t1, orientation_landscape=True, exclude=list(used_links)))
+                    if links:
+                        url = links[0]
+                        logger.info(f"Footage for '{query}' selected from the local catalog")
+                        break
+            if url:
+                used_links.append(url.split('.hd')[0])
+                await loop.run_in_executor(None, catalog.record_use, url)
+            if url and on_url:
+                on_url(url)
+            timed_video_urls.append(t1, t2, url)
+    finally:
+        for task in searches.values():
+            task.cancel()
+
+    return timed_video_urls
+
+async def generate_video_url_async(timed_video_searches: Timeline, video_server: str, session: Optional[aiohttp.ClientSession] = None, on_url: Optional[Callable[[str], None]] = None) -> Timeline:
+    """Generate video URLs for timed video searches."""
+    timed_video_urls = Timeline()
+    if video_server == "pexel":
+        owns_session = session is None
+        session = session or create_pexels_session()
+        try:
+            timed_video_urls = await resolve_pexels_urls(session, timed_video_searches, on_url=on_url)
+        finally:
+            if owns_session:
+                await session.close()
+        logger.info(f"Pexels search cache: {get_pexels_cache().stats}")
     elif video_server == "stable_diffusion":
         timed_video_urls = get_images_for_video(timed_video_searches)
     else:
         logger.error(f"Unsupported video server: {video_server}")
 
     return timed_video_urls
+
+def generate_video_url(timed_video_searches: Timeline, video_server: str) -> Timeline:
+    """Generate video URLs for timed video searches (blocking wrapper)."""
+    return asyncio.run(generate_video_url_async(timed_video_searches, video_server))
@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from typing import Iterable, List, Optional
+from utility.cache import CACHE_ROOT
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.path.join(CACHE_ROOT, "footage_catalog.sqlite3")
+# Width/height ratios within this distance of 16:9 count as 16:9
+ASPECT_TOLERANCE = 0.01
+ASPECT_16_9 = 16 / 9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    aspect REAL NOT NULL,
+    duration REAL NOT NULL,
+    page_url TEXT,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS video_files (
+    video_id INTEGER NOT NULL REFERENCES videos(id),
+    link TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    quality TEXT,
+    file_type TEXT,
+    PRIMARY KEY (video_id, link)
+);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT NOT NULL,
+    video_id INTEGER NOT NULL REFERENCES videos(id),
+    hits INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (term, video_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS usage (
+    link_key TEXT PRIMARY KEY,
+    use_count INTEGER NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS video_files_size ON video_files (width, height);
+"""
+
+def tokenize(query: str) -> List[str]:
+    """Split a search query into the lowercase terms of the inverted index."""
+    return sorted(set(re.findall(r"[a-z0-9]+", query.lower())))
+
+def link_key(link: str) -> str:
+    """Identify a clip across its file variants, as the used-video bookkeeping does."""
+    return link.split('.hd')[0]
+
+def is_16_9(width: float, height: float) -> bool:
+    return height > 0 and abs(width / height - ASPECT_16_9) <= ASPECT_TOLERANCE
+
+class FootageCatalog:
+    """SQLite catalog of every Pexels video seen, indexed by the query terms that found it.
+
+    Clip selection can be answered from it locally, ranked by how well each clip
+    matches the query, how close its duration is to the segment and how often it was
+    already used, including when the API is unreachable or over quota. The database
+    runs in WAL mode, so batch processes can share it.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def add_results(self, query: str, response: Optional[dict]) -> int:
+        """Record the videos of a search response and index them under the query's terms."""
+        if not response or not response.get("videos"):
+            return 0
+        now = time.time()
+        terms = tokenize(query)
+        videos, files, postings = [], [], []
+        for video in response["videos"]:
+            try:
+                width, height = int(video["width"]), int(video["height"])
+                videos.append((video["id"], width, height, width / height if height else 0.0, float(video["duration"]), video.get("url"), now))
+            except (KeyError, TypeError, ValueError):
+                continue
+            for video_file in video.get("video_files", []):
+                if video_file.get("link"):
+                    files.append((video["id"], video_file["link"], video_file.get("width"), video_file.get("height"), video_file.get("quality"), video_file.get("file_type")))
+            postings.extend((term, video["id"]) for term in terms)
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET last_seen = excluded.last_seen, duration = excluded.duration",
+                videos
+            )
+            self._conn.executemany("INSERT OR IGNORE INTO video_files VALUES (?, ?, ?, ?, ?, ?)", files)
+            self._conn.executemany("INSERT INTO terms (term, video_id) VALUES (?, ?) ON CONFLICT DO UPDATE SET hits = hits + 1", postings)
+        return len(videos)
+
+    def find_clips(self, query: str, segment_duration: float, orientation_landscape: bool = True, exclude: Iterable[str] = (), limit: int = 1) -> List[str]:
+        """Return up to `limit` file links for a segment, best match first.
+
+        Ranked by the number of query terms matched, then by how far the clip is from
+        covering the segment (clips shorter than the segment rank after longer ones),
+        then by how often the clip was already used.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        width, height = (1920, 1080) if orientation_landscape else (1080, 1920)
+        aspect = ASPECT_16_9 if orientation_landscape else 1 / ASPECT_16_9
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT f.link, COUNT(DISTINCT t.term) AS matched, v.duration
+                FROM terms t
+                JOIN videos v ON v.id = t.video_id
+                JOIN video_files f ON f.video_id = v.id AND f.width = ? AND f.height = ?
+                WHERE t.term IN ({placeholders}) AND ABS(v.aspect - ?) <= ?
+                GROUP BY f.link
+            """, (width, height, *terms, aspect, ASPECT_TOLERANCE)).fetchall()
+
+        excluded = set(exclude)
+        usage = self._usage_counts(link_key(link) for link, _, _ in rows)
+
+        def rank(row):
+            link, matched, duration = row
+            shortfall = max(0.0, segment_duration - duration)
+            return (-matched, shortfall * 10 + abs(duration - segment_duration), usage.get(link_key(link), 0), link)
+
+        links = []
+        for row in sorted(rows, key=rank):
+            if link_key(row[0]) not in excluded:
+                links.append(row[0])
+                excluded.add(link_key(row[0]))
+                if len(links) >= limit:
+                    break
+        return links
+
+    def _usage_counts(self, keys: Iterable[str]) -> dict:
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(f"SELECT link_key, use_count FROM usage WHERE link_key IN ({','.join('?' * len(keys))})", keys).fetchall()
+        return dict(rows)
+
+    def record_use(self, link: str) -> None:
+        """Count a clip as used, so later selections prefer fresher footage."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO usage VALUES (?, 1, ?) ON CONFLICT(link_key) DO UPDATE SET use_count = use_count + 1, last_used = excluded.last_used",
+                (link_key(link), time.time())
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_footage_catalog() -> FootageCatalog:
+    """Return the process-wide footage catalog."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = FootageCatalog()
+        return _catalog
@@ -1,22 +1,14 @@
-from openai import OpenAI
-import os
 import json
 import re
 from datetime import datetime
 from utility.utils import log_response, LOG_TYPE_GPT
+from utility.llm_cache import cached_chat_completion
+from utility.llm_client import get_llm_client
+from utility.timeline import Timeline
 import logging
 
 logger = logging.getLogger(__name__)
 
-if len(os.environ.get("GROQ_API_KEY", "")) > 30:
-    from groq import Groq
-    model = "llama3-70b-8192"
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-else:
-    model = "gpt-4"
-    OPENAI_API_KEY = os.environ.get('OPENAI_KEY')
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
 prompt = """# Instructions
 
 Given the following video script and timed captions, extract three visually concrete and specific keywords for each time segment that can be used to search for background videos. The keywords should be short and capture the main essence of the sentence. They can be synonyms or related terms. If a caption is vague or general, consider the next timed caption for more context. If a keyword is a single word, try to return a two-word keyword that is visually concrete. If a time frame contains two or more important pieces of information, divide it into shorter time frames with one keyword each. Ensure that the time periods are strictly consecutive and cover the entire length of the video. Each keyword should cover between 2-4 seconds.
@@ -48,9 +40,14 @@ def fix_json(json_str: str) -> str:
     json_str = json_str.replace('\\"', '"')
     return json_str
 
-def getVideoSearchQueriesTimed(script: str, captions_timed: list) -> list:
-    """Generate timed video search queries based on the script and captions."""
+def getVideoSearchQueriesTimed(script: str, captions_timed: Timeline, duration: float = None) -> Timeline:
+    """Generate timed video search queries based on the script and captions.
+
+    The intervals returned by the model are checked against `duration` (by default the
+    end of the last caption); overlaps, gaps and intervals past the end are repaired.
+    """
     try:
+        captions_timed = Timeline.coerce(captions_timed)
         content = call_OpenAI(script, captions_timed)
         content = fix_json(content)
         out = json.loads(content)
@@ -58,7 +55,14 @@ def getVideoSearchQueriesTimed(script: str, captions_timed: list) -> list:
         if not isinstance(out, list) or not all(isinstance(item, list) and len(item) == 2 for item in out):
             raise ValueError("Invalid format in API response")
         
-        return out
+        search_terms = Timeline.from_pairs(out)
+        if duration is None:
+            duration = captions_timed.end
+        problems = search_terms.validate(duration)
+        if problems:
+            logger.warning(f"Repairing {len(problems)} problems in the search term intervals: {'; '.join(problems[:5])}")
+            search_terms = search_terms.repair(duration)
+        return search_terms
     except json.JSONDecodeError as e:
         logger.error(f"JSON decoding error: {str(e)}")
         logger.error(f"Problematic content: {content}")
@@ -67,22 +71,14 @@ def getVideoSearchQueriesTimed(script: str, captions_timed: list) -> list:
     
     return None
 
-def call_OpenAI(script: str, captions_timed: list) -> str:
+def call_OpenAI(script: str, captions_timed: Timeline) -> str:
     """Call OpenAI API to generate video search queries."""
-    user_content = f"Script: {script}\nTimed Captions: {captions_timed}"
+    user_content = f"Script: {script}\nTimed Captions: {Timeline.coerce(captions_timed).to_pairs()}"
     logger.info(f"Sending request to OpenAI API with content length: {len(user_content)}")
     
     try:
-        response = client.chat.completions.create(
-            model=model,
-            temperature=1,
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": user_content}
-            ]
-        )
-        
-        text = response.choices[0].message.content.strip()
+        client, model = get_llm_client("search_terms")
+        text = cached_chat_completion(client, model, prompt, user_content, temperature=1).strip()
         text = re.sub('\s+', ' ', text)
         log_response(LOG_TYPE_GPT, script, text)
         return text
@@ -90,29 +86,6 @@ def call_OpenAI(script: str, captions_timed: list) -> str:
         logger.error(f"Error calling OpenAI API: {str(e)}")
         raise
 
-def merge_empty_intervals(segments: list) -> list:
-    """Merge empty intervals in the video segments."""
-    merged = []
-    i = 0
-    while i < len(segments):
-        interval, url = segments[i]
-        if url is None:
-            j = i + 1
-            while j < len(segments) and segments[j][1] is None:
-                j += 1
-            
-            if i > 0:
-                prev_interval, prev_url = merged[-1]
-                if prev_url is not None and prev_interval[1] == interval[0]:
-                    merged[-1] = [[prev_interval[0], segments[j-1][0][1]], prev_url]
-                else:
-                    merged.append([interval, prev_url])
-            else:
-                merged.append([interval, None])
-            
-            i = j
-        else:
-            merged.append([interval, url])
-            i += 1
-    
-    return merged
+def merge_empty_intervals(segments: Timeline) -> Timeline:
+    """Merge empty intervals in the video segments into the segment before them."""
+    return Timeline.coerce(segments).merge_empty()